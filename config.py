@@ -34,7 +34,19 @@ API_CONFIG = {
     "rank_method": "hybrid",
 
     # 请求超时时间（秒）
-    "timeout": 99999
+    "timeout": 99999,
+    
+    # 检索服务的多个副本 (可选)，例如 ["http://10.0.0.1:8000", "http://10.0.0.2:8000"]
+    # 配置后请求在这些副本之间分配，base_url 只用于报告显示
+    "base_urls": [],
+    
+    "load_balancing": {
+        "policy": "round_robin",   # 副本选择策略: round_robin / least_outstanding / latency_weighted
+        "eject_after": 3,          # 连续失败（连接错误、超时、5xx）多少次后暂时移出轮换，0表示不移出
+        "eject_seconds": 30,       # 移出轮换的时长（秒），之后放回试探
+        "latency_decay": 0.2,      # latency_weighted 策略的延迟指数加权平均中最新一次请求的权重
+        "slow_factor": 2.0         # p90延迟超过各副本p90中位数的这个倍数时在报告中标记为慢副本
+    }
 }
 
 # 评估配置
@@ -45,6 +57,12 @@ EVALUATION_CONFIG = {
         "exact_match": 1.0,
         "partial_match": 0.7,
         "extension_match": 0.3
+    },
+    # 延迟分布（报告中的p50/p90/p99、直方图和最慢查询）
+    "latency": {
+        "relative_accuracy": 0.01,  # 分位数草图的相对误差
+        "histogram_bins": 10,       # 直方图区间数
+        "slowest_queries": 5        # 每个类别列出的最慢查询数
     }
 }
 
@@ -53,8 +71,26 @@ PATH_CONFIG = {
     "test_dataset": "test_dataset copy.json",
     "results_dir": "results",
     "reports_dir": "reports",
+    "profile_dir": "reports/profile",  # --profile 的剖析输出目录
     "history_dir": "results/history",
-    "latest_result": "results/latest_result.json"
+    "history_db": "results/history/history.db",  # SQLite评估历史数据库
+    "latest_result": "results/latest_result.json",
+    "latest_columnar": "results/latest_result.npz",  # 列式结果（供分析工具快速加载）
+    "case_stream": "results/latest_cases.jsonl",     # 评估过程中逐个写出的案例结果
+    "trace_dir": "results/traces",                   # 链路追踪（OTLP/JSON）输出目录
+    "spill_dir": "results/spill",                    # 检索结果溢写文件目录（评估结束后删除）
+    "multi_dir": "results/multi"                     # 多数据集评估（--targets）的汇总和各组合结果目录
+}
+
+# 基线回归检查配置（--baseline）
+REGRESSION_CONFIG = {
+    "metrics": ["total_score", "usability"],  # 检查平均值是否显著下降的单案例指标
+    "alpha": 0.05,                 # 配对检验的显著性水平
+    "min_score_drop": 0.02,        # 平均分至少下降这么多才视为回归（忽略统计显著但很小的变化）
+    "max_p95_increase": 0.2,       # p95延迟允许比基线上升的比例
+    "fail_on_new_errors": True,    # 基线中成功的案例本次失败时是否视为回归
+    "min_match_ratio": 0.5,        # 本次案例中至少有这个比例与基线匹配（按idx），否则视为检查未通过
+    "top_cases": 10                # 报告中列出的变化最大的案例数
 }
 
 # 报告配置
@@ -63,6 +99,7 @@ REPORT_CONFIG = {
     "generate_charts": True,    # 是否生成图表
     "save_detailed_logs": True, # 是否保存详细日志
     "include_snippets": True,   # 是否在报告中包含代码片段
+    "save_columnar": True,      # 是否同时保存列式NPZ结果
     
     # 图表配置
     "chart_config": {
@@ -73,12 +110,20 @@ REPORT_CONFIG = {
     }
 }
 
+# 结果序列化配置
+SERIALIZATION_CONFIG = {
+    "backend": "auto",  # auto / orjson / msgspec / json，auto优先使用已安装的更快的库
+    "indent": 2         # JSON缩进，None为紧凑输出（msgspec始终紧凑输出；orjson只支持2；auto选择支持该缩进的后端）
+}
+
 # 日志配置
 LOGGING_CONFIG = {
     "level": "INFO",  # DEBUG, INFO, WARNING, ERROR
     "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     "file": "evaluation.log",
-    "console_output": True
+    "console_output": True,
+    "queue": True,   # 通过队列由后台线程写日志，避免并发评估时在处理器锁上等待
+    "json": False    # 是否输出JSON行格式（每行包含 ts/level/logger/thread/message），也可用 --log-json 开启
 }
 
 # 类别配置
@@ -101,8 +146,120 @@ CATEGORY_CONFIG = {
 PERFORMANCE_CONFIG = {
     "batch_size": 5,           # 批量处理大小
     "retry_attempts": 3,       # 重试次数
-    "retry_delay": 1,          # 重试间隔（秒）
+    "retry_delay": 1,          # 重试间隔（秒）；未设置 request_interval 时也是两次请求之间的间隔
+    "retry_backoff": 2,        # 每次重试后重试间隔的倍数
+    "retry_in_evaluation": False,  # 评估请求失败时是否重试（也可用 --retries 开启；结果中记录每个案例的重试次数）
     "concurrent_requests": 1,  # 并发请求数（建议为1避免服务器压力）
+    "pipeline": True,          # 是否使用 请求->评分->写出 流水线（各阶段并行，完成的案例实时落盘）
+    "queue_size": 16,          # 流水线各阶段之间的队列容量
+    "spill_results": False,    # 是否把检索结果列表溢写到磁盘（内存中只保留指标，大数据集时使用）
+}
+
+# 指标导出配置（Prometheus / OpenMetrics）
+METRICS_CONFIG = {
+    "enabled": False,                  # 是否在评估期间启动指标HTTP服务（也可用 --metrics-port 开启）
+    "host": "127.0.0.1",               # 监听地址
+    "port": 9464,                      # 监听端口，Prometheus抓取 http://host:port/metrics
+    "textfile": "results/metrics.prom",  # 评估结束时写出的指标文件（node_exporter textfile collector格式）
+    "latency_buckets": [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]  # 请求延迟直方图分桶（秒）
+}
+
+# Playground服务配置（start_playground.py）
+PLAYGROUND_CONFIG = {
+    "host": "127.0.0.1",     # 监听地址，默认只允许本机访问；空字符串表示所有网卡（局域网内的主机也能读取源码目录）
+    "cors_origins": [],      # 允许跨域调用 /api/* 的来源（例如 "http://localhost:3000"），默认只允许playground页面本身
+    "port": 8080,            # 监听端口
+    "cache_size": 256,       # 搜索响应LRU缓存的条目数，0表示不缓存
+    "cache_ttl": 300,        # 缓存的搜索响应有效期（秒）
+    "upstream_timeout": 60,  # 代理请求检索API的超时时间（秒）
+    "gzip_min_size": 1024,   # 小于该字节数的静态文件不压缩
+    # 代码查看器：检索结果中的路径相对于被检索项目的本地代码目录
+    "source_root": "",             # 被检索项目的本地checkout，为空时代码查看器不可用（也可用 --source-root 指定）
+    "file_cache_size": 32,         # 最近查看的源码文件缓存数
+    "mmap_threshold": 1048576,     # 达到该字节数的源码文件使用mmap映射，不整体读入内存
+    "file_page_lines": 500,        # 代码查看器每次加载的行数
+    # 对比模式：同一查询并行请求多个 method / rank_method 组合
+    "compare_concurrency": 4,      # 所有对比请求共享的并发上限
+    "compare_max_combos": 16,      # 单次对比最多的组合数
+    "dataset": "",                 # 查询与其中的案例相同时计算评估分数，为空时使用 PATH_CONFIG["test_dataset"]
+    # 实时评估：页面中启动数据集评估，通过SSE推送每个案例的结果
+    "live_evaluation": False,      # 是否允许从playground启动评估（也可用 --live-eval 开启），只接受同源请求
+    "sse_keepalive": 15            # SSE连接空闲时发送保活注释的间隔（秒）
+}
+
+# 参数扫描配置（sweep.py）
+SWEEP_CONFIG = {
+    "max_concurrency": 4,        # 所有组合共享的同时进行的上游请求数
+    "max_requests": None,        # 单次扫描最多发出的上游请求数，None表示不限制
+    "parallel_combos": 4,        # 同时评估的组合数
+    "request_interval": 0,       # 每个组合内两次请求的间隔（秒），整体压力由 max_concurrency 控制
+    "retry_attempts": 2,         # 请求失败时的重试次数（每次重试计入请求预算，预算用完后不再重试），0表示不重试
+    "retry_delay": 0.5,          # 第一次重试前的等待时间（秒）
+    "retry_backoff": 2,          # 每次重试后等待时间的倍数
+    "cache_file": "results/sweeps/response_cache.jsonl",  # 共享响应缓存文件，为空时只在内存中缓存
+    "cache_ttl": 86400,          # 缓存响应的有效期（秒），检索服务更新后应清空缓存文件或用 --no-cache
+    "latency_quantile": 0.95,    # 对比表和帕累托前沿使用的延迟分位数
+    "output_dir": "results/sweeps"
+}
+
+# 排序融合模拟配置（simulate_fusion.py）
+FUSION_CONFIG = {
+    "rrf_k": [1, 5, 10, 20, 30, 40, 60, 80, 100],  # RRF的k值
+    "normalizations": ["minmax", "zscore"],        # 加权分数融合的归一化方式
+    "weight_step": 0.1,        # 权重网格的步长（各方法权重为其整数倍且和为1）
+    "combmnz": True,           # 是否同时评估CombMNZ（加权分数乘以出现该文档的方法数）
+    "top": 20                  # 终端显示的变体数
+}
+
+# 多数据集评估配置（run_evaluation.py --targets）
+MULTI_TARGET_CONFIG = {
+    "max_parallel": 4,           # 同时评估的 数据集/project_id 组合数
+    "concurrent_requests": 2,    # 每个组合的并发请求数
+    "requests_per_second": 10,   # 所有组合合计的请求速率上限，None表示不限制
+    "pool_size": 8               # 共享连接池的连接数（不小于 max_parallel × concurrent_requests 时连接不会被丢弃重建）
+}
+
+# 浸泡测试配置（soak.py）
+SOAK_CONFIG = {
+    "duration": "4h",            # 运行时长，数字为秒，也可写 30m / 4h / 2d
+    "rate": 2,                   # 固定请求速率（每秒）
+    "concurrency": 4,            # 并发请求数上限（服务变慢时实际速率可能低于rate）
+    "window_seconds": 300,       # 统计窗口长度（秒）
+    "score_tolerance": 1e-6,     # 相同查询的总分与首次结果相差超过该值视为变化
+    "max_alerts": 50,            # 结束时汇总中保留的最近告警数
+    "output_dir": "results/soak",  # 各窗口统计的JSONL文件目录
+    "drift": {
+        "warmup_windows": 1,       # 不参与基线的预热窗口数
+        "baseline_windows": 2,     # 预热之后合并为基线的窗口数
+        "latency_ratio": 1.5,      # 窗口p90延迟超过基线p90的这个倍数时告警
+        "error_rate_increase": 0.05,  # 窗口错误率比基线高出这么多时告警
+        "score_change_rate": 0.0   # 重复查询中总分变化的比例超过该值时告警
+    }
+}
+
+# limit调优配置（tune_limit.py）
+LIMIT_TUNING_CONFIG = {
+    "max_limit": 50,           # 评估时使用的较大limit，较小limit的指标由其结果前缀计算
+    "tolerance": 0.01,         # 推荐limit的平均总分允许比峰值低的幅度
+    "candidates": [3, 5, 10, 15, 20, 30, 50],  # 抽样测量延迟和响应大小的limit
+    "sample_size": 10,         # 抽样请求的查询数（每个查询请求每个候选limit一次）
+    "seed": 42                 # 抽样的随机种子
+}
+
+# 链路追踪配置（run_evaluation.py --trace）
+TRACING_CONFIG = {
+    "enabled": False,                         # 是否默认记录链路追踪
+    "service_name": "code-search-evaluator"   # 导出文件中的 service.name
+}
+
+# 抽样配置（run_evaluation.py --sample）
+SAMPLING_CONFIG = {
+    "ci_width": 0.1,           # 目标置信区间总宽度（avg_total_score的上界-下界）
+    "confidence": 0.95,        # 置信水平
+    "seed": 42,                # 随机种子，相同种子和数据集总是抽到相同的案例
+    "prior_std": 0.5,          # 无历史结果时假设的单案例总分标准差（0.5为最保守取值）
+    "min_per_category": 2,     # 每个类别最少抽取的案例数（至少2个才能估计方差）
+    "use_latest_result": True  # 是否用latest_result.json中各类别的标准差来确定样本量
 }
 
 # 验证配置的函数
@@ -111,9 +268,13 @@ def validate_config():
     errors = []
     
     # 验证API配置
-    if not API_CONFIG.get("base_url"):
+    if not API_CONFIG.get("base_url") and not API_CONFIG.get("base_urls"):
         errors.append("API_CONFIG.base_url 不能为空")
     
+    policy = API_CONFIG.get("load_balancing", {}).get("policy", "round_robin")
+    if policy not in ("round_robin", "least_outstanding", "latency_weighted"):
+        errors.append(f"API_CONFIG.load_balancing.policy 无效: {policy}")
+    
     if not API_CONFIG.get("project_id"):
         errors.append("API_CONFIG.project_id 不能为空")
     
@@ -127,6 +288,10 @@ def validate_config():
     if not EVALUATION_CONFIG.get("top_k_values"):
         errors.append("EVALUATION_CONFIG.top_k_values 不能为空")
     
+    # 验证序列化配置（orjson只支持2空格缩进或紧凑输出）
+    if SERIALIZATION_CONFIG.get("backend") == "orjson" and SERIALIZATION_CONFIG.get("indent") not in (None, 2):
+        errors.append(f"SERIALIZATION_CONFIG.indent 为 {SERIALIZATION_CONFIG['indent']} 时不能使用 orjson 后端")
+    
     if errors:
         raise ValueError("配置验证失败:\n" + "\n".join(errors))
     
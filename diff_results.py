@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+评估结果对比工具
+对比两次评估（例如切换 rank_method 前后）的结果文件，按影响列出排序变化最大的查询：
+期望文件的排名变化、新找到/丢失的检索结果、分数变化和两个排序列表的rank-biased overlap
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.result_diff import ResultDiffer, format_rank
+
+
+def print_diff(diff, elapsed):
+    """输出汇总和影响最大的查询"""
+    summary = diff["summary"]
+    print(f"A: {diff['a']}")
+    print(f"B: {diff['b']}")
+    print(
+        f"\n匹配 {summary['matched_cases']} 个案例 (仅A {len(diff['only_a'])}, 仅B {len(diff['only_b'])})，"
+        f"对比耗时 {elapsed:.2f}秒"
+    )
+    print(
+        f"总分: 提升 {summary['improved']}, 下降 {summary['regressed']}, 不变 {summary['unchanged_score']}, "
+        f"平均变化 {summary['avg_total_delta']:+.3f}"
+    )
+    if summary["avg_rbo"] is not None:
+        print(f"排序: 平均RBO {summary['avg_rbo']:.3f}, 有变化的案例 {summary['changed_cases']}")
+    print(
+        f"期望文件: 排名上升 {summary['expected_moved_up']}, 下降 {summary['expected_moved_down']}, "
+        f"新找到 {summary['expected_gained']}, 丢失 {summary['expected_dropped']}"
+    )
+
+    if not diff["top"]:
+        print("\n两次结果没有差异")
+        return
+
+    print(f"\n影响最大的 {len(diff['top'])} 个查询:")
+    print("-" * 60)
+    for i, case in enumerate(diff["top"], 1):
+        before, after = case["total_score"]
+        delta = case["deltas"]["total_score"]
+        score = (
+            f"{before if before is not None else 0:.3f} -> {after if after is not None else 0:.3f} ({delta:+.3f})"
+            if delta is not None else "失败"
+        )
+        print(f"{i}. [{case['idx']}] {case['query']}")
+        print(f"   总分: {score} | RBO: {case['rbo']:.3f} | 影响: {case['impact']:.3f}")
+        for item in case["expected"]:
+            print(f"   期望 {item['path']}: 排名 {format_rank(item['before'])} -> {format_rank(item['after'])}")
+        if case["found"]:
+            print(f"   新找到: {', '.join(case['found'][:5])}{' ...' if len(case['found']) > 5 else ''}")
+        if case["lost"]:
+            print(f"   丢失: {', '.join(case['lost'][:5])}{' ...' if len(case['lost']) > 5 else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次评估结果，按影响列出排序变化的查询")
+    parser.add_argument("a", help="基准结果文件 (.json / 案例流 .jsonl / 列式 .npz)")
+    parser.add_argument("b", help="新结果文件")
+    parser.add_argument("--top", type=int, default=20, help="显示影响最大的查询数量 (默认: 20)")
+    parser.add_argument("--output", "-o", type=str, help="把所有有变化的案例按影响排序写入JSON行文件")
+    parser.add_argument("--rbo-p", type=float, default=0.9, help="RBO的持续概率，越小越只关注前几名 (默认: 0.9)")
+    args = parser.parse_args()
+
+    for path in (args.a, args.b):
+        if not os.path.exists(path):
+            print(f"结果文件不存在: {path}")
+            sys.exit(1)
+
+    start = time.perf_counter()
+    diff = ResultDiffer(rbo_p=args.rbo_p).diff_files(args.a, args.b, output_path=args.output, top=args.top)
+    print_diff(diff, time.perf_counter() - start)
+    if args.output:
+        print(f"\n逐案例对比已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,21 @@
 
 import json
 import logging
-import time
 import os
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
-from utils.api_client import create_api_client
+from utils.api_client import create_api_client, retry_search
 from utils.metrics import EvaluationMetrics, CategoryEvaluator
+from utils.serializer import write_json_atomic
+from utils.pipeline import EvaluationPipeline, finish_case_trace, CANCELLED_ERROR
+from utils.tracing import NOOP_TRACER
+from utils.records import CaseResult
+
+# _fetch_query 附加在响应副本上的重试次数字段
+RETRIES_FIELD = "_retries"
 
 class CodeSearchEvaluator:
     """代码检索评估器"""
@@ -35,6 +43,25 @@ class CodeSearchEvaluator:
         self.evaluation_results = []
         self.summary_metrics = {}
         
+        # 结果接收器（逐个接收完成的案例，用于流式落盘和报告）
+        self.result_sinks = []
+        self.pipeline = None
+        # 流水线工作线程的包装器（性能剖析时设置）
+        self.thread_wrapper = None
+        # 链路追踪器（set_tracer设置），默认不记录
+        self.tracer = NOOP_TRACER
+        # 取消标记（cancel设置）：设置后不再发出新请求，剩余案例以失败结束
+        self.cancel_event = threading.Event()
+        # 检索结果溢写存储：启用时评分后立即把检索结果列表写入磁盘，内存中只保留指标
+        self.spill_store = None
+        if config.get("performance", {}).get("spill_results", False):
+            from utils.spill_store import SpillStore
+            spill_dir = config.get("paths", {}).get("spill_dir", "results/spill")
+            self.spill_store = SpillStore(
+                os.path.join(spill_dir, f"ranked_{os.getpid()}.jsonl"),
+                config.get("serialization", {}).get("backend", "auto")
+            )
+        
     def load_test_dataset(self, dataset_path: str) -> Dict[str, Any]:
         """
         加载测试数据集
@@ -70,70 +97,185 @@ class CodeSearchEvaluator:
             Dict: 评估结果
         """
         start_time = time.time()  # 记录开始时间
-        self.logger.info(f"开始评估查询: {query['query']}")
         
         try:
             # 调用API获取实际结果
-            api_response = self.api_client.search_code(query["query"])
-            
-            # 检查API返回的错误
-            if "error" in api_response:
-                elapsed = time.time() - start_time
-                self.logger.error(f"API返回错误: {api_response['error']} | 用时: {elapsed:.2f}秒")
-                return {
-                    "query": query["query"],
-                    "error": api_response["error"],
-                    "timestamp": datetime.now().isoformat(),
-                    "success": False,
-                    "elapsed_time": elapsed
-                }
+            api_response, fetch_elapsed = self._fetch_query(query)
+            return self._score_query(query, api_response, fetch_elapsed)
             
-            # 获取实际结果列表
-            actual_results = api_response.get("results", [])
+        except Exception as e:
+            return self._error_result(query, str(e), time.time() - start_time)
+    
+    def _fetch_query(self, query: Dict) -> Tuple[Dict, float]:
+        """
+        调用检索接口（流水线的请求阶段）
+        
+        PERFORMANCE_CONFIG["retry_in_evaluation"] 为True时失败的请求按 retry_attempts / retry_delay / retry_backoff 重试，
+        请求耗时只计最后一次尝试（与不重试时的延迟可比），重试次数记录到案例结果的 retries 字段
+        
+        Returns:
+            Tuple: (API返回结果, 请求耗时)
+        """
+        performance = self.config.get("performance", {})
+        self.logger.info("开始评估查询: %s", query["query"])
+        elapsed = [0.0]
+        
+        def attempt():
+            # 等待速率限制的时间不计入请求耗时
+            self.api_client.take_rate_limit_wait()
+            start_time = time.time()
+            result = self.api_client.search_code(query["query"])
+            elapsed[0] = time.time() - start_time - self.api_client.take_rate_limit_wait()
+            return result
+        
+        if not performance.get("retry_in_evaluation", False):
+            return attempt(), elapsed[0]
+        
+        api_response, retries = retry_search(
+            attempt,
+            max_retries=performance.get("retry_attempts", 0),
+            retry_delay=performance.get("retry_delay", 0),
+            backoff=performance.get("retry_backoff", 1.0),
+            tracer=self.tracer,
+            on_retry=self.api_client.record_retry,
+            cancel_event=self.cancel_event,
+            logger=self.logger
+        )
+        # 复制一份再附加重试次数，不修改客户端可能缓存的响应
+        return dict(api_response, **{RETRIES_FIELD: retries}), elapsed[0]
+    
+    def _score_query(self, query: Dict, api_response: Dict, fetch_elapsed: float) -> Dict:
+        """
+        根据API返回结果计算评估指标（流水线的评分阶段）
+        
+        Args:
+            query: 查询信息
+            api_response: API返回结果
+            fetch_elapsed: 请求耗时
             
-            # 计算新框架指标
+        Returns:
+            Dict: 评估结果，elapsed_time为请求耗时 + 评分耗时（不含排队等待）
+        """
+        # 把请求耗时折算进开始时间，保证elapsed_time与顺序执行时含义一致
+        start_time = time.time() - fetch_elapsed
+        
+        # 检查API返回的错误
+        if "error" in api_response:
+            elapsed = time.time() - start_time
+            self.logger.error(f"API返回错误: {api_response['error']} | 用时: {elapsed:.2f}秒")
+            result = CaseResult.failed(query, api_response["error"], time.time(), elapsed)
+            if RETRIES_FIELD in api_response:
+                result.set_retries(api_response[RETRIES_FIELD])
+            return result
+        
+        # 获取实际结果列表
+        actual_results = api_response.get("results", [])
+        
+        # 计算新框架指标
+        with self.tracer.span("compute_metrics", {"result_count": len(actual_results)}):
             metrics = self.metrics.calculate_new_framework_metrics(
                 actual_results=actual_results,
                 expected_results=query["expected_results"]
             )
-            
-            # 构建评估结果
-            evaluation_result = {
-                "query": query["query"],
-                "category": query.get("category", "unknown"),
-                "description": query.get("description", ""),
-                "metrics": metrics,
-                "expected_results": query["expected_results"],
-                "actual_results": actual_results,
-                "timestamp": datetime.now().isoformat(),
-                "success": True,
-                "total_score": metrics["total_score"],
-                "relevance": metrics["relevance"],
-                "completeness": metrics["completeness"],
-                "usability": metrics["usability"]
-            }
-            
-            elapsed = time.time() - start_time
-            evaluation_result["elapsed_time"] = elapsed
-            
-            self.logger.info(
-                f"总分: {metrics['total_score']:.3f} "
-                f"(相关性={metrics['relevance']:.3f}, 全面性={metrics['completeness']:.3f}, 可用性={metrics['usability']:.3f}) | "
-                f"用时: {elapsed:.2f}秒"
-            )
-            
-            return evaluation_result
-            
-        except Exception as e:
-            elapsed = time.time() - start_time
-            self.logger.error(f"评估查询时出错: {str(e)} | 用时: {elapsed:.2f}秒")
-            return {
-                "query": query["query"],
-                "error": str(e),
-                "timestamp": datetime.now().isoformat(),
-                "success": False,
-                "elapsed_time": elapsed
-            }
+        
+        # 构建评估结果（紧凑记录，序列化时才转换为字典）
+        timestamp = time.time()
+        elapsed = timestamp - start_time
+        evaluation_result = CaseResult.succeeded(
+            query, metrics, actual_results, timestamp, elapsed, spill_store=self.spill_store
+        )
+        if RETRIES_FIELD in api_response:
+            evaluation_result.set_retries(api_response[RETRIES_FIELD])
+        
+        self.logger.info(
+            "总分: %.3f (相关性=%.3f, 全面性=%.3f, 可用性=%.3f) | 用时: %.2f秒",
+            metrics["total_score"], metrics["relevance"], metrics["completeness"], metrics["usability"], elapsed
+        )
+        
+        return evaluation_result
+    
+    def _error_result(self, query: Dict, error: str, elapsed: float) -> Dict:
+        """构建评估出错时的结果"""
+        self.logger.error(f"评估查询时出错: {error} | 用时: {elapsed:.2f}秒")
+        return CaseResult.failed(query, error, time.time(), elapsed)
+    
+    def add_result_sink(self, sink: Callable[[Dict], None]) -> None:
+        """
+        注册结果接收器，每个案例评估完成后（按数据集顺序）调用一次
+        
+        Args:
+            sink: 接收单个案例结果的可调用对象
+        """
+        self.result_sinks.append(sink)
+    
+    def set_metrics_exporter(self, exporter) -> None:
+        """
+        启用指标导出：API客户端上报请求指标，完成的案例通过结果接收器上报
+        
+        Args:
+            exporter: utils.metrics_exporter.EvaluationMetricsExporter实例
+        """
+        self.api_client.exporter = exporter
+        self.add_result_sink(exporter)
+    
+    def set_tracer(self, tracer) -> None:
+        """
+        启用链路追踪：每个案例生成一条trace，API客户端的请求和解析也记录为span
+        
+        Args:
+            tracer: utils.tracing.Tracer实例
+        """
+        self.tracer = tracer
+        self.api_client.tracer = tracer
+    
+    def set_rate_limiter(self, rate_limiter) -> None:
+        """
+        设置请求速率限制，多个评估器共享时限制总请求速率
+        
+        API客户端在每次HTTP请求（包括重试和换副本重发）前调用 rate_limiter.acquire(cancel_event)，
+        等待时间不计入案例的请求耗时
+        
+        Args:
+            rate_limiter: utils.multi_target.RateLimiter
+        """
+        self.api_client.rate_limiter = rate_limiter
+        self.api_client.cancel_event = self.cancel_event
+    
+    def _trace_attributes(self, query: Dict) -> Dict[str, Any]:
+        """案例根span的属性"""
+        return {
+            "idx": query.get("idx"),
+            "category": query.get("category", "unknown"),
+            "query": query.get("query"),
+            "method": self.api_client.method,
+            "rank_method": self.api_client.rank_method
+        }
+    
+    def _emit_result(self, result: Dict) -> None:
+        """把完成的案例交给所有结果接收器"""
+        for sink in self.result_sinks:
+            try:
+                sink(result)
+            except Exception as e:
+                self.logger.error(f"结果接收器处理失败: {e}")
+    
+    def _evaluate_pipelined(self, test_cases: List[Dict]) -> List[Dict]:
+        """使用 请求 -> 评分 -> 写出 三阶段流水线评估所有案例"""
+        performance = self.config["performance"]
+        self.pipeline = EvaluationPipeline(
+            fetch_fn=self._fetch_query,
+            score_fn=self._score_query,
+            error_fn=self._error_result,
+            sinks=self.result_sinks,
+            fetch_workers=performance.get("concurrent_requests", 1),
+            queue_size=performance.get("queue_size", 16),
+            request_interval=performance.get("request_interval", performance.get("retry_delay", 0)),
+            thread_wrapper=self.thread_wrapper,
+            tracer=self.tracer,
+            trace_attributes=self._trace_attributes,
+            cancel_event=self.cancel_event
+        )
+        return self.pipeline.run(test_cases)
     
     def evaluate_dataset(self, dataset: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -154,31 +296,43 @@ class CodeSearchEvaluator:
         
         # 重置评估结果
         self.evaluation_results = []
+        self.pipeline = None
         total_start = time.time()  # 记录总开始时间
         
-        # 批量评估
-        for i, test_case in enumerate(test_cases):
-            self.logger.info(f"进度: {i+1}/{len(test_cases)}")
-            
-            try:
-                result = self.evaluate_single_query(test_case)
-                self.evaluation_results.append(result)
+        if self.config["performance"].get("pipeline", False):
+            # 流水线评估：请求、评分和写出并行执行
+            self.evaluation_results = self._evaluate_pipelined(test_cases)
+        else:
+            # 顺序评估
+            performance = self.config["performance"]
+            request_interval = performance.get("request_interval", performance["retry_delay"])
+            for i, test_case in enumerate(test_cases):
+                if self.cancel_event.is_set():
+                    result = CaseResult.failed(test_case, CANCELLED_ERROR, time.time(), 0.0)
+                    self.evaluation_results.append(result)
+                    self._emit_result(result)
+                    continue
+                self.logger.info("进度: %d/%d", i + 1, len(test_cases))
+                root = self.tracer.start_span("evaluate_case", self._trace_attributes(test_case), new_trace=True)
                 
-                # 控制请求频率
-                if i < len(test_cases) - 1:
-                    time.sleep(self.config["performance"]["retry_delay"])
+                try:
+                    with self.tracer.activate(root), self.tracer.span("fetch_and_score"):
+                        result = self.evaluate_single_query(test_case)
                     
-            except Exception as e:
-                self.logger.error(f"评估测试案例失败 {test_case['idx']}: {e}")
-                # 记录失败的案例
-                self.evaluation_results.append({
-                    "idx": test_case["idx"],
-                    "query": test_case["query"],
-                    "category": test_case.get("category", "unknown"),
-                    "error": str(e),
-                    "success": False,
-                    "timestamp": datetime.now().isoformat()
-                })
+                    # 控制请求频率（取消时立即结束等待）
+                    if i < len(test_cases) - 1:
+                        with self.tracer.activate(root), self.tracer.span("rate_limit.wait"):
+                            self.cancel_event.wait(request_interval)
+                        
+                except Exception as e:
+                    self.logger.error(f"评估测试案例失败 {test_case['idx']}: {e}")
+                    # 记录失败的案例
+                    result = CaseResult.failed(test_case, str(e), time.time())
+                
+                self.evaluation_results.append(result)
+                with self.tracer.activate(root), self.tracer.span("persist", {"sinks": len(self.result_sinks)}):
+                    self._emit_result(result)
+                finish_case_trace(root, result)
         
         # 计算总耗时和平均耗时
         total_elapsed = time.time() - total_start
@@ -186,8 +340,17 @@ class CodeSearchEvaluator:
         
         self.logger.info(f"评估完成 | 总耗时: {total_elapsed:.2f}秒 | 平均每个案例: {avg_elapsed:.2f}秒")
         
+        pipeline_stats = self.pipeline.stats() if self.pipeline else None
+        if pipeline_stats:
+            for name, stage in pipeline_stats["stages"].items():
+                self.logger.info(
+                    f"流水线阶段 {name}: 处理 {stage['processed']} 个, 利用率 {stage['utilization']:.1%}, "
+                    f"平均队列深度 {stage['avg_queue_depth']:.1f}, 最大队列深度 {stage['max_queue_depth']}"
+                )
+        
         # 计算汇总指标
         self.summary_metrics = self._calculate_summary_metrics()
+        latency = self._calculate_latency()
         
         # 计算分类别指标
         category_metrics = self.category_evaluator.evaluate_by_category(
@@ -203,7 +366,10 @@ class CodeSearchEvaluator:
                 "successful_evaluations": len([r for r in self.evaluation_results if r.get("success", False)]),
                 "failed_evaluations": len([r for r in self.evaluation_results if not r.get("success", False)]),
                 "total_elapsed_time": total_elapsed,
-                "avg_elapsed_time": avg_elapsed
+                "avg_elapsed_time": avg_elapsed,
+                "pipeline": pipeline_stats,
+                "latency": latency,
+                "replicas": self.api_client.replica_stats()
             },
             "summary_metrics": self.summary_metrics,
             "category_metrics": category_metrics,
@@ -238,6 +404,81 @@ class CodeSearchEvaluator:
             }
         }
     
+    def _calculate_latency(self) -> Dict[str, Any]:
+        """计算整体和各类别的延迟分位数、直方图和最慢查询（按本次使用的检索方法标注）"""
+        from utils.latency import LatencyTracker
+        
+        latency_config = self.config.get("evaluation", {}).get("latency", {})
+        tracker = LatencyTracker(
+            slowest=latency_config.get("slowest_queries", 5),
+            relative_accuracy=latency_config.get("relative_accuracy", 0.01)
+        )
+        for result in self.evaluation_results:
+            tracker.add(result)
+        
+        latency = tracker.summary(bins=latency_config.get("histogram_bins", 10))
+        latency["method"] = self.api_client.method
+        latency["rank_method"] = self.api_client.rank_method
+        return latency
+    
+    def get_problematic_queries(self, threshold: float = 0.4) -> List[Dict[str, Any]]:
+        """
+        找出总分低于阈值的查询并分析原因
+
+        检索结果已溢写到磁盘时，只读回这些问题查询的检索结果
+
+        Args:
+            threshold: 总分阈值
+
+        Returns:
+            List[Dict]: 问题查询（按总分从低到高），包含query、category、各项分数和issues
+        """
+        problematic = []
+        for result in self.evaluation_results:
+            if not result.get("success", False) or result.get("total_score", 0.0) >= threshold:
+                continue
+            problematic.append({
+                "idx": result.get("idx"),
+                "query": result.get("query"),
+                "category": result.get("category", "unknown"),
+                "total_score": result.get("total_score", 0.0),
+                "relevance": result.get("relevance", 0.0),
+                "completeness": result.get("completeness", 0.0),
+                "usability": result.get("usability", 0.0),
+                "issues": self._diagnose(result)
+            })
+        problematic.sort(key=lambda item: item["total_score"])
+        return problematic
+    
+    def _diagnose(self, result: Dict[str, Any]) -> List[str]:
+        """根据检索结果和期望结果列出低分原因"""
+        actual_results = result.get("actual_results") or []
+        if not actual_results:
+            return ["没有返回检索结果"]
+        
+        normalize = self.metrics._normalize_path
+        actual_paths = [normalize(r.get("path", "")) for r in actual_results]
+        expected_paths = [normalize(r.get("path", "")) for r in result.get("expected_results", [])]
+        missing = [path for path in expected_paths if path not in actual_paths]
+        
+        issues = []
+        if missing:
+            issues.append(f"{len(missing)}/{len(expected_paths)} 个期望文件未被检索到")
+        ranks = [actual_paths.index(path) + 1 for path in expected_paths if path in actual_paths]
+        if ranks:
+            issues.append(f"首个相关结果排在第 {min(ranks)} 位")
+        return issues
+    
+    def cancel(self) -> None:
+        """取消正在进行的评估：不再发出新请求，尚未请求的案例记为失败，evaluate_dataset 随后正常返回"""
+        self.cancel_event.set()
+    
+    def close(self) -> None:
+        """释放评估器资源（删除检索结果溢写文件，之后不能再读取溢写的检索结果）"""
+        if self.spill_store is not None:
+            self.spill_store.close()
+            self.spill_store = None
+    
     def save_results(self, results: Dict[str, Any], output_path: str) -> None:
         """
         保存评估结果到文件
@@ -246,19 +487,26 @@ class CodeSearchEvaluator:
             results: 评估结果
             output_path: 输出文件路径
         """
+        serialization = self.config.get("serialization", {})
+        
         try:
-            # 确保输出目录存在
-            output_dir = os.path.dirname(output_path)
-            if output_dir and not os.path.exists(output_dir):
-                os.makedirs(output_dir)
+            # 流式写入临时文件后原子替换，写入中途崩溃不会损坏已有结果
+            stats = write_json_atomic(
+                results,
+                output_path,
+                backend=serialization.get("backend", "auto"),
+                indent=serialization.get("indent", 2)
+            )
             
-            # 保存结果
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
+            # 记录本次写入的序列化耗时和文件大小（文件本身无法包含自己的最终大小，
+            # 因此写入后更新到内存中的meta，供报告和后续保存使用）
+            results.setdefault("meta", {})["serialization"] = stats
             
-            self.logger.info(f"评估结果已保存到: {output_path}")
+            self.logger.info(
+                f"评估结果已保存到: {output_path} "
+                f"({stats['backend']}, {stats['serialize_seconds']:.3f}秒, {stats['file_bytes']}字节)"
+            )
             
         except Exception as e:
             self.logger.error(f"保存评估结果时出错: {str(e)}")
             raise
-    
\ No newline at end of file
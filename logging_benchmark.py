@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+日志开销基准测试
+在多线程并发下比较评估热路径的日志开销：
+改动前（f-string立即格式化 + 同步控制台/文件处理器）与
+改动后（%参数延迟格式化 + QueueHandler/QueueListener 后台写日志）
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import LOGGING_CONFIG
+from utils.logging_setup import configure_logging, stop_logging
+
+# 与评估热路径中每个案例输出的日志相同的内容
+QUERY = {"query": "积分商品列表样式", "category": "style"}
+PARAMS = {"q": QUERY["query"], "limit": 10, "project_id": "17", "method": "hyde", "rank_method": "hybrid"}
+RESULT = {"results": [{"path": f"src/components/Item{i}.vue", "score": 0.9 - i * 0.05} for i in range(10)]}
+METRICS = {"total_score": 0.734, "relevance": 0.812, "completeness": 0.667, "usability": 0.701}
+ELAPSED = 0.42
+
+api_logger = logging.getLogger("utils.api_client")
+eval_logger = logging.getLogger("evaluator")
+
+
+def log_case_eager():
+    """改动前：f-string在调用日志前就已格式化，即使日志级别未开启"""
+    api_logger.info(f"发起代码检索请求: {QUERY['query']}")
+    api_logger.debug(f"请求参数: {PARAMS}")
+    api_logger.info(f"检索成功，返回 {len(RESULT.get('results', []))} 个结果")
+    eval_logger.info(f"开始评估查询: {QUERY['query']}")
+    eval_logger.info(
+        f"总分: {METRICS['total_score']:.3f} "
+        f"(相关性={METRICS['relevance']:.3f}, 全面性={METRICS['completeness']:.3f}, 可用性={METRICS['usability']:.3f}) | "
+        f"用时: {ELAPSED:.2f}秒"
+    )
+
+
+def log_case_lazy():
+    """改动后：%参数只在日志级别开启时才格式化"""
+    api_logger.info("发起代码检索请求: %s", QUERY["query"])
+    api_logger.debug("请求参数: %s", PARAMS)
+    api_logger.info("检索成功，返回 %d 个结果", len(RESULT.get("results", [])))
+    eval_logger.info("开始评估查询: %s", QUERY["query"])
+    eval_logger.info(
+        "总分: %.3f (相关性=%.3f, 全面性=%.3f, 可用性=%.3f) | 用时: %.2f秒",
+        METRICS["total_score"], METRICS["relevance"], METRICS["completeness"], METRICS["usability"], ELAPSED
+    )
+
+
+def no_logging():
+    """基线：不输出日志"""
+
+
+def run_workers(log_case, threads: int, cases_per_thread: int) -> float:
+    """
+    threads个线程并发执行，每个线程模拟cases_per_thread个案例
+
+    Returns:
+        float: 所有线程完成的墙钟时间（秒）
+    """
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for _ in range(cases_per_thread):
+            log_case()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def measure(name: str, log_case, level: int, use_queue: bool, json_format: bool,
+            threads: int, cases_per_thread: int, work_dir: str):
+    """
+    测量一种日志配置
+
+    Returns:
+        Dict: {"name", "wall", "drain"}，drain为队列模式下后台线程写完剩余日志的时间
+    """
+    log_file = os.path.join(work_dir, f"{name}.log")
+    # 控制台输出写入空设备，只保留处理器本身的开销
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stderr(devnull):
+        configure_logging(
+            level, LOGGING_CONFIG["format"], log_file=log_file,
+            console=True, use_queue=use_queue, json_format=json_format
+        )
+        wall = run_workers(log_case, threads, cases_per_thread)
+        start = time.perf_counter()
+        stop_logging()
+        drain = time.perf_counter() - start
+        logging.getLogger().handlers.clear()
+    return {"name": name, "wall": wall, "drain": drain}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较评估热路径在并发下的日志开销")
+    parser.add_argument("--threads", type=int, default=50, help="并发线程数 (默认: 50)")
+    parser.add_argument("--cases", type=int, default=200, help="每个线程模拟的案例数 (默认: 200)")
+    args = parser.parse_args()
+
+    total_cases = args.threads * args.cases
+    scenarios = [
+        # 名称, 日志函数, 级别, 队列, JSON
+        ("debug模式 改动前: f-string + 同步处理器", log_case_eager, logging.INFO, False, False),
+        ("debug模式 改动后: 延迟格式化 + 队列", log_case_lazy, logging.INFO, True, False),
+        ("debug模式 改动后: 延迟格式化 + 队列 + JSON", log_case_lazy, logging.INFO, True, True),
+        ("默认模式 改动前: f-string (WARNING级别)", log_case_eager, logging.WARNING, False, False),
+        ("默认模式 改动后: 延迟格式化 (WARNING级别)", log_case_lazy, logging.WARNING, True, False),
+    ]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        baseline = measure("baseline", no_logging, logging.INFO, False, False,
+                           args.threads, args.cases, work_dir)["wall"]
+        results = [
+            measure(f"scenario{i}", log_case, level, use_queue, json_format, args.threads, args.cases, work_dir)
+            for i, (_, log_case, level, use_queue, json_format) in enumerate(scenarios)
+        ]
+
+    print(f"\n{args.threads} 个线程并发，共 {total_cases} 个案例，每个案例 5 条热路径日志")
+    print(f"{'场景':<40} {'单案例开销(µs)':>14} {'评估线程耗时(s)':>15} {'后台写出(s)':>12}")
+    for (name, *_), result in zip(scenarios, results):
+        overhead_us = (result["wall"] - baseline) / total_cases * 1e6
+        print(f"{name:<40} {overhead_us:>14.1f} {result['wall']:>15.3f} {result['drain']:>12.3f}")
+    print("\n单案例开销 = (评估线程完成时间 - 无日志基线) / 案例数，即日志给评估吞吐带来的额外耗时；")
+    print("队列模式下格式化和写文件由后台线程完成，剩余日志在评估结束后写出（后台写出列）。")
+
+
+if __name__ == "__main__":
+    main()
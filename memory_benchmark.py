@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+案例结果内存基准测试
+分别用原有的字典结构、紧凑记录（utils.records）和溢写到磁盘的紧凑记录（utils.spill_store）
+保存N个案例结果，比较每1万个案例的峰值RSS增量和序列化耗时
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# 每个案例返回的检索结果数量（与 API_CONFIG["limit"] 默认值一致）
+HITS_PER_CASE = 10
+# 模拟代码库中的文件数量，不同案例返回的路径会重复
+PATH_POOL_SIZE = 5000
+# --content 时每条检索结果附带的代码片段长度（字符）
+CONTENT_LENGTH = 200
+
+
+def make_responses(count: int, seed: int = 42, content: bool = False):
+    """
+    生成count个检索接口响应（JSON字节串，解码时每个案例得到独立的字符串对象，与真实请求一致）
+
+    content为True时每条结果另带 content（代码片段）和 line 字段
+    """
+    rng = random.Random(seed)
+    paths = [f"src/views/module{i // 50}/components/Component{i}.vue" for i in range(PATH_POOL_SIZE)]
+    for _ in range(count):
+        hits = [{"path": path, "score": round(rng.random(), 4)} for path in rng.sample(paths, HITS_PER_CASE)]
+        if content:
+            for hit in hits:
+                hit["content"] = f"<template><div class=\"{hit['path']}\">{rng.random()}</div></template>".ljust(
+                    CONTENT_LENGTH, " ")
+                hit["line"] = rng.randint(1, 500)
+        yield json.dumps({"results": hits}).encode("utf-8"), paths
+
+
+def legacy_result(query, metrics, actual_results, elapsed):
+    """改动前 _score_query 构建的案例结果字典"""
+    evaluation_result = {
+        "idx": query.get("idx"),
+        "query": query["query"],
+        "category": query.get("category", "unknown"),
+        "description": query.get("description", ""),
+        "metrics": metrics,
+        "expected_results": query["expected_results"],
+        "actual_results": actual_results,
+        "timestamp": datetime.now().isoformat(),
+        "success": True,
+        "total_score": metrics["total_score"],
+        "relevance": metrics["relevance"],
+        "completeness": metrics["completeness"],
+        "usability": metrics["usability"]
+    }
+    evaluation_result["elapsed_time"] = elapsed
+    return evaluation_result
+
+
+def run_child(mode: str, count: int, content: bool = False) -> None:
+    """在子进程中构建count个案例结果并输出测量数据（JSON）"""
+    from utils.metrics import EvaluationMetrics
+    from utils.records import CaseResult
+    from utils.serializer import get_backend, to_plain
+    from utils.spill_store import SpillStore
+
+    metrics_calculator = EvaluationMetrics({})
+    responses = list(make_responses(count, content=content))
+    rng = random.Random(7)
+    queries = []
+    for i, (_, paths) in enumerate(responses):
+        queries.append({
+            "idx": str(i),
+            "query": f"查询语句 {i}",
+            "category": rng.choice(["style", "function", "layout"]),
+            "description": "",
+            "expected_results": [{"path": p} for p in rng.sample(paths, 2)]
+        })
+    bodies = [body for body, _ in responses]
+    del responses
+
+    spill_store = None
+    if mode == "spill":
+        spill_store = SpillStore(os.path.join(tempfile.mkdtemp(), "ranked.jsonl"))
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    results = []
+    for query, body in zip(queries, bodies):
+        actual_results = json.loads(body)["results"]
+        metrics = metrics_calculator.calculate_new_framework_metrics(actual_results, query["expected_results"])
+        if mode == "dict":
+            results.append(legacy_result(query, metrics, actual_results, 0.1))
+        else:
+            results.append(CaseResult.succeeded(query, metrics, actual_results, time.time(), 0.1, spill_store))
+    build_seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    encoder = get_backend("auto", indent=None)
+    serialized_bytes = sum(len(encoder.dumps(to_plain(result))) for result in results)
+    serialize_seconds = time.perf_counter() - start
+    if spill_store:
+        spill_store.close()
+        os.rmdir(os.path.dirname(spill_store.path))
+
+    print(json.dumps({
+        "mode": mode,
+        "cases": count,
+        "peak_rss_delta_mb": (peak_kb - baseline_kb) / 1024,
+        "build_seconds": build_seconds,
+        "serialize_seconds": serialize_seconds,
+        "serialized_bytes": serialized_bytes,
+        "backend": encoder.name
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较字典结构、紧凑记录与溢写到磁盘时的案例结果内存占用")
+    parser.add_argument("--cases", type=int, default=100000, help="案例数量 (默认: 100000)")
+    parser.add_argument("--content", action="store_true",
+                        help=f"检索结果附带 content（{CONTENT_LENGTH}字符的代码片段）和 line 字段")
+    parser.add_argument("--child", choices=["dict", "records", "spill"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.cases, args.content)
+        return
+
+    fields = "path/score/content/line" if args.content else "path/score"
+    print(f"{args.cases} 个案例，每个案例 {HITS_PER_CASE} 条检索结果（{fields}）")
+    print(f"{'存储方式':<12} {'峰值RSS增量(MB)':>16} {'每1万案例(MB)':>14} {'构建耗时(s)':>12} {'序列化耗时(s)':>14}")
+    for mode in ("dict", "records", "spill"):
+        # 每种方式在独立进程中运行，避免互相影响峰值RSS
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, "--cases", str(args.cases)]
+            + (["--content"] if args.content else []),
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        per_10k = result["peak_rss_delta_mb"] / args.cases * 10000
+        print(
+            f"{mode:<12} {result['peak_rss_delta_mb']:>16.1f} {per_10k:>14.1f} "
+            f"{result['build_seconds']:>12.2f} {result['serialize_seconds']:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@
 import os
 import sys
 import logging
+import importlib.util
 from datetime import datetime
 import json
 
@@ -170,10 +171,10 @@ def check_dependencies():
     missing_packages = []
     
     for package in required_packages:
-        try:
-            __import__(package)
+        # 只检查是否已安装，不实际导入（numpy等导入较慢）
+        if importlib.util.find_spec(package) is not None:
             print(f"{package}")
-        except ImportError:
+        else:
             print(f"{package} (未安装)")
             missing_packages.append(package)
     
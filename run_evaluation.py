@@ -8,54 +8,43 @@ import sys
 import argparse
 import logging
 import json
+import shutil
+import contextlib
+import threading
 from datetime import datetime
 from pathlib import Path
-import numpy as np
-import plotly.graph_objects as go
-import re
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(__file__))
 
 from config import (
     API_CONFIG, EVALUATION_CONFIG, CATEGORY_CONFIG, 
-    PERFORMANCE_CONFIG, PATH_CONFIG, LOGGING_CONFIG,
+    PERFORMANCE_CONFIG, PATH_CONFIG, LOGGING_CONFIG, SAMPLING_CONFIG, REPORT_CONFIG,
+    SERIALIZATION_CONFIG, METRICS_CONFIG, TRACING_CONFIG, REGRESSION_CONFIG, MULTI_TARGET_CONFIG,
     validate_config
 )
 from evaluator import CodeSearchEvaluator
 from utils.result_formatter import format_evaluation_result, print_formatted_result, format_summary_with_explanations
 
-def setup_logging(debug=False):
+# numpy、plotly、SQLite历史库、列式存储等较重的模块只在需要的代码路径中导入，
+# 保证 --limit 1 等快速运行尽快发出第一个请求（见 startup_benchmark.py）
+
+def setup_logging(debug=False, json_format=None):
     """设置日志配置"""
+    from utils.logging_setup import configure_logging
+    
     # 在debug模式下使用INFO级别，否则使用WARNING级别
     level = logging.INFO if debug else logging.WARNING
     
-    # 创建格式化器
-    formatter = logging.Formatter(LOGGING_CONFIG["format"])
-    
-    # 设置根日志器
-    logger = logging.getLogger()
-    logger.setLevel(level)
-    
-    # 清除现有处理器
-    logger.handlers.clear()
-    
-    # 控制台处理器
-    if LOGGING_CONFIG["console_output"]:
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(level)
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
-    
-    # 文件处理器
-    if LOGGING_CONFIG["file"]:
-        file_handler = logging.FileHandler(
-            LOGGING_CONFIG["file"], 
-            encoding='utf-8'
-        )
-        file_handler.setLevel(level)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+    # 日志由后台线程写出，评估线程只负责入队
+    configure_logging(
+        level,
+        LOGGING_CONFIG["format"],
+        log_file=LOGGING_CONFIG["file"],
+        console=LOGGING_CONFIG["console_output"],
+        use_queue=LOGGING_CONFIG["queue"],
+        json_format=LOGGING_CONFIG["json"] if json_format is None else json_format
+    )
 
 def create_directories():
     """创建必要的目录"""
@@ -68,62 +57,43 @@ def create_directories():
     for directory in directories:
         Path(directory).mkdir(parents=True, exist_ok=True)
 
-def save_history_score(results, timestamp):
-    """保存历史分数"""
+def open_history():
+    """打开SQLite历史数据库（首次打开时自动导入旧版历史数据）"""
+    from utils.history_store import open_history_store
+    
+    return open_history_store(
+        PATH_CONFIG["history_db"],
+        PATH_CONFIG["history_dir"],
+        PATH_CONFIG["reports_dir"]
+    )
+
+def save_history_score(results, timestamp, saved_history=True, debug=False):
+    """保存本次评估到历史数据库"""
     logger = logging.getLogger(__name__)
     
     try:
-        # 创建历史分数文件
-        history_scores_path = os.path.join(PATH_CONFIG["history_dir"], "scores_history.json")
+        with open_history() as store:
+            store.record_run(results, timestamp, saved_history=saved_history)
         
-        # 读取现有历史记录
-        if os.path.exists(history_scores_path):
-            with open(history_scores_path, 'r', encoding='utf-8') as f:
-                history_scores = json.load(f)
-        else:
-            history_scores = []
-        
-        # 提取当前评估的分数
-        summary = results["summary_metrics"]
-        if "new_framework_performance" in summary:
-            new_framework = summary["new_framework_performance"]
-            current_score = {
-                "timestamp": timestamp,
-                "total_score": new_framework["avg_total_score"],
-                "relevance": new_framework["avg_relevance"],
-                "completeness": new_framework["avg_completeness"],
-                "usability": new_framework["avg_usability"]
-            }
-            
-            # 添加到历史记录
-            history_scores.append(current_score)
-            
-            # 保存更新后的历史记录
-            with open(history_scores_path, 'w', encoding='utf-8') as f:
-                json.dump(history_scores, f, ensure_ascii=False, indent=2)
-            
-            logger.info(f"历史分数已保存: {history_scores_path}")
-            return True
+        logger.info(f"评估历史已保存: {PATH_CONFIG['history_db']}")
+        return True
             
     except Exception as e:
         logger.error(f"保存历史分数失败: {e}")
-        if args.debug:
+        if debug:
             logger.exception("详细错误信息:")
         return False
 
-def generate_history_chart():
+def generate_history_chart(debug=False):
     """生成历史分数折线图"""
     logger = logging.getLogger(__name__)
     
     try:
+        import plotly.graph_objects as go
+        
         # 读取历史分数
-        history_scores_path = os.path.join(PATH_CONFIG["history_dir"], "scores_history.json")
-        if not os.path.exists(history_scores_path):
-            logger.error("历史分数文件不存在")
-            return False
-            
-        with open(history_scores_path, 'r', encoding='utf-8') as f:
-            history_scores = json.load(f)
+        with open_history() as store:
+            history_scores = store.score_history()
         
         if not history_scores:
             logger.error("没有历史分数数据")
@@ -179,76 +149,25 @@ def generate_history_chart():
         
     except Exception as e:
         logger.error(f"生成历史分数折线图失败: {e}")
-        if args.debug:
+        if debug:
             logger.exception("详细错误信息:")
         return False
 
-def generate_api_performance_chart():
+def generate_api_performance_chart(debug=False):
     """生成API性能对比图"""
     logger = logging.getLogger(__name__)
     
     try:
-        # 读取所有历史报告
-        reports_dir = PATH_CONFIG["reports_dir"]
-        report_files = [f for f in os.listdir(reports_dir) if f.startswith("evaluation_report_") and f.endswith(".md")]
+        import plotly.graph_objects as go
         
-        if not report_files:
-            logger.error("没有找到历史报告")
-            return False
+        # 按搜索方法和排序方法汇总历史评估
+        with open_history() as store:
+            api_metrics = store.method_performance()
         
-        # 收集数据
-        api_data = {}  # {method: {rank_method: {"scores": [], "times": []}}}
-        
-        for report_file in report_files:
-            with open(os.path.join(reports_dir, report_file), 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-                # 提取搜索方法信息
-                method_match = re.search(r"\*\*搜索方法\*\*: (.*?)\n", content)
-                if not method_match:
-                    continue
-                method = method_match.group(1)
-                
-                # 提取排序方法信息
-                rank_method_match = re.search(r"\*\*排序方法\*\*: (.*?)\n", content)
-                if not rank_method_match:
-                    continue
-                rank_method = rank_method_match.group(1)
-                
-                # 提取平均分数
-                score_match = re.search(r"\*\*平均总分\*\*: ([\d.]+)", content)
-                if not score_match:
-                    continue
-                score = float(score_match.group(1))
-                
-                # 提取平均时间
-                time_match = re.search(r"\*\*平均每个案例耗时\*\*: ([\d.]+)秒", content)
-                if not time_match:
-                    continue
-                time = float(time_match.group(1))
-                
-                # 存储数据
-                if method not in api_data:
-                    api_data[method] = {}
-                if rank_method not in api_data[method]:
-                    api_data[method][rank_method] = {"scores": [], "times": []}
-                api_data[method][rank_method]["scores"].append(score)
-                api_data[method][rank_method]["times"].append(time)
-        
-        if not api_data:
+        if not api_metrics:
             logger.error("没有找到有效的API数据")
             return False
         
-        # 计算每个方法组合的平均值
-        api_metrics = {}
-        for method, rank_methods in api_data.items():
-            api_metrics[method] = {}
-            for rank_method, data in rank_methods.items():
-                api_metrics[method][rank_method] = {
-                    "avg_score": sum(data["scores"]) / len(data["scores"]),
-                    "avg_time": sum(data["times"]) / len(data["times"])
-                }
-        
         # 创建图表
         fig = go.Figure()
         
@@ -328,13 +247,21 @@ def generate_api_performance_chart():
         
     except Exception as e:
         logger.error(f"生成搜索方法性能对比图失败: {e}")
-        if args.debug:
+        if debug:
             logger.exception("详细错误信息:")
         return False
 
+def profile_stage(profiler, name):
+    """--profile 时剖析指定阶段，否则不做任何事情"""
+    return profiler.stage(name) if profiler else contextlib.nullcontext()
+
 def run_evaluation(args):
     """运行评估"""
     logger = logging.getLogger(__name__)
+    profiler = None
+    exporter = None
+    evaluator = None
+    case_sections_path = None
     
     try:
         # 验证配置
@@ -345,17 +272,33 @@ def run_evaluation(args):
         create_directories()
         
         # 构建完整配置
+        performance = PERFORMANCE_CONFIG
+        if args.spill:
+            performance = dict(performance, spill_results=True)
+        if args.retries is not None:
+            performance = dict(performance, retry_in_evaluation=True, retry_attempts=args.retries)
         config = {
             "api": API_CONFIG,
             "evaluation": EVALUATION_CONFIG,
             "categories": CATEGORY_CONFIG,
-            "performance": PERFORMANCE_CONFIG,
-            "paths": PATH_CONFIG
+            "performance": performance,
+            "paths": PATH_CONFIG,
+            "serialization": SERIALIZATION_CONFIG
         }
         
         # 创建评估器
         logger.info("初始化代码检索评估器...")
         evaluator = CodeSearchEvaluator(config)
+        if evaluator.spill_store:
+            logger.info(f"检索结果将溢写到磁盘: {evaluator.spill_store.path}")
+        
+        # 分阶段性能剖析
+        if args.profile:
+            from utils.profiler import StageProfiler
+            profile_dir = os.path.join(PATH_CONFIG["profile_dir"], datetime.now().strftime("%Y%m%d_%H%M%S"))
+            profiler = StageProfiler(profile_dir)
+            evaluator.thread_wrapper = profiler.wrap_thread
+            logger.info(f"已启用分阶段性能剖析，输出目录: {profile_dir}")
         
         # 测试API连接
         if not evaluator.api_client.test_connection():
@@ -372,7 +315,8 @@ def run_evaluation(args):
             logger.error(f"测试数据集文件不存在: {dataset_path}")
             return False
         
-        dataset = evaluator.load_test_dataset(dataset_path)
+        with profile_stage(profiler, "load_dataset"):
+            dataset = evaluator.load_test_dataset(dataset_path)
         
         # 如果指定了测试案例数量限制
         if args.limit and args.limit > 0:
@@ -389,50 +333,144 @@ def run_evaluation(args):
             ]
             logger.info(f"按类别 '{args.category}' 过滤: {original_count} -> {len(dataset['test_cases'])}")
         
+        # 如果启用了分层抽样
+        sample_plan = None
+        if args.sample and dataset["test_cases"]:
+            sample_plan = build_sample_plan(dataset["test_cases"], args)
+            dataset["test_cases"] = sample_plan["test_cases"]
+            logger.info(
+                f"分层抽样: {sample_plan['population_size']} -> {sample_plan['sample_size']} "
+                f"(seed={sample_plan['seed']}, 目标置信区间宽度={sample_plan['target_ci_width']})"
+            )
+        
         if not dataset["test_cases"]:
             logger.error("没有测试案例需要评估")
             return False
         
+        # 回归检查的基线在评估前加载，基线不存在时不必等评估跑完才报错
+        baseline = None
+        if args.baseline:
+            from utils.regression import load_baseline
+            baseline = load_baseline(args.baseline, PATH_CONFIG["history_db"])
+            logger.info(f"已加载基线评估: {baseline['label']} ({len(baseline['cases'])} 个案例)")
+        
+        # 评估过程中逐个落盘完成的案例，并同步写出报告的详细样例部分
+        from utils.pipeline import JsonlResultWriter
+        case_stream = JsonlResultWriter(PATH_CONFIG["case_stream"], SERIALIZATION_CONFIG["backend"])
+        case_sections_path = os.path.join(PATH_CONFIG["reports_dir"], f".case_sections_{os.getpid()}.md")
+        case_report = StreamingCaseReport(case_sections_path)
+        evaluator.add_result_sink(case_stream)
+        evaluator.add_result_sink(case_report)
+        
+        # Prometheus / OpenMetrics 指标导出
+        if args.metrics_port is not None or METRICS_CONFIG["enabled"]:
+            from utils.metrics_exporter import EvaluationMetricsExporter
+            exporter = EvaluationMetricsExporter(METRICS_CONFIG["latency_buckets"])
+            port = args.metrics_port if args.metrics_port is not None else METRICS_CONFIG["port"]
+            exporter.serve(METRICS_CONFIG["host"], port)
+            evaluator.set_metrics_exporter(exporter)
+            exporter.start_run(len(dataset["test_cases"]))
+        
+        # 链路追踪：每个案例一条trace
+        tracer = None
+        if args.trace or TRACING_CONFIG["enabled"]:
+            from utils.tracing import Tracer
+            tracer = Tracer(TRACING_CONFIG["service_name"])
+            evaluator.set_tracer(tracer)
+        
         # 执行评估
         logger.info("开始执行代码检索评估...")
-        results = evaluator.evaluate_dataset(dataset)
+        try:
+            with profile_stage(profiler, "evaluate"):
+                results = evaluator.evaluate_dataset(dataset)
+        finally:
+            case_stream.close()
+            case_report.close()
+        results["meta"]["dataset"] = dataset_path
+        
+        # 根据样本估计全量数据集分数
+        if sample_plan:
+            from utils.sampling import estimate_stratified_score
+            results["sampling"] = estimate_stratified_score(results["detailed_results"], sample_plan)
+        
+        # 与基线比较（哈希连接idx）
+        if baseline:
+            from utils.regression import compare_with_baseline, log_regression
+            regression_config = dict(REGRESSION_CONFIG)
+            if args.max_p95_increase is not None:
+                regression_config["max_p95_increase"] = args.max_p95_increase
+            results["regression"] = compare_with_baseline(results["detailed_results"], baseline, regression_config)
+            log_regression(results["regression"])
         
         # 保存结果
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # 保存最新结果
-        latest_path = PATH_CONFIG["latest_result"]
-        evaluator.save_results(results, latest_path)
-        
-        # 保存历史结果
-        if args.save_history:
-            history_path = os.path.join(
-                PATH_CONFIG["history_dir"],
-                f"evaluation_{timestamp}.json"
-            )
-            evaluator.save_results(results, history_path)
-            logger.info(f"历史结果已保存: {history_path}")
+        # 导出链路追踪
+        if tracer:
+            trace_path = os.path.join(PATH_CONFIG["trace_dir"], f"trace_{timestamp}.json")
+            span_count = tracer.export_otlp_json(trace_path)
+            by_category = tracer.category_summary()
+            results["meta"]["tracing"] = {
+                "file": trace_path,
+                "spans": span_count,
+                "by_category": by_category,
+                "retries": sum(spans.get("retry.wait", {}).get("count", 0) for spans in by_category.values()),
+                "detached": tracer.detached_spans()
+            }
+            logger.info(f"链路追踪已导出: {trace_path} ({span_count} 个span)")
+            if results["meta"]["tracing"]["detached"]:
+                # 重试、请求等span应挂在各自案例的trace下，出现这种情况说明某个阶段丢失了追踪上下文
+                logger.warning(f"以下span没有挂在案例trace下: {results['meta']['tracing']['detached']}")
         
-        # 保存历史分数
-        if args.save_history:
-            save_history_score(results, timestamp)
+        with profile_stage(profiler, "save_results"):
+            # 保存最新结果
+            latest_path = PATH_CONFIG["latest_result"]
+            evaluator.save_results(results, latest_path)
+            if REPORT_CONFIG["save_columnar"]:
+                from utils.result_store import save_columnar_results
+                save_columnar_results(results, PATH_CONFIG["latest_columnar"])
+                logger.info(f"列式结果已保存到: {PATH_CONFIG['latest_columnar']}")
+            
+            # 保存历史结果
+            if args.save_history:
+                history_path = os.path.join(
+                    PATH_CONFIG["history_dir"],
+                    f"evaluation_{timestamp}.json"
+                )
+                evaluator.save_results(results, history_path)
+                if REPORT_CONFIG["save_columnar"]:
+                    save_columnar_results(results, os.path.splitext(history_path)[0] + ".npz")
+                logger.info(f"历史结果已保存: {history_path}")
         
         # 生成报告（默认行为）
-        generate_reports(results, timestamp)
+        with profile_stage(profiler, "generate_reports"):
+            generate_reports(results, timestamp, case_sections_path)
+        
+        # 记录到历史数据库（--save-history 的评估计入历史分数趋势）
+        save_history_score(results, timestamp, saved_history=args.save_history, debug=args.debug)
         
         # 显示简要结果
         show_summary(results, args.debug)
         
+        # 基线回归检查结果
+        if "regression" in results:
+            show_regression(results["regression"])
+        
         # 识别问题查询
         if args.show_problems:
             show_problematic_queries(evaluator)
         
         # 生成历史分数折线图
         if args.show_history:
-            generate_history_chart()
-            generate_api_performance_chart()
+            with profile_stage(profiler, "generate_history_chart"):
+                generate_history_chart(args.debug)
+            with profile_stage(profiler, "generate_api_performance_chart"):
+                generate_api_performance_chart(args.debug)
         
         logger.info("评估完成!")
+        if "regression" in results and not results["regression"]["passed"]:
+            # 回归检查未通过时以非零状态退出，用于发布门禁
+            return False
         return True
         
     except Exception as e:
@@ -440,8 +478,236 @@ def run_evaluation(args):
         if args.debug:
             logger.exception("详细错误信息:")
         return False
+    
+    finally:
+        # 报告生成完毕后才删除检索结果溢写文件
+        if evaluator:
+            if evaluator.spill_store:
+                logger.info(
+                    f"检索结果溢写: {evaluator.spill_store.records} 个案例, {evaluator.spill_store.size} 字节"
+                )
+            evaluator.close()
+        
+        # 报告生成后（或评估出错时）删除临时的详细样例部分
+        if case_sections_path and os.path.exists(case_sections_path):
+            os.remove(case_sections_path)
+        
+        # 评估结束（包括出错）时写出最终指标并关闭指标服务
+        if exporter:
+            try:
+                exporter.write_textfile(METRICS_CONFIG["textfile"])
+            except OSError as e:
+                logger.error(f"写出指标文件失败: {e}")
+            exporter.close()
+        
+        # 出错时也输出已完成阶段的剖析结果
+        if profiler and profiler.stages:
+            summary_path = profiler.write_summary()
+            print("\n⏱️  分阶段性能剖析:")
+            print(profiler.format_table())
+            print(f"剖析文件已保存到: {profiler.output_dir} (汇总: {summary_path})")
+
+def run_multi_evaluation(args):
+    """并行评估多个 数据集/project_id 组合（--targets），输出汇总报告"""
+    from utils.multi_target import parse_target, RateLimiter, create_shared_session, MultiTargetRunner
+    from utils.api_client import create_api_client
+    from utils.serializer import write_json_atomic
+    
+    logger = logging.getLogger(__name__)
+    session = None
+    
+    try:
+        validate_config()
+        create_directories()
+        
+        # 加载各组合的测试案例（过滤条件对每个数据集分别生效）
+        targets = []
+        for value in args.targets:
+            target = parse_target(value, API_CONFIG["project_id"])
+            if not os.path.exists(target["dataset"]):
+                logger.error(f"测试数据集文件不存在: {target['dataset']}")
+                return False
+            with open(target["dataset"], "r", encoding="utf-8") as f:
+                test_cases = json.load(f).get("test_cases", [])
+            if args.limit and args.limit > 0:
+                test_cases = test_cases[:args.limit]
+            if args.category:
+                test_cases = [tc for tc in test_cases if tc.get("category") == args.category]
+            if not test_cases:
+                logger.error(f"组合 {target['label']} 没有测试案例需要评估")
+                return False
+            if any(item["label"] == target["label"] for item in targets):
+                logger.error(f"重复的组合: {target['label']}")
+                return False
+            target["test_cases"] = test_cases
+            targets.append(target)
+        
+        # 所有组合共享一个连接池和请求速率限制；每个组合按配置的并发数请求，不再使用每线程的请求间隔
+        probe = create_api_client(API_CONFIG)
+        session = create_shared_session(MULTI_TARGET_CONFIG["pool_size"], probe.session.headers)
+        probe.session.close()
+        probe.session = session
+        if not probe.test_connection():
+            logger.error("API连接失败，请检查服务状态")
+            return False
+        
+        config = {
+            "api": API_CONFIG,
+            "evaluation": EVALUATION_CONFIG,
+            "categories": CATEGORY_CONFIG,
+            "performance": dict(
+                PERFORMANCE_CONFIG, request_interval=0, concurrent_requests=MULTI_TARGET_CONFIG["concurrent_requests"]
+            ),
+            "paths": PATH_CONFIG,
+            "serialization": SERIALIZATION_CONFIG
+        }
+        runner = MultiTargetRunner(
+            config, session, RateLimiter(MULTI_TARGET_CONFIG["requests_per_second"]),
+            MULTI_TARGET_CONFIG["max_parallel"]
+        )
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_dir = os.path.join(PATH_CONFIG["multi_dir"], timestamp)
+        history_lock = threading.Lock()
+        
+        def record(row, results):
+            # 各组合的完整结果单独保存，汇总报告中引用
+            row["result_file"] = os.path.join(output_dir, f"{row['label']}.json")
+            write_json_atomic(results, row["result_file"], SERIALIZATION_CONFIG["backend"], SERIALIZATION_CONFIG["indent"])
+            print(f"完成 {row['label']}: {row['succeeded']}/{row['cases']} 个案例成功")
+            # SQLite连接不能跨线程使用，每个组合完成时单独打开
+            try:
+                with history_lock, open_history() as store:
+                    store.record_run(results, f"{timestamp}_{row['label']}", saved_history=args.save_history, source="multi")
+            except Exception as e:
+                logger.error(f"保存历史分数失败: {e}")
+        
+        logger.info(f"开始评估 {len(targets)} 个组合...")
+        multi = runner.run(targets, on_result=record)
+        multi["timestamp"] = timestamp
+        multi["config"] = {"api": API_CONFIG, "multi_target": MULTI_TARGET_CONFIG}
+        
+        summary_path = os.path.join(output_dir, "summary.json")
+        write_json_atomic(multi, summary_path, SERIALIZATION_CONFIG["backend"], SERIALIZATION_CONFIG["indent"])
+        report_path = os.path.join(PATH_CONFIG["reports_dir"], f"multi_report_{timestamp}.md")
+        generate_multi_report(multi, report_path)
+        
+        show_multi_summary(multi)
+        print(f"\n汇总结果已保存到: {summary_path}")
+        print(f"汇总报告已生成: {report_path}")
+        
+        if args.show_history:
+            generate_history_chart(args.debug)
+            generate_api_performance_chart(args.debug)
+        
+        logger.info("评估完成!")
+        return True
+        
+    except Exception as e:
+        logger.error(f"评估过程中发生错误: {e}")
+        if args.debug:
+            logger.exception("详细错误信息:")
+        return False
+    
+    finally:
+        if session is not None:
+            session.close()
+
+def generate_multi_report(multi, output_path):
+    """生成多数据集评估的Markdown汇总报告"""
+    rows = [(row["label"], row) for row in multi["targets"]] + [("**整体**", multi["overall"])]
+    
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("# 多数据集评估汇总报告\n\n")
+        f.write(f"- **评估批次**: {multi['timestamp']}\n")
+        f.write(f"- **组合数**: {len(multi['targets'])}\n")
+        f.write(f"- **总耗时**: {multi['elapsed']:.2f}秒（速率限制等待合计 {multi['rate_limit_wait']:.2f}秒）\n\n")
+        
+        f.write("## 评估指标\n\n")
+        f.write("| 组合 | 数据集 | project_id | 成功/案例 | 综合评分 | 相关性 | 全面性 | 可用性 |\n")
+        f.write("|------|--------|------------|-----------|----------|--------|--------|--------|\n")
+        for name, row in rows:
+            scores = " | ".join(
+                f"{row[key]:.3f}" if row[key] is not None else "-"
+                for key in ("avg_total_score", "avg_relevance", "avg_completeness", "avg_usability")
+            )
+            f.write(
+                f"| {name} | {row.get('dataset', '')} | {row.get('project_id', '')} | "
+                f"{row['succeeded']}/{row['cases']} | {scores} |\n"
+            )
+        f.write("\n整体平均分按成功案例数加权。\n\n")
+        
+        f.write("## 延迟分布\n\n")
+        f.write("| 组合 | 案例数 | 平均 | p50 | p90 | p99 | 最大 |\n")
+        f.write("|------|--------|------|-----|-----|-----|------|\n")
+        for name, row in rows:
+            stats = row["latency"]
+            f.write(
+                f"| {name} | {stats['count']} | {format_latency(stats['mean'])} | {format_latency(stats['p50'])} | "
+                f"{format_latency(stats['p90'])} | {format_latency(stats['p99'])} | {format_latency(stats['max'])} |\n"
+            )
+        f.write("\n整体分位数由各组合的流式草图合并计算，相对误差约1%。\n\n")
+        
+        f.write("## 详细结果\n\n")
+        for row in multi["targets"]:
+            if row.get("result_file"):
+                f.write(f"- {row['label']}: `{row['result_file']}`\n")
+
+def show_multi_summary(multi):
+    """显示多数据集评估的汇总表"""
+    print("\n" + "=" * 60)
+    print("多数据集评估结果摘要")
+    print("=" * 60)
+    print(f"{'组合':<28}{'成功':>8}{'总分':>8}{'相关性':>8}{'可用性':>8}{'p50':>9}{'p90':>9}")
+    print("-" * 78)
+    for name, row in [(row["label"], row) for row in multi["targets"]] + [("整体", multi["overall"])]:
+        total = f"{row['avg_total_score']:.3f}" if row["avg_total_score"] is not None else "-"
+        relevance = f"{row['avg_relevance']:.3f}" if row["avg_relevance"] is not None else "-"
+        usability = f"{row['avg_usability']:.3f}" if row["avg_usability"] is not None else "-"
+        print(
+            f"{name:<28}{row['succeeded']:>4}/{row['cases']:<3}{total:>8}{relevance:>9}{usability:>9}"
+            f"{format_latency(row['latency']['p50']):>9}{format_latency(row['latency']['p90']):>9}"
+        )
+    print(f"\n总耗时: {multi['elapsed']:.2f}秒，速率限制等待合计: {multi['rate_limit_wait']:.2f}秒")
+
+def build_sample_plan(test_cases, args):
+    """
+    构建分层抽样计划
+    
+    Args:
+        test_cases: 待抽样的测试案例
+        args: 命令行参数（ci_width/seed可覆盖SAMPLING_CONFIG）
+        
+    Returns:
+        Dict: 抽样计划
+    """
+    from utils.sampling import plan_stratified_sample, estimate_category_std
+    from utils.serializer import load_json
+    
+    logger = logging.getLogger(__name__)
+    
+    # 用上一次评估结果中各类别的标准差确定样本量，没有时使用先验标准差
+    previous_results = None
+    latest_path = PATH_CONFIG["latest_result"]
+    if SAMPLING_CONFIG["use_latest_result"] and os.path.exists(latest_path):
+        try:
+            previous_results = load_json(latest_path, SERIALIZATION_CONFIG["backend"])
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取上一次评估结果失败，使用先验标准差: {e}")
+    
+    category_std = estimate_category_std(previous_results, SAMPLING_CONFIG["prior_std"])
+    
+    return plan_stratified_sample(
+        test_cases,
+        ci_width=args.ci_width or SAMPLING_CONFIG["ci_width"],
+        confidence=SAMPLING_CONFIG["confidence"],
+        prior_std=SAMPLING_CONFIG["prior_std"],
+        category_std=category_std,
+        min_per_category=SAMPLING_CONFIG["min_per_category"],
+        seed=args.seed if args.seed is not None else SAMPLING_CONFIG["seed"]
+    )
 
-def generate_reports(results, timestamp):
+def generate_reports(results, timestamp, case_sections_path=None):
     """生成评估报告"""
     logger = logging.getLogger(__name__)
     
@@ -452,7 +718,7 @@ def generate_reports(results, timestamp):
             f"evaluation_report_{timestamp}.md"
         )
         
-        generate_markdown_report(results, md_report_path)
+        generate_markdown_report(results, md_report_path, case_sections_path)
         logger.info(f"Markdown报告已生成: {md_report_path}")
         
         # 生成简要报告
@@ -467,8 +733,17 @@ def generate_reports(results, timestamp):
     except Exception as e:
         logger.error(f"生成报告失败: {e}")
 
-def generate_markdown_report(results, output_path):
-    """生成Markdown格式的详细报告"""
+def generate_markdown_report(results, output_path, case_sections_path=None):
+    """
+    生成Markdown格式的详细报告
+    
+    Args:
+        results: 评估结果
+        output_path: 报告文件路径
+        case_sections_path: 评估过程中已写好的详细样例部分（StreamingCaseReport），为空时重新生成
+    """
+    import numpy as np
+    
     summary = results["summary_metrics"]
     meta = results["meta"]
     config = results.get("config", {})
@@ -484,12 +759,66 @@ def generate_markdown_report(results, output_path):
         f.write(f"- **失败评估**: {meta['failed_evaluations']}\n")
         f.write(f"- **成功率**: {summary['evaluation_statistics']['success_rate']:.1%}\n")
         f.write(f"- **总耗时**: {meta['total_elapsed_time']:.2f}秒\n")
-        f.write(f"- **平均每个案例耗时**: {meta['avg_elapsed_time']:.2f}秒\n\n")
+        f.write(f"- **平均每个案例耗时**: {meta['avg_elapsed_time']:.2f}秒\n")
+        if "serialization" in meta:
+            serialization = meta["serialization"]
+            f.write(
+                f"- **结果序列化**: {serialization['backend']}, {serialization['serialize_seconds']:.3f}秒, "
+                f"{serialization['file_bytes'] / 1024:.1f}KB\n"
+            )
+        f.write("\n")
+        
+        # 延迟分布
+        if meta.get("latency"):
+            write_latency_section(f, meta["latency"])
+        
+        # 多副本负载均衡
+        if meta.get("replicas"):
+            write_replica_section(f, meta["replicas"])
+        
+        # 基线对比
+        if results.get("regression"):
+            write_regression_section(f, results["regression"])
+        
+        # 流水线各阶段统计
+        pipeline = meta.get("pipeline")
+        if pipeline:
+            f.write("## 流水线阶段\n\n")
+            f.write(f"- **瓶颈阶段**: {pipeline['bottleneck']}\n\n")
+            f.write("| 阶段 | 线程数 | 处理数量 | 忙碌时间(秒) | 利用率 | 平均队列深度 | 最大队列深度 |\n")
+            f.write("|------|--------|----------|--------------|--------|--------------|--------------|\n")
+            for name, stage in pipeline["stages"].items():
+                f.write(
+                    f"| {name} | {stage['workers']} | {stage['processed']} | {stage['busy_seconds']:.2f} | "
+                    f"{stage['utilization']:.1%} | {stage['avg_queue_depth']:.1f} | {stage['max_queue_depth']} |\n"
+                )
+            f.write("\n")
+        
+        # 链路追踪：各类别案例在各span上的平均耗时
+        tracing = meta.get("tracing")
+        if tracing and tracing["by_category"]:
+            f.write("## 链路追踪\n\n")
+            f.write(f"- **Trace文件**: {tracing['file']} ({tracing['spans']} 个span，OTLP/JSON格式)\n")
+            f.write(f"- **重试次数**: {tracing.get('retries', 0)}\n")
+            if tracing.get("detached"):
+                detached = ", ".join(f"{name}×{count}" for name, count in tracing["detached"].items())
+                f.write(f"- **未挂在案例trace下的span**: {detached}\n")
+            f.write("\n")
+            span_names = sorted({name for spans in tracing["by_category"].values() for name in spans})
+            f.write("| 类别 | " + " | ".join(f"{name}(ms)" for name in span_names) + " |\n")
+            f.write("|------|" + "|".join("------" for _ in span_names) + "|\n")
+            for category, spans in sorted(tracing["by_category"].items()):
+                cells = [
+                    f"{spans[name]['avg_seconds'] * 1000:.1f}" if name in spans else "-"
+                    for name in span_names
+                ]
+                f.write(f"| {category} | " + " | ".join(cells) + " |\n")
+            f.write("\n表中为平均耗时；queue.* 为在对应阶段队列中的等待时间。\n\n")
         
         api_config = config.get("api", {})
         # API配置信息
         f.write("## API配置\n\n")
-        f.write(f"- **基础URL**: {api_config.get('base_url', 'N/A')}\n")
+        f.write(f"- **基础URL**: {', '.join(api_config.get('base_urls') or []) or api_config.get('base_url', 'N/A')}\n")
         f.write(f"- **API端点**: {api_config.get('endpoint', 'N/A')}\n")
         f.write(f"- **项目ID**: {api_config.get('project_id', 'N/A')}\n")
         f.write(f"- **搜索方法**: {api_config.get('method', 'N/A')}\n")
@@ -509,42 +838,196 @@ def generate_markdown_report(results, output_path):
             f.write(f"- **平均全面性**: {np.mean(completeness_scores):.3f}\n")
             f.write(f"- **平均可用性**: {np.mean(usability_scores):.3f}\n\n")
 
+        # 分层抽样估计
+        sampling = results.get("sampling")
+        if sampling and "estimate" in sampling:
+            f.write("## 全量数据集估计（分层抽样）\n\n")
+            f.write(f"- **样本数量**: {sampling['sample_size']}/{sampling['population_size']}\n")
+            f.write(f"- **随机种子**: {sampling['seed']}\n")
+            f.write(f"- **综合评分估计**: {sampling['estimate']:.3f}\n")
+            f.write(f"- **{sampling['confidence']:.0%}置信区间**: [{sampling['lower']:.3f}, {sampling['upper']:.3f}]\n\n")
+            f.write("| 类别 | 总体数量 | 样本数量 | 样本均值 | 样本标准差 |\n")
+            f.write("|------|----------|----------|----------|------------|\n")
+            for category, info in sampling["per_category"].items():
+                std = f"{info['std']:.3f}" + ("*" if info.get("std_from_prior") else "")
+                f.write(f"| {category} | {info['population']} | {info['sampled']} | {info['mean']:.3f} | {std} |\n")
+            if any(info.get("std_from_prior") for info in sampling["per_category"].values()):
+                f.write("\n\\* 该类别只有一个成功样本，使用假设的标准差（上次评估的类别标准差或先验值）计算置信区间\n")
+            f.write("\n")
         
         # 详细测试样例结果
         f.write("## 详细测试样例结果\n\n")
-        for idx, result in enumerate(results["detailed_results"], 1):
-            f.write(f"### 测试样例 {idx}\n\n")
-            f.write(f"- **查询语句**: {result.get('query', 'N/A')}\n")
-            f.write(f"- **类别**: {result.get('category', 'N/A')}\n")
-            f.write(f"- **描述**: {result.get('description', 'N/A')}\n")
-            f.write(f"- **评估状态**: {'成功' if result.get('success', False) else '失败'}\n")
-            f.write(f"- **耗时**: {result.get('elapsed_time', 0):.2f}秒\n")
-            
-            if result.get('success', False):
-                f.write(f"- **总分**: {result.get('total_score', 0.0):.3f}\n")
-                f.write(f"- **相关性**: {result.get('relevance', 0.0):.3f}\n")
-                f.write(f"- **全面性**: {result.get('completeness', 0.0):.3f}\n")
-                f.write(f"- **可用性**: {result.get('usability', 0.0):.3f}\n")
-                
-                # 检索结果
-                if "retrieved_results" in result:
-                    f.write("\n#### 检索结果\n\n")
-                    for rank, res in enumerate(result["retrieved_results"], 1):
-                        f.write(f"##### 结果 {rank}\n\n")
-                        f.write(f"- **文件路径**: {res.get('path', 'N/A')}\n")
-                        f.write(f"- **相关性分数**: {res.get('score', 0.0):.3f}\n")
-                        if "snippet" in res:
-                            f.write("\n```\n")
-                            f.write(res["snippet"])
-                            f.write("\n```\n")
-                        f.write("\n")
-            
-            # 错误信息
-            if not result.get('success', False) and "error" in result:
-                f.write(f"\n#### 错误信息\n\n")
-                f.write(f"```\n{result['error']}\n```\n")
-            
-            f.write("\n---\n\n")
+        if case_sections_path and os.path.exists(case_sections_path):
+            # 评估过程中已逐个写出的样例部分
+            with open(case_sections_path, 'r', encoding='utf-8') as sections:
+                shutil.copyfileobj(sections, f)
+        else:
+            for number, result in enumerate(results["detailed_results"], 1):
+                write_case_section(f, number, result)
+
+def format_latency(seconds):
+    """延迟（秒）格式化为毫秒，没有数据时为 -"""
+    return f"{seconds * 1000:.0f}ms" if seconds is not None else "-"
+
+def write_latency_section(f, latency):
+    """写出Markdown报告的延迟分布部分：分位数表、整体直方图和各类别最慢查询"""
+    from utils.latency import format_ascii_histogram
+    
+    overall = latency["overall"]
+    f.write("## 延迟分布\n\n")
+    f.write(f"- **检索方法**: {latency.get('method', 'N/A')} / {latency.get('rank_method', 'N/A')}\n\n")
+    f.write("| 范围 | 案例数 | 平均 | p50 | p90 | p99 | 最大 |\n")
+    f.write("|------|--------|------|-----|-----|-----|------|\n")
+    rows = [("整体", overall)] + list(latency["by_category"].items())
+    for name, stats in rows:
+        f.write(
+            f"| {name} | {stats['count']} | {format_latency(stats['mean'])} | {format_latency(stats['p50'])} | "
+            f"{format_latency(stats['p90'])} | {format_latency(stats['p99'])} | {format_latency(stats['max'])} |\n"
+        )
+    f.write("\n分位数由流式草图估计，相对误差约1%。\n\n")
+    
+    if overall["histogram"]:
+        f.write("### 整体延迟直方图\n\n")
+        f.write("```\n")
+        f.write(format_ascii_histogram(overall["histogram"]))
+        f.write("\n```\n\n")
+    
+    f.write("### 各类别最慢查询\n\n")
+    for category, stats in latency["by_category"].items():
+        if not stats["slowest"]:
+            continue
+        f.write(f"#### {category}\n\n")
+        f.write("| 排名 | 编号 | 查询语句 | 耗时 | 状态 |\n")
+        f.write("|------|------|----------|------|------|\n")
+        for rank, item in enumerate(stats["slowest"], 1):
+            query = str(item.get("query", "")).replace("|", "\\|")
+            status = "成功" if item.get("success") else "失败"
+            f.write(f"| {rank} | {item.get('idx', 'N/A')} | {query} | {format_latency(item['elapsed_time'])} | {status} |\n")
+        f.write("\n")
+
+def write_replica_section(f, replicas):
+    """写出Markdown报告的副本统计部分"""
+    f.write("## 检索服务副本\n\n")
+    f.write(f"- **负载均衡策略**: {replicas['policy']}\n\n")
+    f.write("| 副本 | 请求数 | 错误数 | 错误率 | 移出次数 | 平均 | p50 | p90 | p99 | 状态 |\n")
+    f.write("|------|--------|--------|--------|----------|------|-----|-----|-----|------|\n")
+    for replica in replicas["replicas"]:
+        stats = replica["latency"]
+        f.write(
+            f"| {replica['url']} | {replica['requests']} | {replica['errors']} | {replica['error_rate']:.1%} | "
+            f"{replica['ejections']} | {format_latency(stats['mean'])} | {format_latency(stats['p50'])} | "
+            f"{format_latency(stats['p90'])} | {format_latency(stats['p99'])} | {format_replica_status(replica)} |\n"
+        )
+    f.write("\n慢副本: p90延迟超过各副本p90中位数的 `load_balancing.slow_factor` 倍。\n\n")
+
+def format_replica_status(replica):
+    """副本状态：已移出轮换 / 慢 / 正常"""
+    if replica["ejected"]:
+        return "已移出轮换"
+    return "慢" if replica["slow"] else "正常"
+
+def write_regression_section(f, regression):
+    """写出Markdown报告的基线对比部分"""
+    f.write("## 基线对比\n\n")
+    f.write(f"- **基线**: {regression['baseline']}\n")
+    f.write(f"- **结论**: {'通过' if regression['passed'] else '未通过'}\n")
+    f.write(
+        f"- **匹配案例**: {regression['matched_cases']} "
+        f"(仅本次 {regression['current_only']}, 仅基线 {regression['baseline_only']})\n\n"
+    )
+    for violation in regression["violations"]:
+        f.write(f"- ❌ {violation}\n")
+    if regression["violations"]:
+        f.write("\n")
+    
+    f.write("| 指标 | 基线 | 本次 | 变化 | p值 | 回归 |\n")
+    f.write("|------|------|------|------|-----|------|\n")
+    for name, check in regression["metrics"].items():
+        if not check["paired_cases"]:
+            continue
+        f.write(
+            f"| {name} | {check['baseline']:.3f} | {check['current']:.3f} | {check['delta']:+.3f} | "
+            f"{check['p_value']:.4f} | {'是' if check['regressed'] else '否'} |\n"
+        )
+    latency = regression["latency"]
+    if latency["baseline_p95"] is not None:
+        f.write(
+            f"| p95延迟 | {format_latency(latency['baseline_p95'])} | {format_latency(latency['current_p95'])} | "
+            f"{latency['current_p95'] / latency['baseline_p95'] - 1:+.1%} | - | {'是' if latency['regressed'] else '否'} |\n"
+        )
+    f.write("\n")
+    
+    if regression["worst_cases"]:
+        f.write("### 下降最多的案例\n\n")
+        f.write("| 编号 | 查询语句 | 基线总分 | 本次总分 | 变化 |\n")
+        f.write("|------|----------|----------|----------|------|\n")
+        for item in regression["worst_cases"]:
+            query = str(item.get("query", "")).replace("|", "\\|")
+            f.write(
+                f"| {item['idx']} | {query} | {item['baseline_total_score']:.3f} | "
+                f"{item['total_score']:.3f} | {item['delta']:+.3f} |\n"
+            )
+        f.write("\n")
+    
+    if regression["newly_failed"]:
+        f.write("### 本次新增失败的案例\n\n")
+        for item in regression["newly_failed"]:
+            f.write(f"- {item['idx']}: {item['query']} ({item.get('error') or '未知错误'})\n")
+        f.write("\n")
+
+def write_case_section(f, number, result):
+    """写出单个测试样例的Markdown详细结果"""
+    f.write(f"### 测试样例 {number}\n\n")
+    f.write(f"- **查询语句**: {result.get('query', 'N/A')}\n")
+    f.write(f"- **类别**: {result.get('category', 'N/A')}\n")
+    f.write(f"- **描述**: {result.get('description', 'N/A')}\n")
+    f.write(f"- **评估状态**: {'成功' if result.get('success', False) else '失败'}\n")
+    f.write(f"- **耗时**: {result.get('elapsed_time', 0):.2f}秒\n")
+    
+    if result.get('success', False):
+        f.write(f"- **总分**: {result.get('total_score', 0.0):.3f}\n")
+        f.write(f"- **相关性**: {result.get('relevance', 0.0):.3f}\n")
+        f.write(f"- **全面性**: {result.get('completeness', 0.0):.3f}\n")
+        f.write(f"- **可用性**: {result.get('usability', 0.0):.3f}\n")
+    
+        # 检索结果
+        if "retrieved_results" in result:
+            f.write("\n#### 检索结果\n\n")
+            for rank, res in enumerate(result["retrieved_results"], 1):
+                f.write(f"##### 结果 {rank}\n\n")
+                f.write(f"- **文件路径**: {res.get('path', 'N/A')}\n")
+                f.write(f"- **相关性分数**: {res.get('score', 0.0):.3f}\n")
+                if "snippet" in res:
+                    f.write("\n```\n")
+                    f.write(res["snippet"])
+                    f.write("\n```\n")
+                f.write("\n")
+    
+    # 错误信息
+    if not result.get('success', False) and "error" in result:
+        f.write(f"\n#### 错误信息\n\n")
+        f.write(f"```\n{result['error']}\n```\n")
+    
+    f.write("\n---\n\n")
+
+class StreamingCaseReport:
+    """
+    结果接收器：评估过程中逐个写出Markdown报告的详细样例部分，
+    评估结束后由 generate_markdown_report 拼接到完整报告中
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.file = open(path, 'w', encoding='utf-8')
+    
+    def __call__(self, result):
+        self.count += 1
+        write_case_section(self.file, self.count, result)
+        self.file.flush()
+    
+    def close(self):
+        self.file.close()
 
 def generate_summary_report(results, output_path):
     """生成简要文本报告"""
@@ -559,7 +1042,37 @@ def generate_summary_report(results, output_path):
         f.write(f"测试案例: {meta['total_test_cases']} (成功: {meta['successful_evaluations']})\n")
         f.write(f"成功率: {summary['evaluation_statistics']['success_rate']:.1%}\n")
         f.write(f"总耗时: {meta['total_elapsed_time']:.2f}秒\n")
-        f.write(f"平均每个案例耗时: {meta['avg_elapsed_time']:.2f}秒\n\n")
+        f.write(f"平均每个案例耗时: {meta['avg_elapsed_time']:.2f}秒\n")
+        latency = meta.get("latency")
+        if latency:
+            overall = latency["overall"]
+            f.write(
+                f"延迟 ({latency.get('method', 'N/A')}/{latency.get('rank_method', 'N/A')}): "
+                f"p50={format_latency(overall['p50'])} p90={format_latency(overall['p90'])} "
+                f"p99={format_latency(overall['p99'])} max={format_latency(overall['max'])}\n"
+            )
+            for category, stats in latency["by_category"].items():
+                f.write(
+                    f"  {category}: p50={format_latency(stats['p50'])} p90={format_latency(stats['p90'])} "
+                    f"p99={format_latency(stats['p99'])} max={format_latency(stats['max'])}\n"
+                )
+        replicas = meta.get("replicas")
+        if replicas:
+            f.write(f"副本 ({replicas['policy']}):\n")
+            for replica in replicas["replicas"]:
+                f.write(
+                    f"  {replica['url']}: 请求 {replica['requests']} 错误 {replica['errors']} "
+                    f"p50={format_latency(replica['latency']['p50'])} p90={format_latency(replica['latency']['p90'])} "
+                    f"[{format_replica_status(replica)}]\n"
+                )
+        f.write("\n")
+        
+        regression = results.get("regression")
+        if regression:
+            f.write(f"基线对比: {'通过' if regression['passed'] else '未通过'} (基线: {regression['baseline']})\n")
+            for violation in regression["violations"]:
+                f.write(f"  - {violation}\n")
+            f.write("\n")
         
         # 新评估框架表现
         if "new_framework_performance" in summary:
@@ -569,6 +1082,16 @@ def generate_summary_report(results, output_path):
             f.write(f"  相关性: {new_framework['avg_relevance']:.3f}\n")
             f.write(f"  全面性: {new_framework['avg_completeness']:.3f}\n")
             f.write(f"  可用性: {new_framework['avg_usability']:.3f}\n")
+        
+        # 抽样估计
+        sampling = results.get("sampling")
+        if sampling and "estimate" in sampling:
+            f.write("\n全量数据集估计 (分层抽样):\n")
+            f.write(f"  样本: {sampling['sample_size']}/{sampling['population_size']} (seed={sampling['seed']})\n")
+            f.write(
+                f"  综合评分估计: {sampling['estimate']:.3f} "
+                f"[{sampling['lower']:.3f}, {sampling['upper']:.3f}] ({sampling['confidence']:.0%}置信区间)\n"
+            )
 
 def show_summary(results, debug=False):
     """显示评估结果摘要"""
@@ -585,6 +1108,16 @@ def show_summary(results, debug=False):
     print(f"总耗时: {meta['total_elapsed_time']:.2f}秒")
     print(f"平均每个案例耗时: {meta['avg_elapsed_time']:.2f}秒")
     
+    replicas = meta.get("replicas")
+    if replicas:
+        print(f"\n检索服务副本 ({replicas['policy']}):")
+        for replica in replicas["replicas"]:
+            print(
+                f"  {replica['url']}: 请求 {replica['requests']}, 错误 {replica['errors']} ({replica['error_rate']:.1%}), "
+                f"p50={format_latency(replica['latency']['p50'])} p90={format_latency(replica['latency']['p90'])} "
+                f"[{format_replica_status(replica)}]"
+            )
+    
     # 使用格式化工具添加详细解释
     formatted_summary = format_summary_with_explanations(summary)
     
@@ -611,6 +1144,21 @@ def show_summary(results, debug=False):
             interp = get_score_interpretation(value)
             print(f"  {metric_name}: {value:.3f} ({interp['level']}) - 权重: {weight*100:.0f}%")
     
+    # 分层抽样的全量估计
+    sampling = results.get("sampling")
+    if sampling:
+        print("\n全量数据集估计 (分层抽样):")
+        if "estimate" in sampling:
+            print(f"  样本: {sampling['sample_size']}/{sampling['population_size']} (seed={sampling['seed']})")
+            print(
+                f"  综合评分估计: {sampling['estimate']:.3f} "
+                f"[{sampling['lower']:.3f}, {sampling['upper']:.3f}] ({sampling['confidence']:.0%}置信区间)"
+            )
+            if sampling["ci_width"] > sampling["target_ci_width"]:
+                print(f"  置信区间宽度 {sampling['ci_width']:.3f} 超过目标 {sampling['target_ci_width']:.3f}，可调大样本量后重试")
+        else:
+            print(f"  {sampling['error']}")
+    
     print("\n" + "=" * 50)
 
 def get_total_score_interpretation(total_score):
@@ -639,6 +1187,26 @@ def get_score_interpretation(score):
     else:
         return {"level": "很差", "description": "表现很差，需要重新设计"}
 
+def show_regression(regression):
+    """显示基线回归检查结果"""
+    print(f"\n基线对比 ({regression['baseline']}):")
+    print(f"  匹配案例: {regression['matched_cases']} (仅本次 {regression['current_only']}, 仅基线 {regression['baseline_only']})")
+    for name, check in regression["metrics"].items():
+        if check["paired_cases"]:
+            print(
+                f"  {name}: {check['baseline']:.3f} -> {check['current']:.3f} "
+                f"({check['delta']:+.3f}, p={check['p_value']:.4f})"
+            )
+    latency = regression["latency"]
+    if latency["baseline_p95"] is not None:
+        print(f"  p95延迟: {format_latency(latency['baseline_p95'])} -> {format_latency(latency['current_p95'])}")
+    if regression["passed"]:
+        print("  ✅ 回归检查通过")
+    else:
+        print("  ❌ 回归检查未通过:")
+        for violation in regression["violations"]:
+            print(f"     - {violation}")
+
 def show_problematic_queries(evaluator):
     """显示问题查询"""
     problematic = evaluator.get_problematic_queries(threshold=0.4)
@@ -667,12 +1235,32 @@ def main():
         help="测试数据集文件路径 (默认: test_dataset.json)"
     )
     
-    parser.add_argument(
+    sample_group = parser.add_mutually_exclusive_group()
+    
+    sample_group.add_argument(
         "--limit", "-l",
         type=int,
         help="限制测试案例数量"
     )
     
+    sample_group.add_argument(
+        "--sample",
+        action="store_true",
+        help="按类别分层抽样评估，并估计全量数据集的平均总分及置信区间"
+    )
+    
+    parser.add_argument(
+        "--ci-width",
+        type=float,
+        help=f"抽样模式下目标置信区间宽度 (默认: {SAMPLING_CONFIG['ci_width']})"
+    )
+    
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help=f"抽样模式下的随机种子 (默认: {SAMPLING_CONFIG['seed']})"
+    )
+    
     parser.add_argument(
         "--category", "-c",
         type=str,
@@ -698,6 +1286,62 @@ def main():
         help="显示问题查询"
     )
     
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="对各阶段进行cProfile/tracemalloc剖析，结果保存到 reports/profile/"
+    )
+    
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help=f"评估期间在该端口暴露Prometheus指标 (/metrics)，结束时写出 {METRICS_CONFIG['textfile']}"
+    )
+    
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="以JSON行格式输出日志"
+    )
+    
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="记录每个案例的链路追踪，导出为OTLP/JSON文件 (results/traces/)"
+    )
+    
+    parser.add_argument(
+        "--spill",
+        action="store_true",
+        help="把检索结果列表溢写到磁盘，内存中只保留指标（大数据集时使用）"
+    )
+    
+    parser.add_argument(
+        "--retries",
+        type=int,
+        metavar="N",
+        help="请求失败时最多重试N次（默认不重试），结果中记录每个案例的重试次数"
+    )
+    
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        help="与基线评估比较（结果文件 .json/.npz，或历史数据库中的run_key），出现回归时以非零状态退出"
+    )
+    
+    parser.add_argument(
+        "--max-p95-increase",
+        type=float,
+        help=f"--baseline 模式下p95延迟允许上升的比例 (默认: {REGRESSION_CONFIG['max_p95_increase']})"
+    )
+    
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        metavar="DATASET[:PROJECT_ID]",
+        help="并行评估多个 数据集[:project_id] 组合（省略project_id时使用API_CONFIG），输出汇总报告"
+    )
+    
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -706,16 +1350,34 @@ def main():
     
     args = parser.parse_args()
     
+    if not args.sample:
+        sample_only = [
+            option for option, value in (("--ci-width", args.ci_width is not None), ("--seed", args.seed is not None))
+            if value
+        ]
+        if sample_only:
+            parser.error(f"{', '.join(sample_only)} 只能与 --sample 一起使用")
+    
+    if args.retries is not None and args.retries < 0:
+        parser.error("--retries 不能为负数")
+    
+    if args.targets:
+        unsupported = [
+            option for option, value in (
+                ("--dataset", args.dataset), ("--sample", args.sample), ("--baseline", args.baseline),
+                ("--profile", args.profile), ("--trace", args.trace), ("--spill", args.spill),
+                ("--retries", args.retries is not None),
+                ("--metrics-port", args.metrics_port is not None), ("--show-problems", args.show_problems)
+            ) if value
+        ]
+        if unsupported:
+            parser.error(f"--targets 不支持与 {', '.join(unsupported)} 一起使用")
+    
     # 设置日志
-    setup_logging(args.debug)
+    setup_logging(args.debug, json_format=args.log_json or None)
     
-    # 运行评估
-    if run_evaluation(args):
-        # 生成历史分数折线图
-        if args.show_history:
-            generate_history_chart()
-            generate_api_performance_chart()
-    else:
+    # 运行评估（--show-history 的图表已在 run_evaluation 中生成）
+    if not (run_multi_evaluation(args) if args.targets else run_evaluation(args)):
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+排序融合模拟工具
+用已保存的各方法检索结果在本地模拟融合策略（不同k值的RRF、不同归一化和权重的加权分数融合），
+并用评估框架为每个变体评分，几秒内比较数百个融合变体，不需要请求检索服务
+
+检索结果来源：
+- 评估结果文件：每个方法一个（例如分别用 rank_method=vector / 其他方法运行 run_evaluation.py 后保存的结果）
+- 参数扫描的响应缓存（sweep.py）：按组合从缓存中取出数据集中每个查询的响应
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import API_CONFIG, EVALUATION_CONFIG, PATH_CONFIG, SERIALIZATION_CONFIG, SWEEP_CONFIG, FUSION_CONFIG
+from utils.metrics import EvaluationMetrics
+from utils.rank_fusion import (
+    FusionSimulator, load_result_lists, load_cached_lists, describe_variant, parse_source, NORMALIZATIONS
+)
+from utils.serializer import write_json_atomic
+
+
+def parse_combo(value):
+    """解析 method/rank_method[/limit[/project_id]]，省略的参数使用API_CONFIG"""
+    parts = value.split("/")
+    if len(parts) < 2 or len(parts) > 4:
+        raise argparse.ArgumentTypeError(f"组合格式应为 method/rank_method[/limit[/project_id]]: {value}")
+    params = {
+        "method": parts[0],
+        "rank_method": parts[1],
+        "limit": int(parts[2]) if len(parts) > 2 else API_CONFIG["limit"],
+        "project_id": parts[3] if len(parts) > 3 else API_CONFIG["project_id"]
+    }
+    return value, params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用已保存的各方法检索结果离线模拟排序融合策略")
+    parser.add_argument("sources", nargs="*",
+                        help="评估结果文件，每个方法一个，可写为 名称=路径 (.json / .jsonl / .npz)")
+    parser.add_argument("--sweep-cache", nargs="?", const=SWEEP_CONFIG["cache_file"],
+                        help=f"改为从参数扫描的响应缓存读取 (默认: {SWEEP_CONFIG['cache_file']})")
+    parser.add_argument("--combos", nargs="+", type=parse_combo, default=[],
+                        help="--sweep-cache 模式下融合的组合，格式 method/rank_method[/limit[/project_id]]")
+    parser.add_argument("--dataset", "-d", type=str, help="--sweep-cache 模式的测试数据集 (默认: PATH_CONFIG['test_dataset'])")
+    parser.add_argument("--limit", type=int, default=API_CONFIG["limit"],
+                        help=f"融合后保留的结果数 (默认: {API_CONFIG['limit']})")
+    parser.add_argument("--rrf-k", nargs="+", type=float, default=FUSION_CONFIG["rrf_k"], help="RRF的k值")
+    parser.add_argument("--normalizations", nargs="+", choices=NORMALIZATIONS,
+                        default=FUSION_CONFIG["normalizations"], help="加权分数融合的归一化方式")
+    parser.add_argument("--weight-step", type=float, default=FUSION_CONFIG["weight_step"],
+                        help=f"权重网格的步长 (默认: {FUSION_CONFIG['weight_step']})")
+    parser.add_argument("--no-mnz", action="store_true", help="不评估CombMNZ")
+    parser.add_argument("--top", type=int, default=FUSION_CONFIG["top"], help="显示的变体数")
+    parser.add_argument("--output", "-o", type=str, help="把所有变体的评分写入JSON文件")
+    args = parser.parse_args()
+
+    metrics = EvaluationMetrics(EVALUATION_CONFIG)
+    start = time.perf_counter()
+    if args.sweep_cache:
+        from utils.sweep import ResponseCache, upstream_identity
+        if len(args.combos) < 2:
+            parser.error("--sweep-cache 模式至少需要两个 --combos")
+        if not os.path.exists(args.sweep_cache):
+            print(f"响应缓存不存在: {args.sweep_cache}")
+            sys.exit(1)
+        dataset_path = args.dataset or PATH_CONFIG["test_dataset"]
+        with open(dataset_path, "r", encoding="utf-8") as f:
+            test_cases = json.load(f).get("test_cases", [])
+        cache = ResponseCache(args.sweep_cache)
+        cache.close()
+        data, counts = load_cached_lists(
+            cache, test_cases, dict(args.combos), metrics, upstream_identity(API_CONFIG)
+        )
+    else:
+        if len(args.sources) < 2:
+            parser.error("至少需要两个结果文件（或使用 --sweep-cache）")
+        sources = dict(parse_source(value) for value in args.sources)
+        for path in sources.values():
+            if not os.path.exists(path):
+                print(f"结果文件不存在: {path}")
+                sys.exit(1)
+        data, counts = load_result_lists(sources, metrics)
+    load_elapsed = time.perf_counter() - start
+
+    if not len(data):
+        print("各来源没有共同的案例")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    simulator = FusionSimulator(data, metrics, args.limit)
+    rows = simulator.run(args.rrf_k, args.normalizations, args.weight_step, mnz=not args.no_mnz)
+    elapsed = time.perf_counter() - start
+
+    print(f"方法: {', '.join(data.methods)}")
+    print(
+        f"案例: {counts['matched']} 个 (未对齐 {counts['dropped']} 个)，加载 {load_elapsed:.2f}秒；"
+        f"{len(rows)} 个变体，模拟 {elapsed:.2f}秒（实际评分 {simulator.scored_rankings} 次）"
+    )
+    print(f"\n{'总分':>7}{'相关性':>8}{'全面性':>8}{'可用性':>8}  变体")
+    print("-" * 72)
+    for row in rows[:args.top]:
+        print(
+            f"{row['avg_total_score']:>8.3f}{row['avg_relevance']:>9.3f}{row['avg_completeness']:>9.3f}"
+            f"{row['avg_usability']:>9.3f}  {describe_variant(row)}"
+        )
+    best_single = max((row for row in rows if row["strategy"] == "single"), key=lambda row: row["avg_total_score"])
+    print(
+        f"\n最好的单一方法: {best_single['method']} ({best_single['avg_total_score']:.3f})，"
+        f"最好的变体: {describe_variant(rows[0])} ({rows[0]['avg_total_score']:.3f})"
+    )
+
+    if args.output:
+        write_json_atomic({
+            "methods": data.methods,
+            "cases": counts,
+            "limit": args.limit,
+            "variants": rows
+        }, args.output, SERIALIZATION_CONFIG["backend"], SERIALIZATION_CONFIG["indent"])
+        print(f"\n所有变体的评分已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
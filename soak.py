@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+浸泡测试工具
+在配置的时长内（可达数天）以固定速率循环请求数据集中的查询，按时间窗口统计延迟分位数、错误率和平均总分，
+标出延迟上升、相同查询的分数变化和错误率上升等漂移；每个窗口结束时写入历史数据库和JSONL文件，
+客户端内存不随运行时长增长
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import API_CONFIG, EVALUATION_CONFIG, CATEGORY_CONFIG, PATH_CONFIG, SERIALIZATION_CONFIG, SOAK_CONFIG
+from utils.api_client import create_api_client
+from utils.metrics import EvaluationMetrics
+from utils.pipeline import JsonlResultWriter
+from utils.serializer import write_json_atomic
+from utils.soak import SoakRunner, parse_duration
+
+
+def format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def print_window(window):
+    """输出一个窗口的统计和告警"""
+    latency = window["latency"]
+    score = "-" if window["avg_total_score"] is None else f"{window['avg_total_score']:.3f}"
+    print(
+        f"[窗口 {window['window']:>4}] {window['end_time']} 请求 {window['requests']:>5} "
+        f"({window['request_rate']:.2f}/s) 错误 {window['error_rate']:>6.1%} 总分 {score} "
+        f"p50 {format_ms(latency['p50']):>7} p90 {format_ms(latency['p90']):>7} p99 {format_ms(latency['p99']):>7} "
+        f"分数变化 {window['changed_scores']}/{window['compared_cases']}"
+    )
+    for alert in window["drift"]:
+        print(f"    ⚠️  漂移 [{alert['type']}] {alert['message']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长时间浸泡测试：固定速率循环请求，按窗口检测延迟、分数和错误率漂移")
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration(SOAK_CONFIG["duration"]),
+                        help=f"运行时长，数字为秒，也可写 30m / 4h / 2d (默认: {SOAK_CONFIG['duration']})")
+    parser.add_argument("--rate", type=float, default=SOAK_CONFIG["rate"],
+                        help=f"每秒请求数 (默认: {SOAK_CONFIG['rate']})")
+    parser.add_argument("--concurrency", type=int, default=SOAK_CONFIG["concurrency"],
+                        help=f"并发请求数上限 (默认: {SOAK_CONFIG['concurrency']})")
+    parser.add_argument("--window", type=parse_duration, default=SOAK_CONFIG["window_seconds"],
+                        help=f"统计窗口长度，格式同 --duration (默认: {SOAK_CONFIG['window_seconds']}秒)")
+    parser.add_argument("--dataset", "-d", type=str, help="测试数据集文件路径 (默认: PATH_CONFIG['test_dataset'])")
+    parser.add_argument("--category", "-c", type=str, choices=list(CATEGORY_CONFIG.keys()), help="按类别过滤测试案例")
+    parser.add_argument("--max-cases", "-n", type=int, help="只循环前N个案例")
+    parser.add_argument("--no-history", action="store_true", help="不把窗口统计写入历史数据库")
+    parser.add_argument("--debug", action="store_true", help="启用调试模式")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.debug else logging.WARNING,
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    dataset_path = args.dataset or PATH_CONFIG["test_dataset"]
+    if not os.path.exists(dataset_path):
+        print(f"测试数据集文件不存在: {dataset_path}")
+        sys.exit(1)
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        test_cases = json.load(f).get("test_cases", [])
+    if args.category:
+        test_cases = [case for case in test_cases if case.get("category") == args.category]
+    if args.max_cases:
+        test_cases = test_cases[:args.max_cases]
+    if not test_cases:
+        print("没有测试案例需要评估")
+        sys.exit(1)
+
+    client = create_api_client(API_CONFIG)
+    if not client.test_connection():
+        print("API连接失败，请检查服务状态")
+        sys.exit(1)
+
+    config = dict(SOAK_CONFIG, rate=args.rate, concurrency=args.concurrency, window_seconds=args.window)
+    runner = SoakRunner(
+        client, EvaluationMetrics(EVALUATION_CONFIG), test_cases, config,
+        EVALUATION_CONFIG.get("latency", {}).get("relative_accuracy", 0.01)
+    )
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    soak_key = f"soak_{timestamp}"
+    Path(SOAK_CONFIG["output_dir"]).mkdir(parents=True, exist_ok=True)
+    windows_path = os.path.join(SOAK_CONFIG["output_dir"], f"{soak_key}.jsonl")
+    writer = JsonlResultWriter(windows_path, SERIALIZATION_CONFIG["backend"])
+    store = None
+    if not args.no_history:
+        from utils.history_store import open_history_store
+        store = open_history_store(PATH_CONFIG["history_db"], PATH_CONFIG["history_dir"], PATH_CONFIG["reports_dir"])
+
+    def record(window):
+        # 窗口在主线程中结束，历史数据库连接只在主线程使用
+        writer(window)
+        if store is not None:
+            store.record_soak_window(soak_key, window)
+        print_window(window)
+
+    print(
+        f"浸泡测试 {soak_key}: {len(test_cases)} 个案例，{args.rate}/s，并发 {args.concurrency}，"
+        f"窗口 {args.window:.0f}秒，时长 {args.duration:.0f}秒（Ctrl+C 提前结束）"
+    )
+    try:
+        summary = runner.run(args.duration, on_window=record)
+    finally:
+        writer.close()
+        if store is not None:
+            store.close()
+
+    summary.update({"soak_key": soak_key, "dataset": dataset_path, "windows_file": windows_path, "config": config})
+    summary_path = os.path.join(SOAK_CONFIG["output_dir"], f"{soak_key}_summary.json")
+    write_json_atomic(summary, summary_path, SERIALIZATION_CONFIG["backend"], SERIALIZATION_CONFIG["indent"])
+
+    latency = summary["latency"]
+    print(
+        f"\n共 {summary['windows']} 个窗口，{summary['requests']} 次请求，错误率 {summary['error_rate']:.1%}，"
+        f"p50 {format_ms(latency['p50'])} p90 {format_ms(latency['p90'])} p99 {format_ms(latency['p99'])}"
+    )
+    if summary["baseline"]:
+        print(
+            f"基线: p90 {format_ms(summary['baseline']['latency_p90'])}，错误率 {summary['baseline']['error_rate']:.1%}；"
+            f"漂移告警 {summary['alerts']} 次"
+        )
+    else:
+        print("运行时间不足以建立基线（需要 预热窗口 + 基线窗口 个完整窗口），没有进行漂移检测")
+    print(f"窗口统计: {windows_path}")
+    print(f"汇总: {summary_path}")
+    if summary["alerts"]:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,37 @@
 # -*- coding: utf-8 -*-
 """
 Code Search Playground 启动器
-启动一个简单的HTTP服务器来运行playground界面
+启动多线程HTTP服务器来运行playground界面，并代理、缓存检索API的搜索请求
 """
 
-import http.server
-import socketserver
 import webbrowser
 import os
 import sys
 from pathlib import Path
 
-def start_playground(port=8080):
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import (
+    API_CONFIG, PLAYGROUND_CONFIG, PATH_CONFIG, EVALUATION_CONFIG,
+    CATEGORY_CONFIG, PERFORMANCE_CONFIG, SERIALIZATION_CONFIG
+)
+
+def start_playground(port=8080, cache_size=None, source_root=None, dataset=None, live_evaluation=None):
     """
     启动playground服务器
     
     Args:
         port: 服务器端口，默认8080
+        cache_size: 搜索响应缓存条目数，默认使用 PLAYGROUND_CONFIG["cache_size"]
+        source_root: 被检索项目的本地代码目录，默认使用 PLAYGROUND_CONFIG["source_root"]
+        dataset: 对比模式中用于计算评估分数的测试数据集，默认使用 PLAYGROUND_CONFIG["dataset"]
+        live_evaluation: 是否允许从页面启动评估，默认使用 PLAYGROUND_CONFIG["live_evaluation"]
     """
+    from utils.playground_server import PlaygroundServer, SearchProxy
+    from utils.playground_compare import CompareRunner, DatasetIndex
+    from utils.live_evaluation import EvaluationJobManager
+    from utils.source_files import SourceFileCache
+    
     # 获取当前脚本所在目录
     current_dir = Path(__file__).parent.absolute()
     
@@ -32,42 +46,75 @@ def start_playground(port=8080):
     # 切换到项目目录
     os.chdir(current_dir)
     
-    # 创建HTTP服务器
-    class PlaygroundHandler(http.server.SimpleHTTPRequestHandler):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, directory=str(current_dir), **kwargs)
-        
-        def end_headers(self):
-            # 添加CORS头部，允许跨域请求
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            super().end_headers()
-        
-        def do_OPTIONS(self):
-            # 处理预检请求
-            self.send_response(200)
-            self.end_headers()
-        
-        def log_message(self, format, *args):
-            # 自定义日志格式
-            print(f"🌐 {self.address_string()} - {format % args}")
+    # 检索API代理（LRU缓存 + 相同请求合并）
+    proxy = SearchProxy(
+        API_CONFIG,
+        cache_size=PLAYGROUND_CONFIG["cache_size"] if cache_size is None else cache_size,
+        cache_ttl=PLAYGROUND_CONFIG["cache_ttl"],
+        timeout=PLAYGROUND_CONFIG["upstream_timeout"]
+    )
+    
+    # 代码查看器读取的源码目录
+    source_root = source_root or PLAYGROUND_CONFIG["source_root"]
+    sources = None
+    if source_root:
+        if not os.path.isdir(source_root):
+            print(f"❌ 源码目录不存在: {source_root}")
+            return False
+        sources = SourceFileCache(
+            source_root,
+            max_files=PLAYGROUND_CONFIG["file_cache_size"],
+            mmap_threshold=PLAYGROUND_CONFIG["mmap_threshold"]
+        )
+    
+    # 对比模式：多个检索组合共享并发上限，查询命中数据集案例时计算评估分数
+    dataset = dataset or PLAYGROUND_CONFIG["dataset"] or PATH_CONFIG["test_dataset"]
+    if not os.path.isabs(dataset):
+        dataset = str(current_dir / dataset)
+    compare = CompareRunner(
+        proxy,
+        DatasetIndex(dataset),
+        max_workers=PLAYGROUND_CONFIG["compare_concurrency"],
+        max_combos=PLAYGROUND_CONFIG["compare_max_combos"],
+        evaluation_config=EVALUATION_CONFIG
+    )
+    
+    # 实时评估：页面中启动的评估与 run_evaluation.py 使用相同的配置
+    evaluations = None
+    if PLAYGROUND_CONFIG["live_evaluation"] if live_evaluation is None else live_evaluation:
+        evaluations = EvaluationJobManager({
+            "api": API_CONFIG,
+            "evaluation": EVALUATION_CONFIG,
+            "categories": CATEGORY_CONFIG,
+            "performance": PERFORMANCE_CONFIG,
+            "paths": PATH_CONFIG,
+            "serialization": SERIALIZATION_CONFIG
+        }, str(current_dir))
     
     try:
         # 尝试启动服务器
-        with socketserver.TCPServer(("", port), PlaygroundHandler) as httpd:
+        with PlaygroundServer((PLAYGROUND_CONFIG["host"], port), str(current_dir), proxy,
+                              PLAYGROUND_CONFIG["gzip_min_size"], sources,
+                              PLAYGROUND_CONFIG["file_page_lines"], compare, evaluations,
+                              PLAYGROUND_CONFIG["sse_keepalive"], PLAYGROUND_CONFIG["cors_origins"]) as httpd:
             server_url = f"http://localhost:{port}/playground.html"
+            host = PLAYGROUND_CONFIG["host"]
             
             print("\n" + "="*60)
             print("🚀 Code Search Playground 已启动!")
             print("="*60)
             print(f"📍 服务器地址: {server_url}")
+            print(f"🔒 监听地址: {host or '所有网卡（局域网内的主机也可以访问）'}")
             print(f"🔧 项目目录: {current_dir}")
+            print(f"📋 对比数据集: {dataset}{'' if os.path.exists(dataset) else '（不存在，对比模式不计算评估分数）'}")
+            print(f"📂 源码目录: {sources.root if sources else '未配置（代码查看器不可用，使用 --source-root 指定）'}")
+            print(f"📊 实时评估: {'已启用' if evaluations else '未启用（使用 --live-eval 开启）'}")
             print("\n💡 使用说明:")
             print("   1. 浏览器会自动打开playground界面")
-            print("   2. 确保代码检索API服务正在运行 (http://localhost:8000)")
+            print(f"   2. 确保代码检索API服务正在运行 ({proxy.api_url})，搜索请求经本服务代理并缓存")
             print("   3. 在搜索框中输入查询，选择参数后点击搜索")
-            print("   4. 按 Ctrl+C 停止服务器")
+            print(f"   4. 缓存命中统计: http://localhost:{port}/api/proxy/stats")
+            print("   5. 按 Ctrl+C 停止服务器")
             print("\n" + "="*60)
             
             # 自动打开浏览器
@@ -84,14 +131,17 @@ def start_playground(port=8080):
             httpd.serve_forever()
             
     except OSError as e:
-        if e.errno == 48:  # Address already in use
+        if e.errno in (48, 98):  # Address already in use (macOS / Linux)
             print(f"❌ 端口 {port} 已被占用")
             print(f"   请尝试使用其他端口: python start_playground.py --port 8081")
         else:
             print(f"❌ 启动服务器失败: {e}")
         return False
     except KeyboardInterrupt:
+        stats = proxy.stats()
         print("\n\n🛑 服务器已停止")
+        print(f"   搜索缓存命中 {stats['cache_hits']} 次，合并请求 {stats['coalesced']} 次，"
+              f"请求检索API {stats['upstream_requests']} 次")
         print("👋 感谢使用 Code Search Playground!")
         return True
     except Exception as e:
@@ -112,14 +162,44 @@ def main():
   python start_playground.py              # 使用默认端口8080
   python start_playground.py --port 8081  # 使用端口8081
   python start_playground.py -p 9000      # 使用端口9000
+  python start_playground.py --cache-size 0  # 不缓存搜索响应
+  python start_playground.py --source-root ~/work/my-project  # 代码查看器显示真实文件内容
+  python start_playground.py --live-eval  # 允许在页面中启动数据集评估
         """
     )
     
     parser.add_argument(
         '--port', '-p',
         type=int,
-        default=8080,
-        help='服务器端口 (默认: 8080)'
+        default=PLAYGROUND_CONFIG["port"],
+        help=f'服务器端口 (默认: {PLAYGROUND_CONFIG["port"]})'
+    )
+    
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=None,
+        help=f'搜索响应缓存条目数，0为不缓存 (默认: {PLAYGROUND_CONFIG["cache_size"]})'
+    )
+    
+    parser.add_argument(
+        '--source-root',
+        type=str,
+        default=None,
+        help='被检索项目的本地代码目录，代码查看器从这里读取文件内容'
+    )
+    
+    parser.add_argument(
+        '--dataset',
+        type=str,
+        default=None,
+        help='对比模式中查询命中数据集案例时计算评估分数 (默认: PATH_CONFIG["test_dataset"])'
+    )
+    
+    parser.add_argument(
+        '--live-eval',
+        action='store_true',
+        help='允许在页面中启动数据集评估（会请求检索服务并写出结果文件）'
     )
     
     parser.add_argument(
@@ -136,7 +216,8 @@ def main():
         sys.exit(1)
     
     # 启动playground
-    success = start_playground(args.port)
+    success = start_playground(args.port, args.cache_size, args.source_root, args.dataset,
+                               True if args.live_eval else None)
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
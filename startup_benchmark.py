@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准测试
+测量命令行入口从进程启动到发出第一个检索请求的耗时（time-to-first-request），
+并用 python -X importtime 统计导入耗时最多的模块
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 项目根目录
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 目标: 从启动到发出第一个请求不超过200毫秒
+TARGET_MS = 200
+
+# 在子进程中把API地址指向本地桩服务后再运行入口脚本
+BOOTSTRAP = """
+import runpy, sys
+sys.path.insert(0, {root!r})
+import config
+config.API_CONFIG["base_url"] = {base_url!r}
+sys.argv = {argv!r}
+runpy.run_path({script!r}, run_name="__main__")
+"""
+
+
+class _StubSearchHandler(BaseHTTPRequestHandler):
+    """记录第一个请求到达时间的检索接口桩"""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.server.first_request_at is None:
+            self.server.first_request_at = time.perf_counter()
+
+        body = json.dumps({"results": [{"path": "stub/file.vue", "score": 1.0}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_importtime(stderr: str, top_n: int = 5):
+    """
+    解析 -X importtime 输出
+
+    Returns:
+        Tuple: (总导入耗时毫秒, [(模块名, 累计耗时毫秒)] 按耗时降序的顶层模块)
+    """
+    top_level = []
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        total_us += int(self_us)
+        # 名称前固定有一个空格，嵌套导入会额外缩进
+        name = name[1:]
+        if not name.startswith(" "):
+            top_level.append((name.strip(), int(cumulative_us) / 1000))
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return total_us / 1000, top_level[:top_n]
+
+
+def measure(script: str, argv: list, repeat: int = 5):
+    """
+    测量一个入口脚本的启动耗时
+
+    Args:
+        script: 入口脚本文件名
+        argv: 传给脚本的参数
+        repeat: 重复次数，取中位数
+
+    Returns:
+        Dict: 测量结果
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubSearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    first_request_ms = []
+    import_ms = None
+    top_modules = []
+    try:
+        # 前repeat次测量首个请求耗时；最后一次加 -X importtime 统计导入耗时
+        # （importtime自身有开销，不计入首个请求耗时）
+        for i in range(repeat + 1):
+            with_importtime = i == repeat
+            server.first_request_at = None
+            code = BOOTSTRAP.format(
+                root=ROOT_DIR,
+                base_url=base_url,
+                argv=[script] + argv,
+                script=os.path.join(ROOT_DIR, script)
+            )
+            command = [sys.executable] + (["-X", "importtime"] if with_importtime else []) + ["-c", code]
+            # 在临时目录中运行，避免结果、报告和日志写入项目目录
+            with tempfile.TemporaryDirectory() as work_dir:
+                start = time.perf_counter()
+                proc = subprocess.run(
+                    command,
+                    cwd=work_dir,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    text=True
+                )
+            if server.first_request_at is None:
+                raise RuntimeError(f"{script} 没有发出任何请求 (退出码 {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+            if with_importtime:
+                import_ms, top_modules = parse_importtime(proc.stderr)
+            else:
+                first_request_ms.append((server.first_request_at - start) * 1000)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    first_request_ms.sort()
+    return {
+        "command": " ".join([script] + argv),
+        "time_to_first_request_ms": first_request_ms[len(first_request_ms) // 2],
+        "import_ms": import_ms,
+        "top_modules": top_modules
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量命令行入口的启动耗时")
+    parser.add_argument("--repeat", type=int, default=5, help="每个入口重复测量的次数 (默认: 5)")
+    parser.add_argument("--dataset", type=str, default="test_dataset.json", help="run_evaluation.py 使用的数据集")
+    args = parser.parse_args()
+
+    dataset = os.path.join(ROOT_DIR, args.dataset)
+    entries = [
+        ("debug_single_case.py", ["--query", "首页轮播图"]),
+        ("run_evaluation.py", ["--limit", "1", "--dataset", dataset])
+    ]
+
+    failed = False
+    for script, argv in entries:
+        result = measure(script, argv, args.repeat)
+        status = "OK" if result["time_to_first_request_ms"] <= TARGET_MS else "超出目标"
+        failed = failed or status != "OK"
+
+        print(f"\n{result['command']}")
+        print(f"  首个请求耗时: {result['time_to_first_request_ms']:.1f}ms (目标 {TARGET_MS}ms, {status})")
+        print(f"  模块导入耗时: {result['import_ms']:.1f}ms")
+        print("  导入最慢的顶层模块:")
+        for name, cumulative_ms in result["top_modules"]:
+            print(f"    {name:<30} {cumulative_ms:8.1f}ms")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
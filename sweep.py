@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+参数扫描工具
+对 method × rank_method × limit × project_id 网格中的所有组合评估同一批测试案例，
+在全局请求预算内并行执行，相同的请求共享缓存的响应，
+输出一张质量-延迟对比表（JSON）并标出帕累托前沿；每个组合同时记录到历史数据库，
+供 run_evaluation.py --show-history 的搜索方法对比图使用
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+import threading
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import (
+    API_CONFIG, EVALUATION_CONFIG, CATEGORY_CONFIG, PERFORMANCE_CONFIG, PATH_CONFIG,
+    SERIALIZATION_CONFIG, SWEEP_CONFIG
+)
+from utils.serializer import write_json_atomic
+from utils.sweep import SweepRunner, ResponseCache, RequestBudget, expand_grid
+
+
+def format_value(value, digits=3):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def print_table(sweep):
+    """输出对比表（按平均总分从高到低），帕累托前沿上的组合标记 *"""
+    latency_field = sweep["latency_field"]
+    rows = sorted(sweep["rows"], key=lambda row: -(row["avg_total_score"] or 0.0))
+    header = f"{'':2}{'method':<10}{'rank_method':<12}{'limit':>6}{'project':>8}" \
+             f"{'总分':>8}{'相关性':>8}{'成功':>7}{'p50':>9}{latency_field[8:]:>9}{'上游请求':>9}{'缓存':>6}"
+    print(header)
+    print("-" * 92)
+    for row in rows:
+        print(
+            f"{'*' if row['pareto'] else '':2}{row['method']:<10}{row['rank_method']:<12}{row['limit']:>6}"
+            f"{row['project_id']:>8}{format_value(row['avg_total_score']):>8}{format_value(row['avg_relevance']):>8}"
+            f"{row['succeeded']:>4}/{row['cases']:<2}"
+            f"{format_value(row['latency_p50'] and row['latency_p50'] * 1000, 0) + 'ms':>9}"
+            f"{format_value(row[latency_field] and row[latency_field] * 1000, 0) + 'ms':>9}"
+            f"{row['upstream_requests']:>9}{row['cache_hits']:>6}"
+        )
+    requests = sweep["requests"]
+    print(
+        f"\n{sweep['combos']} 个组合 × {sweep['cases']} 个案例，用时 {sweep['elapsed']:.1f}秒；"
+        f"上游请求 {requests['upstream']} 次，缓存命中 {requests['cache_hits']} 次，合并 {requests['coalesced']} 次"
+    )
+    print("* 帕累托前沿: " + ", ".join(
+        f"{item['method']}/{item['rank_method']}/limit={item['limit']}" for item in sweep["pareto"]
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对 method × rank_method × limit × project_id 网格进行参数扫描")
+    parser.add_argument("--methods", nargs="+", help=f"搜索方法 (默认: {API_CONFIG['method']})")
+    parser.add_argument("--rank-methods", nargs="+", help=f"重排方法 (默认: {API_CONFIG['rank_method']})")
+    parser.add_argument("--limits", nargs="+", type=int, help=f"返回结果数量 (默认: {API_CONFIG['limit']})")
+    parser.add_argument("--project-ids", nargs="+", help=f"项目ID (默认: {API_CONFIG['project_id']})")
+    parser.add_argument("--dataset", "-d", type=str, help="测试数据集文件路径 (默认: PATH_CONFIG['test_dataset'])")
+    parser.add_argument("--max-cases", "-n", type=int, help="只评估前N个案例")
+    parser.add_argument("--category", "-c", type=str, choices=list(CATEGORY_CONFIG.keys()), help="按类别过滤测试案例")
+    parser.add_argument("--concurrency", type=int, default=SWEEP_CONFIG["max_concurrency"],
+                        help=f"所有组合共享的并发请求数 (默认: {SWEEP_CONFIG['max_concurrency']})")
+    parser.add_argument("--max-requests", type=int, default=SWEEP_CONFIG["max_requests"],
+                        help="最多发出的上游请求数，超出后剩余案例记为失败 (默认: 不限制)")
+    parser.add_argument("--parallel-combos", type=int, default=SWEEP_CONFIG["parallel_combos"],
+                        help=f"同时评估的组合数 (默认: {SWEEP_CONFIG['parallel_combos']})")
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不写入缓存文件（同一次扫描内仍然复用相同请求）")
+    parser.add_argument("--no-history", action="store_true", help="不把各组合记录到历史数据库")
+    parser.add_argument("--output", "-o", type=str, help="对比表输出路径 (默认: results/sweeps/sweep_<时间>.json)")
+    parser.add_argument("--dry-run", action="store_true", help="只列出组合，不发出请求")
+    parser.add_argument("--debug", action="store_true", help="启用调试模式")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.debug else logging.WARNING,
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    grid = {
+        "method": args.methods,
+        "rank_method": args.rank_methods,
+        "limit": args.limits,
+        "project_id": args.project_ids
+    }
+    if args.dry_run:
+        for params in expand_grid(grid, API_CONFIG):
+            print(params)
+        return
+
+    dataset_path = args.dataset or PATH_CONFIG["test_dataset"]
+    if not os.path.exists(dataset_path):
+        print(f"测试数据集文件不存在: {dataset_path}")
+        sys.exit(1)
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        test_cases = json.load(f).get("test_cases", [])
+    if args.category:
+        test_cases = [case for case in test_cases if case.get("category") == args.category]
+    if args.max_cases:
+        test_cases = test_cases[:args.max_cases]
+    if not test_cases:
+        print("没有测试案例需要评估")
+        sys.exit(1)
+
+    config = {
+        "api": API_CONFIG,
+        "evaluation": EVALUATION_CONFIG,
+        "categories": CATEGORY_CONFIG,
+        "performance": dict(
+            PERFORMANCE_CONFIG,
+            request_interval=SWEEP_CONFIG["request_interval"],
+            retry_in_evaluation=SWEEP_CONFIG["retry_attempts"] > 0,
+            retry_attempts=SWEEP_CONFIG["retry_attempts"],
+            retry_delay=SWEEP_CONFIG["retry_delay"],
+            retry_backoff=SWEEP_CONFIG["retry_backoff"]
+        ),
+        "paths": PATH_CONFIG,
+        "serialization": SERIALIZATION_CONFIG
+    }
+    cache = ResponseCache(None if args.no_cache else SWEEP_CONFIG["cache_file"] or None, SWEEP_CONFIG["cache_ttl"])
+    if cache.loaded:
+        print(f"已加载 {cache.loaded} 个缓存响应: {cache.path}")
+    budget = RequestBudget(args.concurrency, args.max_requests)
+    runner = SweepRunner(config, cache, budget, args.parallel_combos, SWEEP_CONFIG["latency_quantile"])
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    history_lock = threading.Lock()
+
+    def record(row, results):
+        print(
+            f"完成 {row['method']}/{row['rank_method']}/limit={row['limit']}/project={row['project_id']}: "
+            f"总分 {format_value(row['avg_total_score'])}"
+        )
+        if args.no_history:
+            return
+        results["meta"]["dataset"] = dataset_path
+        from utils.history_store import open_history_store
+        run_key = f"sweep_{timestamp}_{row['method']}_{row['rank_method']}_{row['limit']}_{row['project_id']}"
+        # SQLite连接不能跨线程使用，每个组合完成时单独打开
+        with history_lock, open_history_store(
+            PATH_CONFIG["history_db"], PATH_CONFIG["history_dir"], PATH_CONFIG["reports_dir"]
+        ) as store:
+            store.record_run(results, run_key, source="sweep")
+
+    try:
+        sweep = runner.run(grid, test_cases, on_result=record)
+    finally:
+        cache.close()
+    sweep["dataset"] = dataset_path
+    sweep["timestamp"] = timestamp
+
+    output_path = args.output or os.path.join(SWEEP_CONFIG["output_dir"], f"sweep_{timestamp}.json")
+    write_json_atomic(sweep, output_path, SERIALIZATION_CONFIG["backend"], SERIALIZATION_CONFIG["indent"])
+    print()
+    print_table(sweep)
+    print(f"\n对比表已保存到: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+limit调优工具
+每个查询只在较大的limit下检索一次，从同一批结果列表计算每个前缀长度（即每个较小limit）下的评估指标，
+推荐平均总分不低于峰值减容差的最小limit，并抽样请求几个候选limit，报告各limit的延迟和响应大小
+"""
+
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import (
+    API_CONFIG, EVALUATION_CONFIG, CATEGORY_CONFIG, PERFORMANCE_CONFIG, PATH_CONFIG,
+    SERIALIZATION_CONFIG, LIMIT_TUNING_CONFIG
+)
+from utils.metrics import EvaluationMetrics
+from utils.limit_tuning import prefix_metrics, limit_curve, recommend_limit, candidate_limits, LimitSampler, SCORE_FIELDS
+from utils.result_diff import iter_case_results
+from utils.serializer import write_json_atomic
+
+
+def evaluate_at_limit(args, max_limit):
+    """在max_limit下评估一次数据集，返回案例结果"""
+    from evaluator import CodeSearchEvaluator
+
+    dataset_path = args.dataset or PATH_CONFIG["test_dataset"]
+    if not os.path.exists(dataset_path):
+        print(f"测试数据集文件不存在: {dataset_path}")
+        sys.exit(1)
+    config = {
+        "api": dict(API_CONFIG, limit=max_limit),
+        "evaluation": EVALUATION_CONFIG,
+        "categories": CATEGORY_CONFIG,
+        "performance": PERFORMANCE_CONFIG,
+        "paths": PATH_CONFIG,
+        "serialization": SERIALIZATION_CONFIG
+    }
+    evaluator = CodeSearchEvaluator(config)
+    try:
+        dataset = evaluator.load_test_dataset(dataset_path)
+        test_cases = dataset["test_cases"]
+        if args.category:
+            test_cases = [case for case in test_cases if case.get("category") == args.category]
+        if args.max_cases:
+            test_cases = test_cases[:args.max_cases]
+        if not test_cases:
+            print("没有测试案例需要评估")
+            sys.exit(1)
+        print(f"在 limit={max_limit} 下评估 {len(test_cases)} 个案例...")
+        results = evaluator.evaluate_dataset({"test_cases": test_cases})
+        # 溢写的检索结果在 close() 后不能再读取，先取出需要的字段
+        case_results = [
+            {field: result.get(field) for field in ("success", "query", "actual_results", "expected_results")}
+            for result in results["detailed_results"]
+        ]
+        return case_results, evaluator.api_client
+    finally:
+        evaluator.close()
+
+
+def format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="找出不降低平均总分的最小结果数量（limit）")
+    parser.add_argument("--results", type=str,
+                        help="使用已有的评估结果文件（.json / .jsonl / .npz，应在较大的limit下评估），不重新评估")
+    parser.add_argument("--max-limit", type=int, default=LIMIT_TUNING_CONFIG["max_limit"],
+                        help=f"评估时使用的limit (默认: {LIMIT_TUNING_CONFIG['max_limit']})")
+    parser.add_argument("--tolerance", type=float, default=LIMIT_TUNING_CONFIG["tolerance"],
+                        help=f"允许比峰值低的平均总分 (默认: {LIMIT_TUNING_CONFIG['tolerance']})")
+    parser.add_argument("--dataset", "-d", type=str, help="测试数据集文件路径 (默认: PATH_CONFIG['test_dataset'])")
+    parser.add_argument("--max-cases", "-n", type=int, help="只评估前N个案例")
+    parser.add_argument("--category", "-c", type=str, choices=list(CATEGORY_CONFIG.keys()), help="按类别过滤测试案例")
+    parser.add_argument("--sample-size", type=int, default=LIMIT_TUNING_CONFIG["sample_size"],
+                        help=f"抽样测量延迟的查询数，0表示不抽样 (默认: {LIMIT_TUNING_CONFIG['sample_size']})")
+    parser.add_argument("--output", "-o", type=str, help="把完整的limit曲线和抽样结果写入JSON文件")
+    parser.add_argument("--debug", action="store_true", help="启用调试模式")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.debug else logging.WARNING,
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    metrics = EvaluationMetrics(EVALUATION_CONFIG)
+    normalize = metrics._normalize_path
+    client = None
+    if args.results:
+        if not os.path.exists(args.results):
+            print(f"结果文件不存在: {args.results}")
+            sys.exit(1)
+        case_results = list(iter_case_results(args.results))
+    else:
+        case_results, client = evaluate_at_limit(args, args.max_limit)
+
+    successful = [result for result in case_results if result.get("success", False)]
+    if not successful:
+        print("没有成功的评估结果")
+        sys.exit(1)
+    rankings = [[normalize(hit.get("path", "")) for hit in result.get("actual_results") or []] for result in successful]
+    expected = [[normalize(item.get("path", "")) for item in result.get("expected_results") or []]
+                for result in successful]
+    # 已有结果文件时以其中最长的结果列表为上限
+    max_limit = args.max_limit if not args.results else max(len(ranking) for ranking in rankings) or 1
+
+    curve = limit_curve(prefix_metrics(rankings, expected, max_limit, EVALUATION_CONFIG.get("default_k", 10)))
+    recommendation = recommend_limit(curve, args.tolerance)
+    full = sum(1 for ranking in rankings if len(ranking) >= max_limit)
+    print(
+        f"{len(successful)} 个成功案例（{full} 个返回了满 {max_limit} 个结果）；"
+        f"峰值平均总分 {recommendation['peak_total_score']:.3f} (limit={recommendation['peak_limit']})"
+    )
+    print(
+        f"推荐 limit = {recommendation['limit']}：平均总分 {recommendation['avg_total_score']:.3f}"
+        f"（容差 {args.tolerance}），当前配置 limit = {API_CONFIG['limit']}"
+        f"（平均总分 {curve['total_score'][min(API_CONFIG['limit'], max_limit) - 1]:.3f}）"
+    )
+
+    sampled = {}
+    limits = candidate_limits(max_limit, LIMIT_TUNING_CONFIG["candidates"], recommendation["limit"], API_CONFIG["limit"])
+    if args.sample_size > 0:
+        if client is None:
+            from utils.api_client import create_api_client
+            client = create_api_client(API_CONFIG)
+        sampler = LimitSampler(client, normalize, EVALUATION_CONFIG.get("latency", {}).get("relative_accuracy", 0.01))
+        queries = [{"query": result["query"], "ranking": ranking} for result, ranking in zip(successful, rankings)]
+        print(f"抽样 {min(args.sample_size, len(queries))} 个查询 × {len(limits)} 个limit 测量延迟和响应大小...")
+        sampled = sampler.sample(queries, limits, args.sample_size, LIMIT_TUNING_CONFIG["seed"])
+
+    print(f"\n{'limit':>6}{'总分':>8}{'相关性':>8}{'全面性':>8}{'可用性':>8}{'p50':>9}{'p90':>9}{'响应大小':>10}{'前缀一致':>8}")
+    print("-" * 82)
+    for limit in limits:
+        row = f"{limit:>6}" + "".join(f"{curve[field][limit - 1]:>10.3f}" if i else f"{curve[field][limit - 1]:>9.3f}"
+                                      for i, field in enumerate(SCORE_FIELDS))
+        sample = sampled.get(limit)
+        if sample:
+            latency = sample["latency"]
+            row += f"{format_ms(latency['p50']):>9}{format_ms(latency['p90']):>9}"
+            row += f"{sample['avg_bytes'] / 1024:>10.1f}KB" if sample["avg_bytes"] is not None else f"{'-':>12}"
+            row += f"{sample['prefix_match'] * 100:>8.0f}%" if sample["prefix_match"] is not None else f"{'-':>9}"
+        mark = "  <- 推荐" if limit == recommendation["limit"] else ""
+        print(row + mark)
+    mismatched = [limit for limit, sample in sampled.items()
+                  if sample["prefix_match"] is not None and sample["prefix_match"] < 1]
+    if mismatched:
+        print(f"\n注意: limit {mismatched} 的部分响应不是大limit结果的前缀，这些limit的指标是估计值，建议实际评估确认")
+
+    if args.output:
+        write_json_atomic({
+            "timestamp": datetime.now().isoformat(),
+            "source": args.results or (args.dataset or PATH_CONFIG["test_dataset"]),
+            "max_limit": max_limit,
+            "tolerance": args.tolerance,
+            "cases": len(successful),
+            "recommendation": recommendation,
+            "curve": [
+                {"limit": limit, **{f"avg_{field}": float(curve[field][limit - 1]) for field in SCORE_FIELDS}}
+                for limit in range(1, max_limit + 1)
+            ],
+            "sampled": {str(limit): sample for limit, sample in sampled.items()}
+        }, args.output, SERIALIZATION_CONFIG["backend"], SERIALIZATION_CONFIG["indent"])
+        print(f"\n完整结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,64 @@
 
 import requests
 import time
+import threading
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+from utils.tracing import NOOP_TRACER, SPAN_KIND_CLIENT
+
+
+def retry_search(search: Callable[[], Dict[str, Any]], max_retries: int = 3, retry_delay: float = 1.0,
+                 backoff: float = 1.0, tracer=NOOP_TRACER, on_retry: Optional[Callable[[], None]] = None,
+                 cancel_event: Optional[threading.Event] = None,
+                 logger: Optional[logging.Logger] = None) -> Tuple[Dict[str, Any], int]:
+    """
+    按重试策略执行一次检索
+
+    每次尝试记录为 retry.attempt span，两次尝试之间的等待记录为 retry.wait span。
+    结果中 "retryable" 为 False 的错误（例如请求预算已用完）不重试
+
+    Args:
+        search: 执行一次请求的函数，返回API结果（出错时含 "error"）
+        max_retries: 最大重试次数
+        retry_delay: 第一次重试前的等待时间（秒）
+        backoff: 每次重试后等待时间的倍数
+        tracer: 链路追踪器
+        on_retry: 每次决定重试时调用（例如计入重试指标）
+        cancel_event: 设置后不再重试，返回最后一次的错误结果
+        logger: 记录重试的日志器
+
+    Returns:
+        Tuple: (最后一次的结果, 重试次数)
+    """
+    delay = retry_delay
+    for attempt in range(max_retries + 1):
+        with tracer.span("retry.attempt", {"attempt": attempt + 1, "max_retries": max_retries}) as span:
+            result = search()
+            if "error" in result:
+                span.set_error(result["error"])
+
+        # 如果成功、是最后一次尝试、错误不可重试或已取消，直接返回
+        if ("error" not in result or attempt == max_retries or result.get("retryable") is False
+                or (cancel_event is not None and cancel_event.is_set())):
+            return result, attempt
+
+        # 等待后重试
+        if logger is not None:
+            logger.warning(f"第 {attempt + 1} 次请求失败，{delay}秒后重试")
+        if on_retry is not None:
+            on_retry()
+        with tracer.span("retry.wait", {"seconds": delay}):
+            if cancel_event is not None:
+                # 取消时立即结束等待
+                if cancel_event.wait(delay):
+                    return result, attempt
+            else:
+                time.sleep(delay)
+        delay *= backoff
+
+    return result, max_retries
+
 
 class CodeSearchAPIClient:
     """代码检索API客户端"""
@@ -39,6 +95,25 @@ class CodeSearchAPIClient:
             'Content-Type': 'application/json',
             'User-Agent': 'CodeSearchEvaluator/1.0'
         })
+        
+        # 可选的指标导出器（utils.metrics_exporter.EvaluationMetricsExporter）
+        self.exporter = None
+        
+        # 链路追踪器（utils.tracing.Tracer），默认不记录
+        self.tracer = NOOP_TRACER
+        
+        # 请求速率限制（utils.multi_target.RateLimiter），设置后每次HTTP请求（包括重试和换副本重发）前获取时间片；
+        # cancel_event 设置后立即结束等待
+        self.rate_limiter = None
+        self.cancel_event = None
+        # 各线程累计的速率限制等待时间（take_rate_limit_wait 读取并清零）
+        self._local = threading.local()
+        
+        # 多副本负载均衡：配置了base_urls时每个请求选择一个副本
+        self.balancer = None
+        if config.get("base_urls"):
+            from utils.load_balancer import create_balancer
+            self.balancer = create_balancer(config["base_urls"], config.get("load_balancing", {}))
     
     def search_code(self, query: str, limit: Optional[int] = None) -> Dict[str, Any]:
         """
@@ -60,48 +135,110 @@ class CodeSearchAPIClient:
             "rank_method": self.rank_method
         }
         
+        if self.balancer is None:
+            return self._post(query, params, None)
+        
+        # 连接错误时请求没有到达副本，换一个尚未尝试的副本重发
+        tried = set()
+        while True:
+            replica = self.balancer.acquire(exclude=tried)
+            result = self._post(query, params, replica)
+            tried.add(replica.url)
+            if result.get("error") != "连接错误" or len(tried) >= len(self.balancer.replicas):
+                return result
+            self.logger.warning(f"副本 {replica.url} 连接失败，改用其他副本")
+    
+    def _post(self, query: str, params: Dict[str, Any], replica) -> Dict[str, Any]:
+        """
+        向API（或选中的副本）发送一次检索请求
+        
+        Args:
+            query: 搜索查询语句
+            params: 请求参数
+            replica: utils.load_balancer.Replica，未配置多副本时为None
+            
+        Returns:
+            Dict: API返回的结果
+        """
+        api_url = f"{replica.url}{self.endpoint}" if replica else self.api_url
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire(self.cancel_event)
+            self._local.rate_limit_wait = getattr(self._local, "rate_limit_wait", 0.0) + waited
+        start_time = time.time()
+        error_type = None
+        
         try:
-            self.logger.info(f"发起代码检索请求: {query}")
-            self.logger.debug(f"请求参数: {params}")
+            # 每个案例都会执行，使用%参数延迟格式化：日志级别未开启时不产生格式化开销
+            self.logger.info("发起代码检索请求: %s", query)
+            self.logger.debug("请求参数: %s", params)
             
             # 发送POST请求
-            response = self.session.post(
-                self.api_url,
-                json=params,
-                timeout=self.timeout
-            )
-            
-            # 检查响应状态
-            response.raise_for_status()
+            with self.tracer.span("http.request", {
+                "http.request.method": "POST",
+                "url.full": api_url,
+                "method": self.method,
+                "rank_method": self.rank_method,
+                "limit": params["limit"]
+            }, kind=SPAN_KIND_CLIENT) as span:
+                response = self.session.post(
+                    api_url,
+                    json=params,
+                    timeout=self.timeout
+                )
+                span.set_attribute("http.response.status_code", response.status_code)
+                span.set_attribute("http.response.body.size", len(response.content))
+                
+                # 检查响应状态
+                response.raise_for_status()
             
             # 解析JSON响应
-            result = response.json()
+            with self.tracer.span("decode") as span:
+                result = response.json()
+                span.set_attribute("result_count", len(result.get("results", [])))
             
-            self.logger.info(f"检索成功，返回 {len(result.get('results', []))} 个结果")
+            self.logger.info("检索成功，返回 %d 个结果", len(result.get("results", [])))
             return result
             
         except requests.exceptions.Timeout:
+            error_type = "timeout"
             self.logger.error(f"请求超时: {query}")
             return {"error": "请求超时", "results": []}
             
         except requests.exceptions.ConnectionError:
-            self.logger.error(f"连接错误: 无法连接到 {self.api_url}")
+            error_type = "connection"
+            self.logger.error(f"连接错误: 无法连接到 {api_url}")
             return {"error": "连接错误", "results": []}
             
         except requests.exceptions.HTTPError as e:
+            error_type = f"http_{e.response.status_code}"
             self.logger.error(f"HTTP错误 {e.response.status_code}: {query}")
             return {"error": f"HTTP错误 {e.response.status_code}", "results": []}
             
         except requests.exceptions.RequestException as e:
+            error_type = "request"
             self.logger.error(f"请求异常: {e}")
             return {"error": str(e), "results": []}
             
         except ValueError as e:
+            error_type = "decode"
             self.logger.error(f"JSON解析错误: {e}")
             return {"error": "响应格式错误", "results": []}
+        
+        finally:
+            if replica is not None:
+                # 4xx是请求本身的问题，不影响副本的健康状态
+                self.balancer.release(
+                    replica, time.time() - start_time, error_type,
+                    healthy=error_type is None or error_type.startswith("http_4")
+                )
+            if self.exporter:
+                self.exporter.observe_request(
+                    self.method, self.rank_method, time.time() - start_time, error_type
+                )
     
     def search_code_with_retry(self, query: str, max_retries: int = 3, 
-                              retry_delay: float = 1.0) -> Dict[str, Any]:
+                              retry_delay: float = 1.0,
+                              cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         带重试机制的代码检索
         
@@ -109,23 +246,33 @@ class CodeSearchAPIClient:
             query: 搜索查询语句
             max_retries: 最大重试次数
             retry_delay: 重试间隔时间（秒）
+            cancel_event: 设置后不再重试，返回最后一次的错误结果
             
         Returns:
             Dict: API返回的结果
         """
-        for attempt in range(max_retries + 1):
-            result = self.search_code(query)
-            
-            # 如果成功或者是最后一次尝试，直接返回
-            if "error" not in result or attempt == max_retries:
-                return result
-            
-            # 等待后重试
-            self.logger.warning(f"第 {attempt + 1} 次请求失败，{retry_delay}秒后重试")
-            time.sleep(retry_delay)
-        
+        result, _ = retry_search(
+            lambda: self.search_code(query), max_retries, retry_delay,
+            tracer=self.tracer, on_retry=self.record_retry, cancel_event=cancel_event, logger=self.logger
+        )
         return result
     
+    def take_rate_limit_wait(self) -> float:
+        """
+        读取并清零当前线程累计的速率限制等待时间
+        
+        Returns:
+            float: 上次调用以来当前线程等待速率限制的秒数
+        """
+        waited = getattr(self._local, "rate_limit_wait", 0.0)
+        self._local.rate_limit_wait = 0.0
+        return waited
+    
+    def record_retry(self) -> None:
+        """计入一次重试（启用指标导出时）"""
+        if self.exporter:
+            self.exporter.record_retry(self.method, self.rank_method)
+    
     def batch_search(self, queries: List[str], 
                     delay_between_requests: float = 0.5) -> List[Dict[str, Any]]:
         """
@@ -178,6 +325,15 @@ class CodeSearchAPIClient:
             self.logger.error(f"API连接测试异常: {e}")
             return False
     
+    def replica_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        各副本的请求数、错误数和延迟分位数
+        
+        Returns:
+            Dict: ReplicaBalancer.stats() 的结果，未配置多副本时为None
+        """
+        return self.balancer.stats() if self.balancer else None
+    
     def get_api_info(self) -> Dict[str, str]:
         """
         获取API信息
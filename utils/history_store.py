@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+"""
+评估历史存储模块
+使用本地SQLite数据库保存每次评估的汇总、配置、分类别指标和单案例指标
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Any, Optional
+
+from utils.records import hit_count
+
+# 数据库结构版本，结构变化时递增
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_key TEXT NOT NULL UNIQUE,
+    evaluation_time TEXT,
+    dataset TEXT,
+    method TEXT,
+    rank_method TEXT,
+    project_id TEXT,
+    result_limit INTEGER,
+    total_cases INTEGER,
+    successful_cases INTEGER,
+    failed_cases INTEGER,
+    total_elapsed_time REAL,
+    avg_elapsed_time REAL,
+    avg_total_score REAL,
+    avg_relevance REAL,
+    avg_completeness REAL,
+    avg_usability REAL,
+    saved_history INTEGER NOT NULL DEFAULT 0,
+    source TEXT NOT NULL DEFAULT 'run'
+);
+CREATE INDEX IF NOT EXISTS idx_runs_method ON runs (method, rank_method);
+CREATE INDEX IF NOT EXISTS idx_runs_history ON runs (saved_history, run_key);
+
+CREATE TABLE IF NOT EXISTS run_configs (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (run_id) ON DELETE CASCADE,
+    config_json TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS category_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    case_count INTEGER,
+    successful_cases INTEGER,
+    avg_total_score REAL,
+    avg_relevance REAL,
+    avg_completeness REAL,
+    avg_usability REAL,
+    avg_elapsed_time REAL,
+    max_elapsed_time REAL,
+    PRIMARY KEY (run_id, category)
+);
+
+CREATE TABLE IF NOT EXISTS case_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    case_no INTEGER NOT NULL,
+    idx TEXT,
+    category TEXT,
+    success INTEGER NOT NULL,
+    total_score REAL,
+    relevance REAL,
+    completeness REAL,
+    usability REAL,
+    elapsed_time REAL,
+    result_count INTEGER,
+    error TEXT,
+    PRIMARY KEY (run_id, case_no)
+);
+CREATE INDEX IF NOT EXISTS idx_case_metrics_idx ON case_metrics (idx, run_id);
+
+CREATE TABLE IF NOT EXISTS soak_windows (
+    soak_key TEXT NOT NULL,
+    window_no INTEGER NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    requests INTEGER,
+    errors INTEGER,
+    error_rate REAL,
+    request_rate REAL,
+    avg_total_score REAL,
+    latency_mean REAL,
+    latency_p50 REAL,
+    latency_p90 REAL,
+    latency_p99 REAL,
+    latency_max REAL,
+    compared_cases INTEGER,
+    changed_scores INTEGER,
+    drift_json TEXT,
+    PRIMARY KEY (soak_key, window_no)
+);
+"""
+
+SCORE_COLUMNS = ["total_score", "relevance", "completeness", "usability"]
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+class HistoryStore:
+    """基于SQLite的评估历史存储"""
+
+    def __init__(self, db_path: str):
+        """
+        打开（必要时创建）历史数据库
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO store_meta (key, value) VALUES ('schema_version', ?)",
+            (str(SCHEMA_VERSION),)
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def record_run(self, results: Dict[str, Any], run_key: str,
+                   saved_history: bool = False, source: str = "run") -> int:
+        """
+        记录一次完整评估
+
+        Args:
+            results: evaluate_dataset返回的完整评估结果
+            run_key: 评估批次标识（报告文件使用的时间戳）
+            saved_history: 是否计入历史分数趋势（对应 --save-history）
+            source: 数据来源: run / backfill_json / backfill_report / backfill_scores
+
+        Returns:
+            int: run_id
+        """
+        meta = results.get("meta", {})
+        framework = results.get("summary_metrics", {}).get("new_framework_performance", {})
+        api_config = results.get("config", {}).get("api", {})
+        detailed = results.get("detailed_results", [])
+
+        with self.conn:
+            # 同一run_key重复写入时以最新数据为准
+            self.conn.execute("DELETE FROM runs WHERE run_key = ?", (run_key,))
+            cursor = self.conn.execute(
+                """
+                INSERT INTO runs (
+                    run_key, evaluation_time, dataset, method, rank_method, project_id, result_limit,
+                    total_cases, successful_cases, failed_cases, total_elapsed_time, avg_elapsed_time,
+                    avg_total_score, avg_relevance, avg_completeness, avg_usability, saved_history, source
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    run_key,
+                    meta.get("evaluation_time"),
+                    meta.get("dataset"),
+                    api_config.get("method"),
+                    api_config.get("rank_method"),
+                    api_config.get("project_id"),
+                    api_config.get("limit"),
+                    meta.get("total_test_cases"),
+                    meta.get("successful_evaluations"),
+                    meta.get("failed_evaluations"),
+                    meta.get("total_elapsed_time"),
+                    meta.get("avg_elapsed_time"),
+                    framework.get("avg_total_score"),
+                    framework.get("avg_relevance"),
+                    framework.get("avg_completeness"),
+                    framework.get("avg_usability"),
+                    int(saved_history),
+                    source
+                )
+            )
+            run_id = cursor.lastrowid
+
+            if results.get("config"):
+                self.conn.execute(
+                    "INSERT INTO run_configs (run_id, config_json) VALUES (?, ?)",
+                    (run_id, json.dumps(results["config"], ensure_ascii=False, default=str))
+                )
+
+            if detailed:
+                self._insert_cases(run_id, detailed)
+
+        return run_id
+
+    def _insert_cases(self, run_id: int, detailed: List[Dict]) -> None:
+        """写入单案例指标，并汇总出分类别指标"""
+        rows = []
+        by_category = defaultdict(list)
+        for case_no, result in enumerate(detailed):
+            success = bool(result.get("success", False))
+            category = result.get("category", "unknown")
+            rows.append((
+                run_id,
+                case_no,
+                result.get("idx"),
+                category,
+                int(success),
+                result.get("total_score") if success else None,
+                result.get("relevance") if success else None,
+                result.get("completeness") if success else None,
+                result.get("usability") if success else None,
+                result.get("elapsed_time"),
+                hit_count(result) if success else None,
+                result.get("error")
+            ))
+            by_category[category].append(result)
+
+        self.conn.executemany(
+            "INSERT INTO case_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+        category_rows = []
+        for category, cat_results in by_category.items():
+            successful = [r for r in cat_results if r.get("success", False)]
+            elapsed = [r.get("elapsed_time", 0.0) for r in cat_results]
+            category_rows.append((
+                run_id,
+                category,
+                len(cat_results),
+                len(successful),
+                *[_mean([r.get(name, 0.0) for r in successful]) for name in SCORE_COLUMNS],
+                _mean(elapsed),
+                max(elapsed) if elapsed else None
+            ))
+        self.conn.executemany(
+            "INSERT INTO category_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", category_rows
+        )
+
+    def record_soak_window(self, soak_key: str, window: Dict[str, Any]) -> None:
+        """
+        记录浸泡测试（soak.py）的一个时间窗口
+
+        Args:
+            soak_key: 浸泡测试标识
+            window: utils.soak.SoakWindow.summary() 的结果，另含 "drift"（该窗口的漂移告警）
+        """
+        latency = window["latency"]
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO soak_windows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    soak_key, window["window"], window["start_time"], window["end_time"],
+                    window["requests"], window["errors"], window["error_rate"], window["request_rate"],
+                    window["avg_total_score"], latency["mean"], latency["p50"], latency["p90"], latency["p99"],
+                    latency["max"], window["compared_cases"], window["changed_scores"],
+                    json.dumps(window.get("drift", []), ensure_ascii=False)
+                )
+            )
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def score_history(self) -> List[Dict[str, Any]]:
+        """
+        获取历史分数趋势（仅包含 --save-history 保存的评估）
+
+        Returns:
+            List[Dict]: 按时间排序的 {timestamp, total_score, relevance, completeness, usability}
+        """
+        rows = self.conn.execute(
+            """
+            SELECT run_key AS timestamp, avg_total_score AS total_score, avg_relevance AS relevance,
+                   avg_completeness AS completeness, avg_usability AS usability
+            FROM runs
+            WHERE saved_history = 1 AND avg_total_score IS NOT NULL
+            ORDER BY run_key
+            """
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def method_performance(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        按搜索方法和排序方法汇总平均分数与平均耗时
+
+        Returns:
+            Dict: {method: {rank_method: {"avg_score", "avg_time", "runs"}}}
+        """
+        rows = self.conn.execute(
+            """
+            SELECT method, rank_method, AVG(avg_total_score) AS avg_score,
+                   AVG(avg_elapsed_time) AS avg_time, COUNT(*) AS runs
+            FROM runs
+            WHERE method IS NOT NULL AND rank_method IS NOT NULL
+              AND avg_total_score IS NOT NULL AND avg_elapsed_time IS NOT NULL
+            GROUP BY method, rank_method
+            ORDER BY method, rank_method
+            """
+        ).fetchall()
+
+        performance = {}
+        for row in rows:
+            performance.setdefault(row["method"], {})[row["rank_method"]] = {
+                "avg_score": row["avg_score"],
+                "avg_time": row["avg_time"],
+                "runs": row["runs"]
+            }
+        return performance
+
+    def get_run(self, run_key: str) -> Optional[Dict[str, Any]]:
+        """按run_key获取一次评估的汇总信息"""
+        row = self.conn.execute("SELECT * FROM runs WHERE run_key = ?", (run_key,)).fetchone()
+        return dict(row) if row else None
+
+    def run_cases(self, run_key: str) -> List[tuple]:
+        """
+        获取一次评估的单案例指标（按案例顺序）
+
+        Returns:
+            List[tuple]: (idx, category, success, total_score, usability, elapsed_time)
+        """
+        return self.conn.execute(
+            """
+            SELECT c.idx, c.category, c.success, c.total_score, c.usability, c.elapsed_time
+            FROM case_metrics c JOIN runs r ON r.run_id = c.run_id
+            WHERE r.run_key = ?
+            ORDER BY c.case_no
+            """,
+            (run_key,)
+        ).fetchall()
+
+    def case_history(self, idx: str) -> List[Dict[str, Any]]:
+        """获取某个测试案例在各次评估中的指标"""
+        rows = self.conn.execute(
+            """
+            SELECT r.run_key, r.method, r.rank_method, c.success, c.total_score, c.relevance,
+                   c.completeness, c.usability, c.elapsed_time
+            FROM case_metrics c JOIN runs r ON r.run_id = c.run_id
+            WHERE c.idx = ?
+            ORDER BY r.run_key
+            """,
+            (idx,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def soak_windows(self, soak_key: str) -> List[Dict[str, Any]]:
+        """获取一次浸泡测试的所有时间窗口（按窗口顺序，drift为告警列表）"""
+        rows = self.conn.execute(
+            "SELECT * FROM soak_windows WHERE soak_key = ? ORDER BY window_no", (soak_key,)
+        ).fetchall()
+        windows = []
+        for row in rows:
+            window = dict(row)
+            window["drift"] = json.loads(window.pop("drift_json") or "[]")
+            windows.append(window)
+        return windows
+
+    # ------------------------------------------------------------------
+    # 历史数据导入
+    # ------------------------------------------------------------------
+
+    def is_backfilled(self) -> bool:
+        row = self.conn.execute("SELECT value FROM store_meta WHERE key = 'backfilled'").fetchone()
+        return row is not None
+
+    def backfill(self, history_dir: str, reports_dir: str) -> Dict[str, int]:
+        """
+        一次性导入旧版历史数据
+
+        数据来源（按信息完整程度依次使用，同一时间戳只导入一次）:
+        1. history_dir/evaluation_<时间戳>.json: 完整评估结果
+        2. reports_dir/evaluation_report_<时间戳>.md: 方法、平均总分、平均耗时
+        3. history_dir/scores_history.json: 历史分数
+
+        Args:
+            history_dir: 历史结果目录
+            reports_dir: 报告目录
+
+        Returns:
+            Dict[str, int]: 各来源导入的评估数量
+        """
+        counts = {"json": 0, "report": 0, "scores": 0}
+
+        scores_path = os.path.join(history_dir, "scores_history.json")
+        history_scores = {}
+        if os.path.exists(scores_path):
+            try:
+                with open(scores_path, 'r', encoding='utf-8') as f:
+                    history_scores = {s["timestamp"]: s for s in json.load(f)}
+            except (OSError, ValueError, KeyError) as e:
+                self.logger.warning(f"读取历史分数文件失败: {e}")
+
+        known = {row["run_key"] for row in self.conn.execute("SELECT run_key FROM runs")}
+
+        # 1. 完整的历史评估结果
+        if os.path.isdir(history_dir):
+            for name in sorted(os.listdir(history_dir)):
+                match = re.fullmatch(r"evaluation_(.+)\.json", name)
+                if not match or match.group(1) in known:
+                    continue
+                try:
+                    with open(os.path.join(history_dir, name), 'r', encoding='utf-8') as f:
+                        results = json.load(f)
+                except (OSError, ValueError) as e:
+                    self.logger.warning(f"跳过无法解析的历史结果 {name}: {e}")
+                    continue
+                run_key = match.group(1)
+                self.record_run(results, run_key, saved_history=run_key in history_scores,
+                                source="backfill_json")
+                known.add(run_key)
+                counts["json"] += 1
+
+        # 2. Markdown报告
+        if os.path.isdir(reports_dir):
+            for name in sorted(os.listdir(reports_dir)):
+                match = re.fullmatch(r"evaluation_report_(.+)\.md", name)
+                if not match or match.group(1) in known:
+                    continue
+                with open(os.path.join(reports_dir, name), 'r', encoding='utf-8') as f:
+                    results = self._parse_legacy_report(f.read())
+                if results is None:
+                    continue
+                run_key = match.group(1)
+                score = history_scores.get(run_key)
+                if score:
+                    results["summary_metrics"]["new_framework_performance"].update(
+                        {f"avg_{metric}": score[metric] for metric in SCORE_COLUMNS if metric in score}
+                    )
+                self.record_run(results, run_key, saved_history=score is not None,
+                                source="backfill_report")
+                known.add(run_key)
+                counts["report"] += 1
+
+        # 3. 只有分数的历史记录
+        for run_key, score in history_scores.items():
+            if run_key in known:
+                continue
+            results = {
+                "summary_metrics": {
+                    "new_framework_performance": {
+                        f"avg_{metric}": score.get(metric) for metric in SCORE_COLUMNS
+                    }
+                }
+            }
+            self.record_run(results, run_key, saved_history=True, source="backfill_scores")
+            known.add(run_key)
+            counts["scores"] += 1
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('backfilled', ?)",
+                (json.dumps(counts),)
+            )
+        return counts
+
+    @staticmethod
+    def _parse_legacy_report(content: str) -> Optional[Dict[str, Any]]:
+        """从旧版Markdown报告中解析出汇总信息"""
+        patterns = {
+            "method": r"\*\*搜索方法\*\*: (.*?)\n",
+            "rank_method": r"\*\*排序方法\*\*: (.*?)\n",
+            "project_id": r"\*\*项目ID\*\*: (.*?)\n",
+            "evaluation_time": r"\*\*评估时间\*\*: (.*?)\n",
+            "total_cases": r"\*\*测试案例总数\*\*: (\d+)",
+            "avg_total_score": r"\*\*平均总分\*\*: ([\d.]+)",
+            "avg_relevance": r"\*\*平均相关性\*\*: ([\d.]+)",
+            "avg_completeness": r"\*\*平均全面性\*\*: ([\d.]+)",
+            "avg_usability": r"\*\*平均可用性\*\*: ([\d.]+)",
+            "total_elapsed_time": r"\*\*总耗时\*\*: ([\d.]+)秒",
+            "avg_elapsed_time": r"\*\*平均每个案例耗时\*\*: ([\d.]+)秒"
+        }
+        values = {}
+        for key, pattern in patterns.items():
+            match = re.search(pattern, content)
+            values[key] = match.group(1) if match else None
+
+        if values["avg_total_score"] is None or values["avg_elapsed_time"] is None:
+            return None
+
+        def to_float(key):
+            return float(values[key]) if values[key] is not None else None
+
+        return {
+            "meta": {
+                "evaluation_time": values["evaluation_time"],
+                "total_test_cases": int(values["total_cases"]) if values["total_cases"] else None,
+                "total_elapsed_time": to_float("total_elapsed_time"),
+                "avg_elapsed_time": to_float("avg_elapsed_time")
+            },
+            "summary_metrics": {
+                "new_framework_performance": {
+                    "avg_total_score": to_float("avg_total_score"),
+                    "avg_relevance": to_float("avg_relevance"),
+                    "avg_completeness": to_float("avg_completeness"),
+                    "avg_usability": to_float("avg_usability")
+                }
+            },
+            "config": {
+                "api": {
+                    "method": values["method"],
+                    "rank_method": values["rank_method"],
+                    "project_id": values["project_id"]
+                }
+            }
+        }
+
+
+def open_history_store(db_path: str, history_dir: str, reports_dir: str) -> HistoryStore:
+    """
+    打开历史数据库，首次打开时自动导入旧版历史数据
+
+    Args:
+        db_path: SQLite数据库文件路径
+        history_dir: 旧版历史结果目录
+        reports_dir: 旧版报告目录
+
+    Returns:
+        HistoryStore: 历史存储
+    """
+    store = HistoryStore(db_path)
+    if not store.is_backfilled():
+        counts = store.backfill(history_dir, reports_dir)
+        if any(counts.values()):
+            logging.getLogger(__name__).info(
+                f"已导入旧版历史数据: 完整结果 {counts['json']} 个, 报告 {counts['report']} 个, 历史分数 {counts['scores']} 个"
+            )
+    return store
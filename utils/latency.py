@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+延迟分布统计模块
+用对数分桶的流式分位数草图（DDSketch）计算p50/p90/p99，内存只与桶数有关、与案例数量无关；
+同时记录最慢的N个查询，并把分布绘制为ASCII直方图
+"""
+
+import heapq
+import math
+from typing import Dict, List, Any, Optional
+
+# 报告中展示的分位数
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LatencySketch:
+    """
+    流式分位数草图
+
+    值 v 落入第 ceil(log_gamma(v)) 个桶，gamma = (1 + a) / (1 - a)；
+    桶内取代表值 2 * gamma^i / (gamma + 1)，任意分位数的相对误差不超过 a。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-6):
+        """
+        Args:
+            relative_accuracy: 分位数的相对误差上限
+            min_value: 小于该值的延迟计入零值桶
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        """加入一个延迟值（秒）"""
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value < self.min_value:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: "LatencySketch") -> None:
+        """合并另一个相同精度的草图"""
+        if other.gamma != self.gamma:
+            raise ValueError("只能合并相对误差相同的延迟草图")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _value(self, index: int) -> float:
+        """桶的代表值"""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        估计分位数
+
+        Args:
+            q: 0~1之间的分位点
+
+        Returns:
+            Optional[float]: 分位数估计值，没有数据时为None
+        """
+        if self.count == 0:
+            return None
+        # 最近秩：取排序后第 ceil(q * n) 个值（下标从0开始为 ceil(q * n) - 1），尾部分位数不会偏低；
+        # 先舍入消除浮点误差，避免 0.9 * 70 = 63.00000000000001 这类情况多进一位
+        rank = min(self.count - 1, max(0, math.ceil(round(q * self.count, 9)) - 1))
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # 代表值不会超出实际观测到的范围
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def histogram(self, bins: int = 10) -> List[Dict[str, float]]:
+        """
+        等宽直方图（按桶的代表值分配，区间边界与实际值的误差在相对精度以内）
+
+        Args:
+            bins: 区间数量
+
+        Returns:
+            List[Dict]: [{"low", "high", "count"}]
+        """
+        if self.count == 0:
+            return []
+        low, high = self.min, self.max
+        if high <= low:
+            return [{"low": low, "high": high, "count": self.count}]
+        width = (high - low) / bins
+        counts = [0] * bins
+        counts[0] += self.zero_count
+        # 最低和最高的桶分别用实际的最小值、最大值定位，保证两端的区间不为空
+        first, last = min(self.buckets, default=None), max(self.buckets, default=None)
+        for index, count in self.buckets.items():
+            if index == first:
+                value = low
+            elif index == last:
+                value = high
+            else:
+                value = min(max(self._value(index), low), high)
+            counts[min(int((value - low) / width), bins - 1)] += count
+        return [
+            {"low": low + i * width, "high": low + (i + 1) * width, "count": count}
+            for i, count in enumerate(counts)
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        """分位数汇总（秒）"""
+        result = {"count": self.count, "mean": self.mean}
+        for q in QUANTILES:
+            result[f"p{round(q * 100)}"] = self.quantile(q)
+        result["max"] = self.max if self.count else None
+        return result
+
+
+class LatencyTracker:
+    """按类别汇总案例延迟：每个类别一个草图，并保留最慢的N个查询"""
+
+    def __init__(self, slowest: int = 5, relative_accuracy: float = 0.01):
+        """
+        Args:
+            slowest: 每个类别保留的最慢查询数量
+            relative_accuracy: 分位数的相对误差上限
+        """
+        self.slowest = slowest
+        self.relative_accuracy = relative_accuracy
+        self.overall = LatencySketch(relative_accuracy)
+        self.by_category = {}
+        self._slowest = {}
+        self._seq = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """加入一个案例结果（没有耗时的案例跳过）"""
+        elapsed = result.get("elapsed_time")
+        if elapsed is None:
+            return
+        category = result.get("category", "unknown")
+        self.overall.add(elapsed)
+        sketch = self.by_category.get(category)
+        if sketch is None:
+            sketch = self.by_category[category] = LatencySketch(self.relative_accuracy)
+        sketch.add(elapsed)
+
+        # 小顶堆保留最慢的N个；序号保证耗时相同时不比较字典
+        heap = self._slowest.setdefault(category, [])
+        self._seq += 1
+        entry = (elapsed, -self._seq, {
+            "idx": result.get("idx"),
+            "query": result.get("query"),
+            "elapsed_time": elapsed,
+            "success": result.get("success", False)
+        })
+        if len(heap) < self.slowest:
+            heapq.heappush(heap, entry)
+        elif elapsed > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def slowest_queries(self, category: str) -> List[Dict[str, Any]]:
+        """某个类别最慢的查询（按耗时从高到低）"""
+        return [item for _, _, item in sorted(self._slowest.get(category, []), reverse=True)]
+
+    def summary(self, bins: int = 10) -> Dict[str, Any]:
+        """
+        汇总结果（可直接写入评估结果meta）
+
+        Returns:
+            Dict: {"overall": {..., "histogram"}, "by_category": {类别: {..., "slowest"}}}
+        """
+        overall = self.overall.summary()
+        overall["histogram"] = self.overall.histogram(bins)
+        by_category = {}
+        for category in sorted(self.by_category):
+            stats = self.by_category[category].summary()
+            stats["slowest"] = self.slowest_queries(category)
+            by_category[category] = stats
+        return {"overall": overall, "by_category": by_category}
+
+
+def format_ascii_histogram(histogram: List[Dict[str, float]], width: int = 40) -> str:
+    """
+    把直方图绘制为文本
+
+    Args:
+        histogram: LatencySketch.histogram 的返回值
+        width: 最长条形的字符数
+
+    Returns:
+        str: 每个区间一行（毫秒），例如 "   120.0-   180.0ms | ######## 12"
+    """
+    if not histogram:
+        return ""
+    peak = max(item["count"] for item in histogram) or 1
+    lines = []
+    for item in histogram:
+        bar = "#" * math.ceil(item["count"] / peak * width) if item["count"] else ""
+        lines.append(f"{item['low'] * 1000:8.1f}-{item['high'] * 1000:8.1f}ms | {bar} {item['count']}")
+    return "\n".join(lines)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+结果数量（limit）调优模块
+每个查询只在较大的limit下检索一次，假设较小limit的响应是同一排序的前缀，
+用向量化的多前缀计算一次得到每个前缀长度下的评估框架指标（与 calculate_new_framework_metrics 结果相同），
+找出平均总分不低于峰值减容差的最小limit；另外抽样请求几个候选limit，测量延迟和响应大小，
+并检查实际响应是否确实是大limit结果的前缀
+"""
+
+import logging
+import random
+import time
+from typing import Dict, List, Any, Callable, Iterable, Optional
+
+import numpy as np
+
+from utils.latency import LatencySketch
+
+# 评分字段
+SCORE_FIELDS = ("total_score", "relevance", "completeness", "usability")
+
+
+def prefix_metrics(rankings: List[List[str]], expected: List[List[str]], max_limit: int,
+                   k: int = 10) -> Dict[str, np.ndarray]:
+    """
+    计算每个案例在前缀长度 1..max_limit 下的评估框架指标
+
+    与 EvaluationMetrics.calculate_new_framework_metrics(actual[:l], expected, k) 的定义一致：
+    相关性为期望文件首次出现位置的 1/(1+log2(pos)^2) 的平均（全部期望文件都在前N个时为1），
+    全面性为前 min(k, l) 个结果中命中的期望文件数（考虑重复）/ 期望文件数，可用性为第一个命中结果的倒数排名
+
+    Args:
+        rankings: 每个案例的检索结果路径（已规范化，按排名）
+        expected: 每个案例的期望结果路径（已规范化，保留重复）
+        max_limit: 最大前缀长度
+        k: 全面性只统计前k个结果（EVALUATION_CONFIG["default_k"]）
+
+    Returns:
+        Dict[str, np.ndarray]: 指标 -> [案例, max_limit]，第l-1列为前缀长度l的指标
+    """
+    n_cases = len(rankings)
+    n_expected = max((len(paths) for paths in expected), default=0)
+    lengths = np.arange(1, max_limit + 1)
+
+    # first[c, e]: 第e个期望文件在结果中首次出现的位置（从1开始），未出现为inf
+    first = np.full((n_cases, max(n_expected, 1)), np.inf)
+    expected_mask = np.zeros_like(first, dtype=bool)
+    # hits[c, j]: 第j个结果是否命中一个尚未被匹配的期望文件（全面性按多重集合计数）
+    hits = np.zeros((n_cases, max_limit))
+    counts = np.zeros(n_cases)
+    empty = np.zeros(n_cases, dtype=bool)
+    for c, (ranking, paths) in enumerate(zip(rankings, expected)):
+        ranking = ranking[:max_limit]
+        counts[c] = len(paths)
+        empty[c] = not ranking or not paths
+        positions = {}
+        for j, path in enumerate(ranking):
+            positions.setdefault(path, j + 1)
+        for e, path in enumerate(paths):
+            expected_mask[c, e] = True
+            first[c, e] = positions.get(path, np.inf)
+        remaining = {}
+        for path in paths:
+            remaining[path] = remaining.get(path, 0) + 1
+        for j, path in enumerate(ranking):
+            if remaining.get(path, 0) > 0:
+                remaining[path] -= 1
+                hits[c, j] = 1
+
+    # 可用性（MRR）
+    first_hit = np.min(np.where(expected_mask, first, np.inf), axis=1)
+    usability = np.where(first_hit[:, None] <= lengths[None], 1.0 / first_hit[:, None], 0.0)
+
+    # 全面性：前 min(k, l) 个结果中的命中数
+    cumulative = np.cumsum(hits, axis=1)
+    capped = np.minimum(lengths, k) - 1
+    safe_counts = np.where(counts > 0, counts, 1.0)
+    completeness = cumulative[:, capped] / safe_counts[:, None]
+
+    # 相关性
+    with np.errstate(divide="ignore"):
+        position_score = np.where(np.isfinite(first), 1.0 / (1.0 + np.log2(first) ** 2), 0.0)
+    found = first[:, :, None] <= lengths[None, None, :]  # [案例, 期望, 前缀]
+    partial = np.where(expected_mask[:, :, None] & found, position_score[:, :, None], 0.0).sum(axis=1)
+    partial = partial / safe_counts[:, None]
+    # 所有期望文件都在前 min(N, l) 个结果中时相关性为1
+    worst = np.max(np.where(expected_mask, first, 0.0), axis=1)
+    all_top_n = worst[:, None] <= np.minimum(counts[:, None], lengths[None])
+    relevance = np.where(all_top_n, 1.0, partial)
+
+    total = relevance * 0.3 + completeness * 0.3 + usability * 0.4
+    metrics = {"total_score": total, "relevance": relevance, "completeness": completeness, "usability": usability}
+    # 没有检索结果或没有期望结果时所有指标为0
+    for name in metrics:
+        metrics[name] = np.where(empty[:, None], 0.0, metrics[name])
+    return metrics
+
+
+def recommend_limit(curve: Dict[str, np.ndarray], tolerance: float) -> Dict[str, Any]:
+    """
+    找出平均总分不低于峰值减容差的最小limit
+
+    Args:
+        curve: 指标 -> [max_limit] 的平均值曲线
+        tolerance: 允许比峰值低的平均总分
+
+    Returns:
+        Dict: {"limit", "avg_total_score", "peak_limit", "peak_total_score"}
+    """
+    total = curve["total_score"]
+    peak = int(np.argmax(total))
+    limit = int(np.argmax(total >= total[peak] - tolerance))
+    return {
+        "limit": limit + 1,
+        "avg_total_score": float(total[limit]),
+        "peak_limit": peak + 1,
+        "peak_total_score": float(total[peak])
+    }
+
+
+class LimitSampler:
+    """抽样请求各候选limit，测量延迟、响应大小，并检查是否为大limit结果的前缀"""
+
+    def __init__(self, client, normalize: Callable[[str], str], relative_accuracy: float = 0.01):
+        """
+        Args:
+            client: utils.api_client.CodeSearchAPIClient（使用其会话、接口地址和参数）
+            normalize: 路径规范化函数
+            relative_accuracy: 延迟分位数的相对误差
+        """
+        self.client = client
+        self.normalize = normalize
+        self.relative_accuracy = relative_accuracy
+        self.logger = logging.getLogger(__name__)
+
+    def _request(self, query: str, limit: int):
+        """发出一次请求，返回 (延迟, 响应字节数, 结果路径)；失败时路径为None"""
+        client = self.client
+        params = {
+            "q": query,
+            "limit": limit,
+            "project_id": client.project_id,
+            "method": client.method,
+            "rank_method": client.rank_method
+        }
+        start = time.perf_counter()
+        try:
+            response = client.session.post(client.api_url, json=params, timeout=client.timeout)
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            payload = response.json()
+        except Exception as e:
+            self.logger.warning(f"抽样请求失败 (limit={limit}): {e}")
+            return time.perf_counter() - start, 0, None
+        return elapsed, len(response.content), [self.normalize(hit.get("path", "")) for hit in payload.get("results", [])]
+
+    def sample(self, queries: List[Dict[str, Any]], limits: Iterable[int], sample_size: int,
+               seed: int = 42) -> Dict[int, Dict[str, Any]]:
+        """
+        抽样测量各候选limit
+
+        Args:
+            queries: [{"query", "ranking"}]，ranking为大limit下的检索结果路径（已规范化）
+            limits: 候选limit
+            sample_size: 抽样的查询数
+            seed: 随机种子
+
+        Returns:
+            Dict: limit -> {"requests", "errors", "latency", "avg_bytes", "avg_results", "prefix_match"}
+        """
+        limits = sorted(set(limits))
+        rng = random.Random(seed)
+        sampled = rng.sample(queries, min(sample_size, len(queries)))
+        stats = {
+            limit: {"latency": LatencySketch(self.relative_accuracy), "bytes": 0, "results": 0,
+                    "matched": 0, "requests": 0, "errors": 0}
+            for limit in limits
+        }
+        for item in sampled:
+            # 每个查询打乱limit的请求顺序，避免检索服务的缓存总是偏向后请求的limit
+            order = list(limits)
+            rng.shuffle(order)
+            for limit in order:
+                elapsed, size, ranking = self._request(item["query"], limit)
+                entry = stats[limit]
+                entry["requests"] += 1
+                if ranking is None:
+                    entry["errors"] += 1
+                    continue
+                entry["latency"].add(elapsed)
+                entry["bytes"] += size
+                entry["results"] += len(ranking)
+                if ranking == item["ranking"][:len(ranking)] and len(ranking) >= min(limit, len(item["ranking"])):
+                    entry["matched"] += 1
+
+        report = {}
+        for limit, entry in stats.items():
+            ok = entry["requests"] - entry["errors"]
+            report[limit] = {
+                "requests": entry["requests"],
+                "errors": entry["errors"],
+                "latency": entry["latency"].summary(),
+                "avg_bytes": entry["bytes"] / ok if ok else None,
+                "avg_results": entry["results"] / ok if ok else None,
+                # 实际响应与大limit结果前缀相同的比例；明显低于1时前缀假设不成立，推荐值需要实际评估确认
+                "prefix_match": entry["matched"] / ok if ok else None
+            }
+        return report
+
+
+def limit_curve(metrics: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """各前缀长度下的平均指标"""
+    return {name: values.mean(axis=0) if len(values) else values.sum(axis=0) for name, values in metrics.items()}
+
+
+def candidate_limits(max_limit: int, candidates: Optional[Iterable[int]], recommended: int,
+                     current: int) -> List[int]:
+    """抽样的limit：配置的候选值（不超过max_limit）加上推荐值和当前配置的值"""
+    limits = {limit for limit in candidates or [] if 1 <= limit <= max_limit}
+    limits.update({recommended, min(current, max_limit), max_limit})
+    return sorted(limits)
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+实时评估模块
+在playground服务进程内后台运行一次数据集评估，每个案例完成时（结果接收器）生成一个事件：
+案例结果、滚动平均分、延迟分位数和错误，浏览器通过SSE（server-sent events）实时接收，
+不需要轮询或在评估结束后加载完整的结果文件
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from utils.latency import LatencySketch
+
+# 滚动平均的指标
+SCORE_FIELDS = ("total_score", "relevance", "completeness", "usability")
+
+
+class LiveStats:
+    """评估过程中的滚动统计：已完成/失败数、平均分和延迟分位数"""
+
+    def __init__(self, total: int, relative_accuracy: float = 0.01):
+        """
+        Args:
+            total: 案例总数
+            relative_accuracy: 延迟分位数的相对误差
+        """
+        self.total = total
+        self.done = 0
+        self.succeeded = 0
+        self.sums = dict.fromkeys(SCORE_FIELDS, 0.0)
+        self.latency = LatencySketch(relative_accuracy)
+        self.start_time = time.time()
+
+    def add(self, result: Dict[str, Any]) -> None:
+        self.done += 1
+        if result.get("success", False):
+            self.succeeded += 1
+            for field in SCORE_FIELDS:
+                self.sums[field] += result.get(field) or 0.0
+        elapsed = result.get("elapsed_time")
+        if elapsed is not None:
+            self.latency.add(elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前统计（延迟单位为秒）"""
+        wall = time.time() - self.start_time
+        snapshot = {
+            "done": self.done,
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.done - self.succeeded,
+            "throughput": self.done / wall if wall > 0 else 0.0
+        }
+        for field in SCORE_FIELDS:
+            snapshot[f"avg_{field}"] = self.sums[field] / self.succeeded if self.succeeded else None
+        snapshot["latency"] = self.latency.summary()
+        return snapshot
+
+
+class EvaluationJob:
+    """
+    一次后台评估
+
+    事件按序号保存在内存中（每个事件编码一次），订阅者从任意序号开始读取，
+    断线重连（SSE的Last-Event-ID）或晚打开页面时可以补齐之前的事件
+    """
+
+    def __init__(self, config: Dict[str, Any], dataset_path: str, test_cases: List[Dict],
+                 output_path: Optional[str] = None):
+        """
+        Args:
+            config: 评估器配置（与 run_evaluation.py 相同的结构）
+            dataset_path: 数据集路径（记录到结果meta）
+            test_cases: 要评估的案例
+            output_path: 评估完成后保存完整结果的路径，为None时不保存
+        """
+        self.job_id = uuid.uuid4().hex[:12]
+        self.config = config
+        self.dataset_path = dataset_path
+        self.test_cases = test_cases
+        self.output_path = output_path
+        self.status = "pending"
+        self.stats = LiveStats(
+            len(test_cases), config.get("evaluation", {}).get("latency", {}).get("relative_accuracy", 0.01)
+        )
+        self._events = []
+        self._cond = threading.Condition()
+        self._cancelled = False
+        self._evaluator = None
+        self._thread = None
+        self.logger = logging.getLogger(__name__)
+
+    # ------------------------------------------------------------------
+    # 事件
+    # ------------------------------------------------------------------
+
+    def publish(self, name: str, payload: Dict[str, Any], status: Optional[str] = None) -> None:
+        """
+        追加一个事件并唤醒所有订阅者
+
+        Args:
+            name: 事件名称
+            payload: 事件数据
+            status: 同时更新的任务状态（写入payload的status字段）；与追加事件在同一把锁内完成，
+                订阅者看到任务已结束时一定也能读到最后的 done / error 事件
+        """
+        with self._cond:
+            if status is not None:
+                self.status = status
+                payload = dict(payload, status=status)
+            event_id = len(self._events)
+            data = json.dumps(payload, ensure_ascii=False, default=str)
+            # SSE帧：data中没有换行（紧凑JSON），一行即可
+            self._events.append(f"id: {event_id}\nevent: {name}\ndata: {data}\n\n".encode("utf-8"))
+            self._cond.notify_all()
+
+    def wait_events(self, after: int, timeout: float = 15.0) -> Tuple[List[bytes], int, bool]:
+        """
+        读取序号大于after的事件，没有新事件时最多等待timeout秒
+
+        Returns:
+            Tuple: (SSE帧列表, 最后一个事件的序号, 任务是否已结束)
+        """
+        with self._cond:
+            if len(self._events) <= after + 1 and not self.finished:
+                self._cond.wait(timeout)
+            events = self._events[after + 1:]
+            return events, after + len(events), self.finished
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "cancelled", "failed")
+
+    def info(self) -> Dict[str, Any]:
+        """任务概况"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "dataset": self.dataset_path,
+            "total": len(self.test_cases),
+            "method": self.config["api"].get("method"),
+            "rank_method": self.config["api"].get("rank_method"),
+            "output_path": self.output_path,
+            "stats": self.stats.snapshot()
+        }
+
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """在后台线程开始评估"""
+        self.publish("start", self.info(), status="running")
+        self._thread = threading.Thread(target=self._run, name=f"live-eval-{self.job_id}", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        """取消评估：尚未发出请求的案例记为失败（已取消），正在进行的请求完成后结束"""
+        self._cancelled = True
+        if self._evaluator is not None:
+            self._evaluator.cancel()
+
+    def __call__(self, result: Dict[str, Any]) -> None:
+        """结果接收器：每个案例完成时发布事件"""
+        self.stats.add(result)
+        payload = {field: result.get(field) for field in ("idx", "query", "category", "success", "elapsed_time")}
+        if result.get("success", False):
+            for field in SCORE_FIELDS:
+                payload[field] = result.get(field)
+        else:
+            payload["error"] = result.get("error")
+        payload["stats"] = self.stats.snapshot()
+        self.publish("case", payload)
+
+    def _run(self) -> None:
+        from evaluator import CodeSearchEvaluator
+
+        evaluator = None
+        try:
+            evaluator = self._evaluator = CodeSearchEvaluator(self.config)
+            if self._cancelled:
+                evaluator.cancel()
+            evaluator.add_result_sink(self)
+            results = evaluator.evaluate_dataset({"test_cases": self.test_cases})
+            results["meta"]["dataset"] = self.dataset_path
+
+            if self._cancelled:
+                # 取消的评估不保存结果
+                self.output_path = None
+                status = "cancelled"
+            else:
+                if self.output_path:
+                    evaluator.save_results(results, self.output_path)
+                status = "completed"
+            self.publish("done", {
+                "summary_metrics": results["summary_metrics"],
+                "latency": {key: value for key, value in results["meta"]["latency"]["overall"].items()
+                            if key != "histogram"},
+                "total_elapsed_time": results["meta"]["total_elapsed_time"],
+                "output_path": self.output_path,
+                "stats": self.stats.snapshot()
+            }, status=status)
+        except Exception as e:
+            self.logger.error(f"实时评估失败: {e}")
+            self.publish("error", {"error": str(e), "stats": self.stats.snapshot()}, status="failed")
+        finally:
+            if evaluator is not None:
+                evaluator.close()
+
+
+class EvaluationJobManager:
+    """管理playground中的评估任务：同一时间只运行一个，保留最近的任务供重新连接"""
+
+    def __init__(self, config: Dict[str, Any], project_root: str, keep: int = 5):
+        """
+        Args:
+            config: 评估器配置（api / evaluation / categories / performance / paths / serialization）
+            project_root: 项目目录，数据集路径必须位于其中
+            keep: 保留的已结束任务数
+        """
+        self.config = config
+        self.project_root = project_root
+        self.keep = keep
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, params: Dict[str, Any]) -> EvaluationJob:
+        """
+        开始一次评估
+
+        Args:
+            params: {"dataset", "limit", "category", "method", "rank_method"}，均可省略
+
+        Returns:
+            EvaluationJob: 已启动的任务
+
+        Raises:
+            RuntimeError: 已有评估正在运行
+            ValueError: 数据集不存在或没有案例
+        """
+        from utils.server_common import resolve_under
+
+        dataset = params.get("dataset") or self.config["paths"]["test_dataset"]
+        dataset_path = resolve_under(self.project_root, dataset)
+        if dataset_path is None or not os.path.isfile(dataset_path):
+            raise ValueError(f"测试数据集不存在: {dataset}")
+        with open(dataset_path, "r", encoding="utf-8") as f:
+            test_cases = json.load(f).get("test_cases", [])
+        if params.get("category"):
+            test_cases = [case for case in test_cases if case.get("category") == params["category"]]
+        limit = int(params.get("limit") or 0)
+        if limit > 0:
+            test_cases = test_cases[:limit]
+        if not test_cases:
+            raise ValueError("没有测试案例需要评估")
+
+        api = dict(self.config["api"])
+        for field in ("method", "rank_method", "project_id"):
+            if params.get(field):
+                api[field] = params[field]
+        config = dict(self.config, api=api)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = os.path.join(self.config["paths"]["results_dir"], "playground", f"evaluation_{timestamp}.json")
+
+        with self._lock:
+            running = [job for job in self._jobs.values() if not job.finished]
+            if running:
+                raise RuntimeError(f"已有评估正在运行: {running[0].job_id}")
+            job = EvaluationJob(config, dataset, test_cases, output_path)
+            self._jobs[job.job_id] = job
+            # 只保留最近的任务（字典按插入顺序）
+            while len(self._jobs) > self.keep:
+                oldest = next(iter(self._jobs))
+                if not self._jobs[oldest].finished:
+                    break
+                del self._jobs[oldest]
+        job.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[EvaluationJob]:
+        return self._jobs.get(job_id)
+
+    @property
+    def latest(self) -> Optional[EvaluationJob]:
+        """最近开始的任务"""
+        with self._lock:
+            return next(reversed(self._jobs.values()), None) if self._jobs else None
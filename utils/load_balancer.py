@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+检索服务副本负载均衡模块
+在多个副本（base_url）之间分配请求，选择策略可替换：轮询、最少进行中请求、按延迟加权；
+连续失败的副本暂时移出轮换，冷却后重新放回试探；按副本统计延迟分位数和错误数，慢副本在报告中标出
+"""
+
+import itertools
+import random
+import threading
+import time
+from typing import Dict, List, Any, Optional, Set
+
+from utils.latency import LatencySketch
+
+
+class Replica:
+    """一个副本的状态和统计"""
+
+    def __init__(self, url: str, relative_accuracy: float = 0.01):
+        """
+        Args:
+            url: 副本的base_url
+            relative_accuracy: 延迟分位数的相对误差
+        """
+        self.url = url
+        self.outstanding = 0
+        self.latency = LatencySketch(relative_accuracy)
+        # 最近延迟的指数加权平均（按延迟加权策略使用），没有成功请求时为None
+        self.ewma = None
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+
+def round_robin(replicas: List[Replica], state: Dict[str, Any]) -> Replica:
+    """轮询：依次选择"""
+    counter = state.setdefault("counter", itertools.count())
+    return replicas[next(counter) % len(replicas)]
+
+
+def least_outstanding(replicas: List[Replica], state: Dict[str, Any]) -> Replica:
+    """最少进行中请求：进行中请求数相同时轮流选择"""
+    fewest = min(replica.outstanding for replica in replicas)
+    return round_robin([replica for replica in replicas if replica.outstanding == fewest], state)
+
+
+def latency_weighted(replicas: List[Replica], state: Dict[str, Any]) -> Replica:
+    """按延迟加权：按最近延迟的倒数随机选择，还没有延迟数据的副本按当前最快副本的权重参与"""
+    rng = state.setdefault("rng", random.Random(state.get("seed")))
+    known = [replica.ewma for replica in replicas if replica.ewma]
+    fastest = min(known) if known else 1.0
+    weights = [1.0 / (replica.ewma or fastest) for replica in replicas]
+    return rng.choices(replicas, weights=weights)[0]
+
+
+# 可选的副本选择策略：策略函数接收可用副本列表和策略自己的状态字典，返回选中的副本
+POLICIES = {
+    "round_robin": round_robin,
+    "least_outstanding": least_outstanding,
+    "latency_weighted": latency_weighted
+}
+
+
+class ReplicaBalancer:
+    """
+    在多个副本之间选择请求目标，线程安全
+
+    连续失败 eject_after 次的副本移出轮换 eject_seconds 秒；冷却结束后放回，
+    再失败一次会立即重新移出，成功一次则恢复正常。所有副本都被移出时选择最早结束冷却的副本，请求不会因此直接失败
+    """
+
+    def __init__(self, urls: List[str], policy: Any = "round_robin", eject_after: int = 3,
+                 eject_seconds: float = 30.0, latency_decay: float = 0.2, slow_factor: float = 2.0,
+                 relative_accuracy: float = 0.01, seed: Optional[int] = None):
+        """
+        Args:
+            urls: 副本的base_url列表
+            policy: POLICIES中的策略名，或签名相同的策略函数
+            eject_after: 连续失败多少次后移出轮换，0表示不移出
+            eject_seconds: 移出轮换的时长（秒）
+            latency_decay: 延迟指数加权平均中最新一次请求的权重
+            slow_factor: p90延迟超过各副本p90中位数的这个倍数时标记为慢副本
+            relative_accuracy: 延迟分位数的相对误差
+            seed: 按延迟加权策略的随机种子
+        """
+        if not urls:
+            raise ValueError("至少需要一个副本")
+        if isinstance(policy, str):
+            if policy not in POLICIES:
+                raise ValueError(f"未知的负载均衡策略: {policy}，可选: {', '.join(POLICIES)}")
+            self.policy_name, self.policy = policy, POLICIES[policy]
+        else:
+            self.policy_name, self.policy = getattr(policy, "__name__", "custom"), policy
+        self.replicas = [Replica(url.rstrip("/"), relative_accuracy) for url in dict.fromkeys(urls)]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.latency_decay = latency_decay
+        self.slow_factor = slow_factor
+        self._state = {"seed": seed}
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: Optional[Set[str]] = None) -> Replica:
+        """
+        选择一个副本并计入其进行中请求，请求结束后必须调用 release
+
+        Args:
+            exclude: 不选择的副本url（本次请求已经尝试过的副本），所有副本都被排除时忽略
+        """
+        with self._lock:
+            now = time.monotonic()
+            remaining = [replica for replica in self.replicas if replica.url not in (exclude or ())] or self.replicas
+            candidates = [replica for replica in remaining if replica.available(now)]
+            if candidates:
+                replica = self.policy(candidates, self._state)
+            else:
+                replica = min(remaining, key=lambda item: item.ejected_until)
+            replica.outstanding += 1
+            return replica
+
+    def release(self, replica: Replica, elapsed: float, error: Optional[str] = None,
+                healthy: bool = True) -> None:
+        """
+        记录一次请求的结果
+
+        Args:
+            replica: acquire 返回的副本
+            elapsed: 请求耗时（秒）
+            error: 错误类型，成功时为None
+            healthy: 出错时是否仍视为副本健康（例如4xx是请求本身的问题），健康的错误不计入连续失败
+        """
+        with self._lock:
+            replica.outstanding -= 1
+            replica.requests += 1
+            if error is None:
+                replica.latency.add(elapsed)
+                replica.ewma = elapsed if replica.ewma is None else \
+                    (1 - self.latency_decay) * replica.ewma + self.latency_decay * elapsed
+                replica.consecutive_failures = 0
+                return
+            replica.errors += 1
+            if healthy:
+                return
+            replica.consecutive_failures += 1
+            if self.eject_after and replica.consecutive_failures >= self.eject_after:
+                replica.ejected_until = time.monotonic() + self.eject_seconds
+                replica.ejections += 1
+                # 冷却结束后的第一次请求再失败就立即重新移出
+                replica.consecutive_failures = self.eject_after - 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        各副本的统计
+
+        Returns:
+            Dict: {"policy", "replicas": [{"url", "requests", "errors", "error_rate", "ejections",
+                   "ejected", "latency", "slow"}]}
+        """
+        with self._lock:
+            now = time.monotonic()
+            rows = []
+            for replica in self.replicas:
+                rows.append({
+                    "url": replica.url,
+                    "requests": replica.requests,
+                    "errors": replica.errors,
+                    "error_rate": replica.errors / replica.requests if replica.requests else 0.0,
+                    "ejections": replica.ejections,
+                    "ejected": not replica.available(now),
+                    "latency": replica.latency.summary()
+                })
+        p90s = sorted(row["latency"]["p90"] for row in rows if row["latency"]["p90"] is not None)
+        # 取下中位数：只有两个副本时与较快的副本比较
+        median = p90s[(len(p90s) - 1) // 2] if p90s else None
+        for row in rows:
+            p90 = row["latency"]["p90"]
+            row["slow"] = bool(len(p90s) > 1 and median and p90 is not None and p90 > median * self.slow_factor)
+        return {"policy": self.policy_name, "replicas": rows}
+
+
+def create_balancer(urls: List[str], config: Dict[str, Any],
+                    relative_accuracy: float = 0.01) -> ReplicaBalancer:
+    """
+    按 API_CONFIG["load_balancing"] 创建负载均衡器
+
+    Args:
+        urls: 副本的base_url列表
+        config: 负载均衡配置（policy / eject_after / eject_seconds / latency_decay / slow_factor）
+        relative_accuracy: 延迟分位数的相对误差
+
+    Returns:
+        ReplicaBalancer: 负载均衡器
+    """
+    return ReplicaBalancer(
+        urls,
+        policy=config.get("policy", "round_robin"),
+        eject_after=config.get("eject_after", 3),
+        eject_seconds=config.get("eject_seconds", 30.0),
+        latency_decay=config.get("latency_decay", 0.2),
+        slow_factor=config.get("slow_factor", 2.0),
+        relative_accuracy=relative_accuracy
+    )
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+日志配置模块
+评估线程只把日志记录放入队列（QueueHandler），由后台线程（QueueListener）
+负责格式化并写入控制台和文件，避免并发评估时各工作线程在处理器锁上串行等待
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+from typing import Optional
+
+# 当前生效的后台监听器（重复配置时先停止旧的）
+_listener = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """结构化日志格式：每条日志一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    入队前只合并消息参数，时间戳、格式化等工作留给监听线程
+
+    标准QueueHandler.prepare会用处理器的格式化器把异常堆栈拼进消息，
+    这里改为单独保存在exc_text中，JSON格式也能把异常作为独立字段输出。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # 参数可能是之后会被修改的可变对象，入队前必须先合并成字符串
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level: int,
+                      fmt: str,
+                      log_file: Optional[str] = None,
+                      console: bool = True,
+                      use_queue: bool = True,
+                      json_format: bool = False) -> Optional[logging.handlers.QueueListener]:
+    """
+    配置根日志器
+
+    Args:
+        level: 日志级别
+        fmt: 文本格式（json_format为True时忽略）
+        log_file: 日志文件路径，为空时不写文件
+        console: 是否输出到控制台
+        use_queue: 是否通过队列由后台线程写日志
+        json_format: 是否输出JSON行格式
+
+    Returns:
+        Optional[QueueListener]: 后台监听器，未使用队列时为None
+    """
+    global _listener
+    stop_logging()
+
+    formatter = JsonLineFormatter() if json_format else logging.Formatter(fmt)
+    handlers = []
+    if console:
+        handlers.append(logging.StreamHandler())
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers.clear()
+
+    if not use_queue:
+        for handler in handlers:
+            root.addHandler(handler)
+        return None
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(_LazyQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """停止后台监听器，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener = None
+
+
+# 进程退出前确保队列中的日志全部写出
+atexit.register(stop_logging)
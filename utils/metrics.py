@@ -4,7 +4,6 @@
 """
 
 import math
-import numpy as np
 from typing import Dict, List, Any, Tuple, Optional
 from collections import defaultdict
 import logging
@@ -210,6 +209,8 @@ class EvaluationMetrics:
         if not actual_results:
             return {"max_score": 0.0, "min_score": 0.0, "avg_score": 0.0, "std_score": 0.0}
         
+        import numpy as np
+        
         scores = [r.get("score", 0.0) for r in actual_results if "score" in r]
         
         if not scores:
@@ -386,6 +387,9 @@ class CategoryEvaluator:
         Returns:
             Dict: 按类别的评估结果
         """
+        import numpy as np
+        from utils.latency import LatencySketch
+        
         category_results = defaultdict(list)
         
         # 按类别分组
@@ -403,6 +407,12 @@ class CategoryEvaluator:
                 completeness_scores = [r.get("completeness", 0.0) for r in cat_results]
                 usability_scores = [r.get("usability", 0.0) for r in cat_results]
                 
+                # 延迟分位数（流式草图，不保存全部耗时）
+                latency = LatencySketch()
+                for r in cat_results:
+                    if r.get("elapsed_time") is not None:
+                        latency.add(r["elapsed_time"])
+                
                 category_metrics[category] = {
                     "name": category_config[category].get("name", category),
                     "count": len(cat_results),
@@ -410,7 +420,12 @@ class CategoryEvaluator:
                     "avg_total_score": np.mean(total_scores) if total_scores else 0.0,
                     "avg_relevance": np.mean(relevance_scores) if relevance_scores else 0.0,
                     "avg_completeness": np.mean(completeness_scores) if completeness_scores else 0.0,
-                    "avg_usability": np.mean(usability_scores) if usability_scores else 0.0
+                    "avg_usability": np.mean(usability_scores) if usability_scores else 0.0,
+                    # 延迟（秒）
+                    "p50_latency": latency.quantile(0.5),
+                    "p90_latency": latency.quantile(0.9),
+                    "p99_latency": latency.quantile(0.99),
+                    "max_latency": latency.max if latency.count else None
                 }
         
         return category_metrics
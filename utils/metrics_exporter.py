@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus / OpenMetrics 指标导出模块
+评估过程中通过本地HTTP端口暴露计数器、直方图等指标，评估结束时写出textfile，
+供Prometheus抓取或node_exporter的textfile collector读取（只依赖标准库）
+"""
+
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Any, Optional, Sequence, Tuple
+
+# 请求延迟直方图默认分桶（秒）
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """指标基类：按标签值保存数据，所有操作线程安全"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def family_name(self, openmetrics: bool) -> str:
+        return self.name
+
+    def samples(self, openmetrics: bool) -> List[str]:
+        raise NotImplementedError
+
+    def render(self, openmetrics: bool) -> List[str]:
+        family = self.family_name(openmetrics)
+        lines = [
+            f"# HELP {family} {_escape_help(self.documentation)}",
+            f"# TYPE {family} {self.type_name}"
+        ]
+        return lines + self.samples(openmetrics)
+
+
+class Counter(_Metric):
+    """单调递增计数器（名称以_total结尾）"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def family_name(self, openmetrics: bool) -> str:
+        # OpenMetrics中计数器的family名称不带_total后缀
+        if openmetrics and self.name.endswith("_total"):
+            return self.name[:-len("_total")]
+        return self.name
+
+    def samples(self, openmetrics: bool) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值；也可以设置为在导出时才计算的函数"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """导出时调用function获取当前值（仅适用于无标签的指标）"""
+        self._function = function
+
+    def samples(self, openmetrics: bool) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def samples(self, openmetrics: bool) -> List[str]:
+        with self._lock:
+            items = [(key, dict(state, counts=list(state["counts"]))) for key, state in sorted(self._values.items())]
+
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, openmetrics: bool = False) -> str:
+        """
+        导出为文本格式
+
+        Args:
+            openmetrics: True为OpenMetrics格式，False为Prometheus文本格式0.0.4
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(openmetrics))
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class EvaluationMetricsExporter:
+    """
+    评估指标导出器
+
+    - CodeSearchAPIClient 上报请求数、重试、按类型统计的错误和请求延迟
+    - CodeSearchEvaluator 通过结果接收器上报完成的案例、吞吐量和实时平均总分
+    """
+
+    def __init__(self, latency_buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.registry = MetricsRegistry()
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._server = None
+        self._server_thread = None
+
+        register = self.registry.register
+        self.requests = register(Counter(
+            "code_search_requests_total", "检索接口请求数",
+            ("method", "rank_method", "outcome")
+        ))
+        self.retries = register(Counter(
+            "code_search_request_retries_total", "检索接口重试次数", ("method", "rank_method")
+        ))
+        self.errors = register(Counter(
+            "code_search_request_errors_total", "检索接口错误数（按错误类型）", ("error_type",)
+        ))
+        self.latency = register(Histogram(
+            "code_search_request_duration_seconds", "检索接口请求延迟（秒）",
+            ("method", "rank_method"), buckets=latency_buckets
+        ))
+        self.cases = register(Counter(
+            "evaluation_cases_total", "已完成评估的案例数", ("status",)
+        ))
+        self.cases_planned = register(Gauge(
+            "evaluation_cases_planned", "本次评估计划的案例数"
+        ))
+        self.cases_per_second = register(Gauge(
+            "evaluation_cases_per_second", "评估吞吐量（已完成案例数 / 运行时间）"
+        ))
+        self.avg_total_score = register(Gauge(
+            "evaluation_avg_total_score", "已完成的成功案例的平均总分"
+        ))
+        self.run_start = register(Gauge(
+            "evaluation_run_start_timestamp_seconds", "本次评估开始的Unix时间戳"
+        ))
+
+        self._start_time = None
+        self._completed = 0
+        self._score_sum = 0.0
+        self._score_count = 0
+        self.cases_per_second.set_function(self._current_throughput)
+        self.avg_total_score.set_function(self._current_avg_score)
+
+    # ------------------------------------------------------------------
+    # 数据上报
+    # ------------------------------------------------------------------
+
+    def observe_request(self, method: str, rank_method: str, seconds: float,
+                        error_type: Optional[str] = None) -> None:
+        """记录一次检索请求（由API客户端调用）"""
+        outcome = "error" if error_type else "success"
+        self.requests.inc(method=method, rank_method=rank_method, outcome=outcome)
+        self.latency.observe(seconds, method=method, rank_method=rank_method)
+        if error_type:
+            self.errors.inc(error_type=error_type)
+
+    def record_retry(self, method: str, rank_method: str) -> None:
+        """记录一次重试（由API客户端调用）"""
+        self.retries.inc(method=method, rank_method=rank_method)
+
+    def start_run(self, total_cases: int) -> None:
+        """开始一次评估"""
+        with self._lock:
+            self._start_time = time.time()
+            self._completed = 0
+            self._score_sum = 0.0
+            self._score_count = 0
+        self.cases_planned.set(total_cases)
+        self.run_start.set(self._start_time)
+
+    def __call__(self, result: Dict[str, Any]) -> None:
+        """作为评估器的结果接收器，每完成一个案例调用一次"""
+        success = result.get("success", False)
+        self.cases.inc(status="success" if success else "error")
+        with self._lock:
+            self._completed += 1
+            if success:
+                self._score_sum += result.get("total_score", 0.0)
+                self._score_count += 1
+
+    def _current_throughput(self) -> float:
+        with self._lock:
+            if not self._start_time:
+                return 0.0
+            elapsed = time.time() - self._start_time
+            return self._completed / elapsed if elapsed > 0 else 0.0
+
+    def _current_avg_score(self) -> float:
+        with self._lock:
+            return self._score_sum / self._score_count if self._score_count else math.nan
+
+    # ------------------------------------------------------------------
+    # 导出
+    # ------------------------------------------------------------------
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9464) -> Tuple[str, int]:
+        """
+        在后台线程启动HTTP服务，通过 /metrics 暴露指标
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示随机端口
+
+        Returns:
+            Tuple: 实际监听的 (地址, 端口)
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+                body = registry.render(openmetrics).encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._server_thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-exporter", daemon=True
+        )
+        self._server_thread.start()
+        address = self._server.server_address[:2]
+        self.logger.info(f"指标导出服务已启动: http://{address[0]}:{address[1]}/metrics")
+        return address
+
+    def write_textfile(self, path: str) -> None:
+        """
+        原子地写出指标文件（node_exporter textfile collector 要求文件整体替换）
+
+        Args:
+            path: 输出路径（建议以.prom结尾）
+        """
+        output_dir = os.path.dirname(path) or "."
+        os.makedirs(output_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.registry.render(openmetrics=False))
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.logger.info(f"指标文件已保存到: {path}")
+
+    def close(self) -> None:
+        """停止HTTP服务"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+多数据集评估模块
+一次运行评估多个 数据集/project_id 组合：各组合并行执行，共享同一个HTTP连接池和全局请求速率限制，
+最后汇总为一份报告，包含每个组合和整体的评估指标与延迟分位数
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.latency import LatencySketch
+
+# 汇总表中的平均分字段
+SCORE_FIELDS = ("total_score", "relevance", "completeness", "usability")
+
+
+def parse_target(value: str, default_project_id: str) -> Dict[str, str]:
+    """
+    解析 数据集路径[:project_id]
+
+    Args:
+        value: 命令行参数，例如 test_dataset_vue.json:7
+        default_project_id: 省略project_id时使用的值（API_CONFIG["project_id"]）
+
+    Returns:
+        Dict: {"label", "dataset", "project_id"}，label为 数据集文件名@project_id
+    """
+    dataset, project_id = value, default_project_id
+    head, sep, tail = value.rpartition(":")
+    # 冒号之后是路径的一部分时（例如 C:\\data\\a.json）不作为project_id
+    if sep and head and tail and not any(ch in tail for ch in "/\\"):
+        dataset, project_id = head, tail
+    name = os.path.splitext(os.path.basename(dataset))[0]
+    return {"label": f"{name}@{project_id}", "dataset": dataset, "project_id": str(project_id)}
+
+
+class RateLimiter:
+    """所有组合共享的请求速率限制：按固定间隔发放请求时间片，线程安全"""
+
+    def __init__(self, rate: Optional[float] = None):
+        """
+        Args:
+            rate: 每秒最多发出的请求数，None或0表示不限制
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None) -> float:
+        """
+        等待下一个请求时间片
+
+        Args:
+            cancel_event: 设置后立即结束等待
+
+        Returns:
+            float: 等待的秒数
+        """
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            self.waited += slot - now
+        wait = slot - now
+        if wait > 0:
+            if cancel_event is not None:
+                cancel_event.wait(wait)
+            else:
+                time.sleep(wait)
+        return wait
+
+
+def create_shared_session(pool_size: int, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """
+    创建各组合共享的HTTP会话（连接池容量为pool_size，同一服务的连接在组合之间复用）
+
+    Args:
+        pool_size: 每个主机保留的连接数，应不小于同时进行的请求数
+        headers: 默认请求头（与 CodeSearchAPIClient 的会话相同）
+
+    Returns:
+        requests.Session: 共享会话
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def summarize_target(target: Dict[str, Any], results: Dict[str, Any],
+                     relative_accuracy: float = 0.01) -> Dict[str, Any]:
+    """
+    一个组合的汇总行
+
+    Args:
+        target: parse_target 的返回值
+        results: 该组合 evaluate_dataset 的返回值
+        relative_accuracy: 延迟分位数的相对误差
+
+    Returns:
+        Dict: 汇总行（含该组合的延迟草图 "_sketch"，供计算整体分位数）
+    """
+    meta = results["meta"]
+    framework = results["summary_metrics"].get("new_framework_performance", {})
+    sketch = LatencySketch(relative_accuracy)
+    for result in results["detailed_results"]:
+        if result.get("elapsed_time") is not None:
+            sketch.add(result["elapsed_time"])
+    row = dict(target)
+    row.update({
+        "cases": meta["total_test_cases"],
+        "succeeded": meta["successful_evaluations"],
+        "failed": meta["failed_evaluations"],
+        "elapsed": meta["total_elapsed_time"]
+    })
+    for field in SCORE_FIELDS:
+        row[f"avg_{field}"] = framework.get(f"avg_{field}")
+    row["latency"] = sketch.summary()
+    row["_sketch"] = sketch
+    return row
+
+
+def consolidate(rows: List[Dict[str, Any]], relative_accuracy: float = 0.01) -> Dict[str, Any]:
+    """
+    汇总所有组合：平均分按成功案例数加权（等同于把所有成功案例放在一起平均），延迟分位数由各组合的草图合并计算
+
+    Args:
+        rows: summarize_target 的返回值
+        relative_accuracy: 延迟分位数的相对误差
+
+    Returns:
+        Dict: 整体的 cases / succeeded / failed / avg_* / latency
+    """
+    sketch = LatencySketch(relative_accuracy)
+    for row in rows:
+        sketch.merge(row["_sketch"])
+    succeeded = sum(row["succeeded"] for row in rows)
+    overall = {
+        "cases": sum(row["cases"] for row in rows),
+        "succeeded": succeeded,
+        "failed": sum(row["failed"] for row in rows)
+    }
+    for field in SCORE_FIELDS:
+        weighted = [(row[f"avg_{field}"], row["succeeded"]) for row in rows if row[f"avg_{field}"] is not None]
+        overall[f"avg_{field}"] = sum(value * count for value, count in weighted) / succeeded if succeeded else None
+    overall["latency"] = sketch.summary()
+    return overall
+
+
+class MultiTargetRunner:
+    """并行评估多个 数据集/project_id 组合"""
+
+    def __init__(self, config: Dict[str, Any], session: requests.Session, rate_limiter: RateLimiter,
+                 max_parallel: int = 4):
+        """
+        Args:
+            config: 评估器配置（各组合覆盖其中的 api.project_id）
+            session: 共享HTTP会话（create_shared_session）
+            rate_limiter: 共享请求速率限制
+            max_parallel: 同时评估的组合数
+        """
+        self.config = config
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.max_parallel = max_parallel
+        self.relative_accuracy = config["evaluation"].get("latency", {}).get("relative_accuracy", 0.01)
+        self.logger = logging.getLogger(__name__)
+
+    def _run_target(self, target: Dict[str, Any], test_cases: List[Dict],
+                    on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]]) -> Dict[str, Any]:
+        from evaluator import CodeSearchEvaluator
+
+        config = dict(self.config, api=dict(self.config["api"], project_id=target["project_id"]))
+        evaluator = CodeSearchEvaluator(config)
+        # 换成共享会话：连接在组合之间复用
+        evaluator.api_client.session.close()
+        evaluator.api_client.session = self.session
+        evaluator.set_rate_limiter(self.rate_limiter)
+        try:
+            results = evaluator.evaluate_dataset({"test_cases": test_cases})
+        finally:
+            evaluator.close()
+        results["meta"]["dataset"] = target["dataset"]
+        row = summarize_target(target, results, self.relative_accuracy)
+        self.logger.info(f"组合 {target['label']} 评估完成: {row['succeeded']}/{row['cases']} 个案例成功")
+        if on_result is not None:
+            on_result(row, results)
+        return row
+
+    def run(self, targets: List[Dict[str, Any]],
+            on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        评估所有组合
+
+        Args:
+            targets: parse_target 的返回值，另含 "test_cases"（已过滤的测试案例）
+            on_result: 每个组合完成时调用 on_result(汇总行, 完整评估结果)
+
+        Returns:
+            Dict: {"targets", "overall", "rate_limit_wait", "elapsed"}
+        """
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="target") as executor:
+            futures = [
+                executor.submit(self._run_target, {k: v for k, v in target.items() if k != "test_cases"},
+                                target["test_cases"], on_result)
+                for target in targets
+            ]
+            rows = [future.result() for future in futures]
+        overall = consolidate(rows, self.relative_accuracy)
+        for row in rows:
+            del row["_sketch"]
+        return {
+            "targets": rows,
+            "overall": overall,
+            "rate_limit_wait": self.rate_limiter.waited,
+            "elapsed": time.time() - start
+        }
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+流水线评估模块
+将单个案例的评估拆分为 请求(fetch) -> 评分(score) -> 写出(write) 三个阶段，
+阶段之间使用有界队列连接，各阶段并行执行
+"""
+
+import logging
+import queue
+import threading
+import time
+from functools import partial
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from utils.serializer import get_backend, to_plain
+from utils.tracing import NOOP_TRACER
+from utils.records import hit_count
+
+# 队列结束标记
+_STOP = object()
+
+# 取消评估后未请求案例的错误信息
+CANCELLED_ERROR = "评估已取消"
+
+
+def finish_case_trace(root, result: Dict[str, Any]) -> None:
+    """把案例结果记录到根span上并结束该案例的trace"""
+    root.set_attribute("success", result.get("success", False))
+    if result.get("success", False):
+        root.set_attribute("result_count", hit_count(result))
+        root.set_attribute("total_score", result.get("total_score", 0.0))
+    else:
+        root.set_error(result.get("error", ""))
+    root.end()
+
+
+class StageStats:
+    """单个阶段的运行统计：处理数量、忙碌时间、输入队列深度"""
+
+    def __init__(self, name: str, workers: int, input_queue: queue.Queue):
+        self.name = name
+        self.workers = workers
+        self.input_queue = input_queue
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def sample_depth(self) -> None:
+        """在每次从输入队列取出数据时记录队列深度"""
+        depth = self.input_queue.qsize()
+        with self._lock:
+            self.depth_samples += 1
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+
+    def add_busy(self, seconds: float) -> None:
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += seconds
+
+    def snapshot(self, wall_seconds: float) -> Dict[str, Any]:
+        """
+        获取统计快照
+
+        utilization = 忙碌时间 / (墙钟时间 * 工作线程数)，接近1说明该阶段是瓶颈
+        """
+        with self._lock:
+            capacity = wall_seconds * self.workers
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "busy_seconds": self.busy_seconds,
+                "utilization": self.busy_seconds / capacity if capacity > 0 else 0.0,
+                "queue_depth": self.input_queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "avg_queue_depth": self.depth_total / self.depth_samples if self.depth_samples else 0.0
+            }
+
+
+class EvaluationPipeline:
+    """
+    三阶段评估流水线
+
+    - fetch: 多个工作线程调用检索接口
+    - score: 单线程计算评估指标
+    - write: 单线程按输入顺序把完成的案例交给各个结果接收器（落盘、报告等）
+    """
+
+    def __init__(self,
+                 fetch_fn: Callable[[Dict], Tuple[Dict, float]],
+                 score_fn: Callable[[Dict, Dict, float], Dict],
+                 error_fn: Callable[[Dict, str, float], Dict],
+                 sinks: Optional[List[Callable[[Dict], None]]] = None,
+                 fetch_workers: int = 1,
+                 queue_size: int = 16,
+                 request_interval: float = 0.0,
+                 thread_wrapper: Optional[Callable[[Callable], Callable]] = None,
+                 tracer=None,
+                 trace_attributes: Optional[Callable[[Dict], Dict]] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        """
+        初始化流水线
+
+        Args:
+            fetch_fn: 请求函数 case -> (api_response, 请求耗时)
+            score_fn: 评分函数 (case, api_response, 请求耗时) -> 案例结果
+            error_fn: 出错时构造结果的函数 (case, 错误信息, 耗时) -> 案例结果
+            sinks: 结果接收器列表，按输入顺序逐个接收完成的案例结果
+            fetch_workers: 请求工作线程数
+            queue_size: 各阶段输入队列的容量
+            request_interval: 每个请求线程两次请求之间的间隔（秒）
+            thread_wrapper: 可选的线程函数包装器（例如性能剖析时为每个线程启用cProfile）
+            tracer: 链路追踪器，每个案例生成一条trace，记录各阶段的排队等待和处理过程
+            trace_attributes: 案例 -> 根span属性
+            cancel_event: 设置后不再发出新请求，尚未请求的案例直接以“评估已取消”失败
+        """
+        self.fetch_fn = fetch_fn
+        self.score_fn = score_fn
+        self.error_fn = error_fn
+        self.sinks = sinks or []
+        self.fetch_workers = max(1, fetch_workers)
+        self.request_interval = request_interval
+        self.thread_wrapper = thread_wrapper or (lambda target: target)
+        self.tracer = tracer or NOOP_TRACER
+        self.trace_attributes = trace_attributes or (lambda case: {})
+        self.cancel_event = cancel_event or threading.Event()
+        self.logger = logging.getLogger(__name__)
+
+        self.fetch_queue = queue.Queue(maxsize=queue_size)
+        self.score_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+
+        self.stages = {
+            "fetch": StageStats("fetch", self.fetch_workers, self.fetch_queue),
+            "score": StageStats("score", 1, self.score_queue),
+            "write": StageStats("write", 1, self.write_queue)
+        }
+        self._start_time = None
+        self._end_time = None
+        self._results = []
+        self._total = 0
+        # 阶段工作线程中未处理的异常 [(阶段, 错误信息)]，出现时 run() 抛出 RuntimeError
+        self.errors = []
+        self._abort = threading.Event()
+
+    def run(self, test_cases: List[Dict]) -> List[Dict]:
+        """
+        运行流水线
+
+        Args:
+            test_cases: 测试案例列表
+
+        Returns:
+            List[Dict]: 按输入顺序排列的案例结果
+
+        Raises:
+            RuntimeError: 某个阶段的工作线程出现未处理的异常（其余案例不再处理）
+        """
+        self._total = len(test_cases)
+        self._results = [None] * self._total
+        self._start_time = time.time()
+        self._end_time = None
+        self.errors = []
+        self._abort.clear()
+
+        wrap = self.thread_wrapper
+        # 每个请求线程结束时向评分队列发送一个结束标记，评分线程收齐后向写出队列发送结束标记
+        fetch_threads = [
+            threading.Thread(
+                target=wrap(partial(self._run_stage, "fetch", self._fetch_worker, self.fetch_queue, 1, self.score_queue)),
+                name=f"eval-fetch-{i}", daemon=True
+            )
+            for i in range(self.fetch_workers)
+        ]
+        score_thread = threading.Thread(
+            target=wrap(partial(self._run_stage, "score", self._score_worker, self.score_queue,
+                                self.fetch_workers, self.write_queue)),
+            name="eval-score", daemon=True
+        )
+        write_thread = threading.Thread(
+            target=wrap(partial(self._run_stage, "write", self._write_worker, self.write_queue, 1, None)),
+            name="eval-write", daemon=True
+        )
+        threads = fetch_threads + [score_thread, write_thread]
+        for thread in threads:
+            thread.start()
+
+        # 队列有界：请求线程跟不上时这里会阻塞，避免一次性堆积所有案例
+        for i, case in enumerate(test_cases):
+            # 案例的根span随案例在各阶段之间传递，各阶段的span都挂在它下面
+            root = self.tracer.start_span("evaluate_case", self.trace_attributes(case), new_trace=True)
+            self.fetch_queue.put((i, case, root, time.time_ns()))
+        for _ in fetch_threads:
+            self.fetch_queue.put(_STOP)
+
+        for thread in threads:
+            thread.join()
+
+        self._end_time = time.time()
+        if self.errors:
+            raise RuntimeError("评估流水线异常: " + "; ".join(f"{stage}阶段 {error}" for stage, error in self.errors))
+        return self._results
+
+    def _run_stage(self, name: str, worker: Callable[[Dict[str, int]], None], input_queue: queue.Queue,
+                   stops: int, output_queue: Optional[queue.Queue]) -> None:
+        """
+        运行一个阶段的工作线程
+
+        worker 收到 stops 个结束标记后返回；worker 抛出异常时记录错误并通知其他阶段停止，
+        继续取出输入队列直到收到全部结束标记（上游阶段不会因队列已满而阻塞），
+        无论是否出错都向下游发送结束标记（下游阶段不会一直等待）
+        """
+        state = {"stops": stops}
+        try:
+            worker(state)
+        except BaseException as e:
+            self.logger.error(f"流水线{name}阶段异常: {type(e).__name__}: {e}")
+            self.errors.append((name, f"{type(e).__name__}: {e}"))
+            self._abort.set()
+            while state["stops"]:
+                if input_queue.get() is _STOP:
+                    state["stops"] -= 1
+        finally:
+            if output_queue is not None:
+                output_queue.put(_STOP)
+
+    def _next_item(self, input_queue: queue.Queue, stats: StageStats, state: Dict[str, int]):
+        """从输入队列取出下一项，收齐结束标记时返回 _STOP"""
+        while True:
+            stats.sample_depth()
+            item = input_queue.get()
+            if item is not _STOP:
+                return item
+            state["stops"] -= 1
+            if not state["stops"]:
+                return _STOP
+
+    def _fetch_worker(self, state: Dict[str, int]) -> None:
+        stats = self.stages["fetch"]
+        last_request_end = None
+        while True:
+            item = self._next_item(self.fetch_queue, stats, state)
+            if item is _STOP:
+                return
+            i, case, root, enqueued_ns = item
+            self.tracer.record_span("queue.fetch", enqueued_ns, time.time_ns(), root)
+
+            if self.cancel_event.is_set() or self._abort.is_set():
+                # 已取消：不等待、不请求，直接交给评分阶段构造失败结果
+                self.score_queue.put((i, case, None, 0.0, CANCELLED_ERROR, root, time.time_ns()))
+                continue
+
+            with self.tracer.activate(root):
+                # 控制请求频率：同一线程两次请求之间至少间隔request_interval
+                if last_request_end is not None and self.request_interval > 0:
+                    wait = self.request_interval - (time.time() - last_request_end)
+                    if wait > 0:
+                        with self.tracer.span("rate_limit.wait"):
+                            # 取消时立即结束等待
+                            self.cancel_event.wait(wait)
+
+                start = time.time()
+                try:
+                    with self.tracer.span("fetch"):
+                        api_response, fetch_elapsed = self.fetch_fn(case)
+                    payload = (i, case, api_response, fetch_elapsed, None, root)
+                except Exception as e:
+                    payload = (i, case, None, time.time() - start, str(e), root)
+                last_request_end = time.time()
+            stats.add_busy(last_request_end - start)
+            self.score_queue.put(payload + (time.time_ns(),))
+
+    def _score_worker(self, state: Dict[str, int]) -> None:
+        stats = self.stages["score"]
+        while True:
+            item = self._next_item(self.score_queue, stats, state)
+            if item is _STOP:
+                return
+            i, case, api_response, fetch_elapsed, error, root, enqueued_ns = item
+            self.tracer.record_span("queue.score", enqueued_ns, time.time_ns(), root)
+            start = time.time()
+            with self.tracer.activate(root), self.tracer.span("score"):
+                if error is not None:
+                    result = self.error_fn(case, error, fetch_elapsed)
+                else:
+                    try:
+                        result = self.score_fn(case, api_response, fetch_elapsed)
+                    except Exception as e:
+                        self.logger.error(f"评估测试案例失败 {case.get('idx')}: {e}")
+                        result = self.error_fn(case, str(e), fetch_elapsed + time.time() - start)
+            stats.add_busy(time.time() - start)
+            self.write_queue.put((i, result, root, time.time_ns()))
+
+    def _write_worker(self, state: Dict[str, int]) -> None:
+        stats = self.stages["write"]
+        # 结果完成顺序可能与输入顺序不同，按输入顺序交给接收器
+        pending = {}
+        next_index = 0
+        while True:
+            item = self._next_item(self.write_queue, stats, state)
+            if item is _STOP:
+                return
+            i, result, root, enqueued_ns = item
+            received_ns = time.time_ns()
+            self.tracer.record_span("queue.write", enqueued_ns, received_ns, root)
+            pending[i] = (result, root, received_ns)
+            start = time.time()
+            while next_index in pending:
+                ready, ready_root, ready_received_ns = pending.pop(next_index)
+                # 等待前面的案例完成（按输入顺序写出）
+                self.tracer.record_span("reorder.wait", ready_received_ns, time.time_ns(), ready_root)
+                self._results[next_index] = ready
+                with self.tracer.activate(ready_root), self.tracer.span("persist", {"sinks": len(self.sinks)}):
+                    for sink in self.sinks:
+                        try:
+                            sink(ready)
+                        except Exception as e:
+                            self.logger.error(f"结果接收器处理失败: {e}")
+                finish_case_trace(ready_root, ready)
+                next_index += 1
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("进度: %d/%d | %s", next_index, self._total, self.format_queue_depths())
+            stats.add_busy(time.time() - start)
+
+    def format_queue_depths(self) -> str:
+        """当前各阶段输入队列深度，用于进度日志"""
+        return ", ".join(f"{name}队列={stage.input_queue.qsize()}" for name, stage in self.stages.items())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取各阶段统计
+
+        Returns:
+            Dict: {"wall_seconds", "stages": {stage: {...}}, "bottleneck", "errors"}
+        """
+        end_time = self._end_time or time.time()
+        wall = end_time - self._start_time if self._start_time else 0.0
+        stages = {name: stage.snapshot(wall) for name, stage in self.stages.items()}
+        bottleneck = max(stages, key=lambda name: stages[name]["utilization"]) if stages else None
+        return {
+            "wall_seconds": wall,
+            "stages": stages,
+            "bottleneck": bottleneck,
+            "errors": list(self.errors)
+        }
+
+
+class JsonlResultWriter:
+    """结果接收器：每完成一个案例就以JSON Lines格式追加写入文件"""
+
+    def __init__(self, path: str, backend: str = "auto"):
+        self.path = path
+        self.encoder = get_backend(backend, indent=None)
+        self.file = open(path, "wb")
+
+    def __call__(self, result: Dict[str, Any]) -> None:
+        self.file.write(self.encoder.dumps(to_plain(result)) + b"\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
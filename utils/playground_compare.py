@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Playground 对比模块
+同一个查询并行请求多个 method / rank_method 组合（经检索API代理，受并发上限限制），
+每个组合完成后立即返回其延迟、与已完成组合的结果重合度，
+查询与数据集中的案例相同时还返回按评估框架计算的分数
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from utils.metrics import EvaluationMetrics
+from utils.result_diff import rank_biased_overlap
+
+
+class DatasetIndex:
+    """按查询文本查找数据集案例；数据集文件修改后自动重新加载"""
+
+    def __init__(self, dataset_path: str):
+        """
+        Args:
+            dataset_path: 测试数据集路径
+        """
+        self.dataset_path = dataset_path
+        self._cases = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query: str) -> str:
+        # 忽略首尾空白、连续空白和大小写差异
+        return " ".join(str(query).split()).lower()
+
+    def _reload(self) -> None:
+        try:
+            stat = os.stat(self.dataset_path)
+        except OSError:
+            self._cases, self._stamp = {}, None
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        with open(self.dataset_path, "r", encoding="utf-8") as f:
+            dataset = json.load(f)
+        cases = {}
+        for case in dataset.get("test_cases", []):
+            cases.setdefault(self._key(case.get("query", "")), case)
+        self._cases, self._stamp = cases, stamp
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        查找查询文本相同的案例
+
+        Returns:
+            Optional[Dict]: 数据集案例（含expected_results），没有时为None
+        """
+        with self._lock:
+            self._reload()
+            return self._cases.get(self._key(query))
+
+
+class CompareRunner:
+    """并行执行多个检索组合并逐个返回结果"""
+
+    def __init__(self, proxy, dataset: Optional[DatasetIndex] = None, max_workers: int = 4,
+                 max_combos: int = 16, evaluation_config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            proxy: utils.playground_server.SearchProxy（组合请求同样经过缓存和请求合并）
+            dataset: 数据集索引，为None时不计算评估分数
+            max_workers: 所有对比请求共享的并发上限，保护检索服务
+            max_combos: 单次对比最多的组合数
+            evaluation_config: EVALUATION_CONFIG
+        """
+        self.proxy = proxy
+        self.dataset = dataset
+        self.max_combos = max_combos
+        self.metrics = EvaluationMetrics(evaluation_config or {})
+        self._normalize = self.metrics._normalize_path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="playground-compare")
+
+    def combos(self, body: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        解析请求中的组合：combos=[{"method", "rank_method"}]，或 methods × rank_methods
+
+        Raises:
+            ValueError: 没有组合或组合过多
+        """
+        if body.get("combos"):
+            pairs = [(str(c.get("method", "")), str(c.get("rank_method", ""))) for c in body["combos"]]
+        else:
+            pairs = [(str(m), str(r)) for m in body.get("methods") or [] for r in body.get("rank_methods") or []]
+        pairs = [pair for pair in dict.fromkeys(pairs) if all(pair)]
+        if not pairs:
+            raise ValueError("至少需要选择一个 method / rank_method 组合")
+        if len(pairs) > self.max_combos:
+            raise ValueError(f"组合数 {len(pairs)} 超过上限 {self.max_combos}")
+        return pairs
+
+    def _search(self, body: Dict[str, Any], method: str, rank_method: str) -> Dict[str, Any]:
+        """执行一个组合（在线程池中运行）"""
+        start = time.perf_counter()
+        status, data, cache_state = self.proxy.search(dict(body, method=method, rank_method=rank_method))
+        latency = time.perf_counter() - start
+        try:
+            payload = json.loads(data) if data else {}
+        except ValueError:
+            payload = {}
+        error = None
+        if status != 200:
+            error = payload.get("error") if isinstance(payload, dict) else None
+            error = error or f"HTTP {status}"
+        elif "error" in payload:
+            error = payload["error"]
+        return {
+            "method": method,
+            "rank_method": rank_method,
+            "status": status,
+            "latency_ms": latency * 1000,
+            "cache": cache_state,
+            "error": error,
+            "results": [] if error else payload.get("results", [])
+        }
+
+    def run(self, body: Dict[str, Any], emit: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        执行对比，每个事件完成时调用emit
+
+        事件依次为 {"type": "start"}、每个组合完成时的 {"type": "result"}、最后的 {"type": "done"}；
+        emit抛出异常（客户端断开）时取消尚未开始的组合
+
+        Args:
+            body: {"q", "limit", "project_id", "combos" 或 "methods" + "rank_methods"}
+            emit: 事件回调
+        """
+        pairs = self.combos(body)
+        case = self.dataset.lookup(body.get("q", "")) if self.dataset is not None else None
+        start = time.perf_counter()
+        emit({
+            "type": "start",
+            "combos": [{"method": m, "rank_method": r} for m, r in pairs],
+            "case": {
+                "idx": case.get("idx"),
+                "category": case.get("category", "unknown"),
+                "expected_results": [item.get("path", "") for item in case.get("expected_results", [])]
+            } if case else None
+        })
+
+        expected = set()
+        if case:
+            expected = {self._normalize(item.get("path", "")) for item in case.get("expected_results", [])}
+        futures = [self._executor.submit(self._search, body, m, r) for m, r in pairs]
+        finished = []  # (组合标识, 规范化路径列表)
+        best = None
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                label = f"{result['method']}/{result['rank_method']}"
+                ranking = [self._normalize(hit.get("path", "")) for hit in result["results"]]
+                if result["error"] is None:
+                    # 与已完成组合的重合度：集合Jaccard和考虑排序的RBO
+                    overlap = {}
+                    for other_label, other in finished:
+                        union = set(ranking) | set(other)
+                        overlap[other_label] = {
+                            "jaccard": len(set(ranking) & set(other)) / len(union) if union else 1.0,
+                            "rbo": rank_biased_overlap(ranking, other)
+                        }
+                    result["overlap"] = overlap
+                    finished.append((label, ranking))
+                    if case:
+                        metrics = self.metrics.calculate_new_framework_metrics(
+                            actual_results=result["results"], expected_results=case["expected_results"]
+                        )
+                        result["metrics"] = {key: value for key, value in metrics.items() if key != "details"}
+                        if best is None or metrics["total_score"] > best[1]:
+                            best = (label, metrics["total_score"])
+                result["type"] = "result"
+                result["label"] = label
+                # expected 标记命中数据集期望结果的路径（与评分使用相同的路径规范化）
+                result["results"] = [
+                    {"path": hit.get("path", ""), "score": hit.get("score"), "expected": path in expected}
+                    for hit, path in zip(result["results"], ranking)
+                ]
+                emit(result)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+        emit({
+            "type": "done",
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+            "best": {"label": best[0], "total_score": best[1]} if best else None
+        })
+
+    def close(self) -> None:
+        """停止线程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+"""
+Playground 服务模块
+多线程HTTP服务：提供playground静态页面（gzip压缩、ETag协商缓存），
+并代理检索API的搜索请求：相同参数的响应在内存LRU缓存中复用，
+同时进行中的相同搜索只向检索服务发出一次请求，多人共用一个playground时不会压垮检索服务；
+配置了源码目录时，代码查看器通过 /api/file 读取检索结果对应的真实文件内容；
+/api/compare 并行执行多个检索组合，以JSON行流的形式逐个返回对比结果；
+/api/eval/* 在后台运行数据集评估，通过SSE实时推送每个案例的结果和滚动统计
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import urlsplit, unquote, parse_qs
+
+from utils.live_evaluation import EvaluationJobManager
+from utils.playground_compare import CompareRunner
+from utils.server_common import RequestCoalescer, resolve_under
+from utils.source_files import SourceFileCache, BinaryFileError
+
+# 转发给检索API的请求字段
+SEARCH_FIELDS = ("q", "limit", "project_id", "method", "rank_method")
+
+# 值得gzip压缩的静态文件类型
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+# 单个字节范围：bytes=起始-结束、bytes=起始- 或 bytes=-后缀长度
+_BYTE_RANGE = re.compile(r"bytes=\s*(\d*)\s*-\s*(\d*)\s*", re.ASCII)
+
+
+def parse_byte_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析Range请求头中的单个字节范围
+
+    Args:
+        value: Range请求头
+        size: 文件字节数
+
+    Returns:
+        Optional[Tuple]: (起始偏移, 结束偏移（含）)，起始偏移不小于size时范围无法满足；
+        不是单个合法的字节范围（格式错误、多个范围、结束位置小于起始位置）时返回None，应忽略Range返回完整内容
+    """
+    match = _BYTE_RANGE.fullmatch(value)
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        offset = int(first)
+        if last and int(last) < offset:
+            return None
+        return offset, min(int(last), size - 1) if last else size - 1
+    if not last:
+        return None
+    # bytes=-N：最后N个字节
+    return max(0, size - int(last)), size - 1
+
+
+
+class ResponseCache:
+    """带过期时间的LRU响应缓存（线程安全）"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300):
+        """
+        Args:
+            max_entries: 最多缓存的响应数，0表示不缓存
+            ttl: 缓存有效期（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取未过期的缓存响应，命中时移到最近使用的位置"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: bytes) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的响应"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SearchProxy:
+    """检索API代理：LRU缓存 + 请求合并，上游连接按线程复用"""
+
+    def __init__(self, api_config: Dict[str, Any], cache_size: int = 256, cache_ttl: float = 300,
+                 timeout: Optional[float] = None):
+        """
+        Args:
+            api_config: API_CONFIG（上游地址、端点和默认搜索参数）
+            cache_size: 缓存的响应数
+            cache_ttl: 缓存有效期（秒）
+            timeout: 上游请求超时（秒），默认使用 api_config["timeout"]
+        """
+        self.api_url = f"{api_config['base_url']}{api_config['endpoint']}"
+        self.defaults = {
+            "limit": api_config.get("limit", 10),
+            "project_id": api_config.get("project_id"),
+            "method": api_config.get("method"),
+            "rank_method": api_config.get("rank_method")
+        }
+        self.timeout = timeout if timeout is not None else api_config.get("timeout", 30)
+        self.cache = ResponseCache(cache_size, cache_ttl)
+        self.coalescer = RequestCoalescer()
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _session(self):
+        # requests.Session 不保证线程安全，每个处理线程使用自己的会话（各自保持长连接）
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+            session = self._local.session = requests.Session()
+            session.headers.update({
+                "Content-Type": "application/json",
+                "User-Agent": "CodeSearchPlayground/1.0"
+            })
+        return session
+
+    def normalize(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """只保留检索API的字段，缺省值用配置补齐"""
+        params = dict(self.defaults)
+        params.update({field: body[field] for field in SEARCH_FIELDS if body.get(field) is not None})
+        return params
+
+    def _fetch(self, params: Dict[str, Any]) -> Tuple[int, bytes]:
+        with self._counter_lock:
+            self.upstream_requests += 1
+        try:
+            response = self._session().post(self.api_url, json=params, timeout=self.timeout)
+            return response.status_code, response.content
+        except Exception as e:
+            with self._counter_lock:
+                self.upstream_errors += 1
+            self.logger.warning(f"检索API请求失败: {e}")
+            return 502, json.dumps({"error": f"检索API请求失败: {e}"}, ensure_ascii=False).encode("utf-8")
+
+    def search(self, body: Dict[str, Any], use_cache: bool = True) -> Tuple[int, bytes, str]:
+        """
+        执行（或复用）一次搜索
+
+        Args:
+            body: 浏览器提交的搜索参数
+            use_cache: 是否读取缓存（浏览器发送 Cache-Control: no-cache 时为False，结果仍会写入缓存）
+
+        Returns:
+            Tuple: (HTTP状态码, 响应体, 缓存状态 HIT / MISS / COALESCED / BYPASS)
+        """
+        params = self.normalize(body)
+        key = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return 200, cached, "HIT"
+
+        def fetch():
+            status, data = self._fetch(params)
+            if status == 200:
+                self.cache.put(key, data)
+            return status, data
+
+        (status, data), shared = self.coalescer.run(key, fetch)
+        return status, data, "COALESCED" if shared else ("MISS" if use_cache else "BYPASS")
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存和上游请求统计"""
+        lookups = self.cache.hits + self.cache.misses
+        return {
+            "upstream": self.api_url,
+            "cache_entries": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "cache_hit_rate": self.cache.hits / lookups if lookups else None,
+            "coalesced": self.coalescer.coalesced,
+            "in_flight": self.coalescer.in_flight,
+            "upstream_requests": self.upstream_requests,
+            "upstream_errors": self.upstream_errors
+        }
+
+
+class StaticAsset:
+    """预先计算好ETag和gzip版本的静态文件"""
+
+    __slots__ = ("data", "gzipped", "etag", "content_type", "last_modified", "stamp")
+
+    def __init__(self, data: bytes, content_type: str, mtime: float, stamp: Tuple[int, int],
+                 gzip_min_size: int):
+        self.data = data
+        self.content_type = content_type
+        self.etag = f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.stamp = stamp
+        compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+        self.gzipped = gzip.compress(data, 6) if compressible and len(data) >= gzip_min_size else None
+
+
+class StaticFiles:
+    """静态文件缓存：文件修改时间或大小变化时重新读取"""
+
+    def __init__(self, root: str, gzip_min_size: int = 1024):
+        """
+        Args:
+            root: 静态文件根目录
+            gzip_min_size: 小于该字节数的文件不压缩
+        """
+        self.root = root
+        self.gzip_min_size = gzip_min_size
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, request_path: str) -> Optional[StaticAsset]:
+        """
+        按请求路径获取静态文件
+
+        Returns:
+            Optional[StaticAsset]: 文件不存在或路径越出根目录时为None
+        """
+        path = resolve_under(self.root, request_path)
+        if path is None or not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        asset = self._assets.get(path)
+        if asset is not None and asset.stamp == stamp:
+            return asset
+        with open(path, "rb") as f:
+            data = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        asset = StaticAsset(data, content_type, stat.st_mtime, stamp, self.gzip_min_size)
+        with self._lock:
+            self._assets[path] = asset
+        return asset
+
+
+class PlaygroundHandler(BaseHTTPRequestHandler):
+    """playground请求处理：静态页面、/api/search 代理、/api/compare 组合对比、/api/eval 实时评估、/api/file 文件内容和 /api/proxy/stats 统计"""
+
+    # 保持长连接，页面和随后的搜索请求复用同一个TCP连接
+    protocol_version = "HTTP/1.1"
+    server_version = "CodeSearchPlayground/1.0"
+
+    def end_headers(self):
+        # 只对配置的来源返回跨域响应头，其他网页不能读取 /api/file 等接口的响应
+        origin = self._cross_origin()
+        if origin and self._origin_allowed(origin):
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+            self.send_header("Access-Control-Allow-Headers", "Content-Type, Cache-Control")
+            self.send_header("Vary", "Origin")
+        super().end_headers()
+
+    def _cross_origin(self) -> Optional[str]:
+        """跨域请求的来源（Origin与Host不同），同源请求或没有Origin头时为None"""
+        headers = getattr(self, "headers", None)
+        origin = headers.get("Origin") if headers is not None else None
+        if not origin or urlsplit(origin).netloc == headers.get("Host", ""):
+            return None
+        return origin
+
+    def _origin_allowed(self, origin: str) -> bool:
+        """跨域来源是否允许访问当前路径：/api/eval/* 会启动评估并写结果文件，只允许同源请求"""
+        if urlsplit(self.path).path.startswith("/api/eval/"):
+            return False
+        return origin in self.server.cors_origins
+
+    def _reject_cross_origin(self) -> bool:
+        """
+        拒绝未允许来源的跨域 /api/* 请求
+
+        不带跨域响应头时浏览器不让其他网页读取响应，但简单请求（例如表单POST）仍会执行，
+        因此直接返回403，不执行请求
+        """
+        origin = self._cross_origin()
+        if origin is None or self._origin_allowed(origin):
+            return False
+        self._send_json(403, {"error": f"不允许来自 {origin} 的跨域请求"})
+        return True
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Any, headers: Dict[str, str] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", headers)
+
+    def do_OPTIONS(self):
+        # 处理预检请求（只有配置的来源会得到跨域响应头）
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        # 先读完请求体，长连接上的下一个请求才不会错位
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length > 0 else b""
+        path = urlsplit(self.path).path
+        if self._reject_cross_origin():
+            return
+        if path not in ("/api/search", "/api/compare", "/api/eval/start", "/api/eval/cancel"):
+            self._send_json(404, {"error": f"未知接口: {path}"})
+            return
+        try:
+            body = json.loads(raw or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("请求体应为JSON对象")
+            if path.startswith("/api/eval/"):
+                self._handle_evaluation(path, body)
+                return
+            if not str(body.get("q") or "").strip():
+                raise ValueError("缺少查询参数 q")
+            if path == "/api/compare":
+                self.server.compare.combos(body)
+        except ValueError as e:
+            self._send_json(400, {"error": f"请求格式错误: {e}"})
+            return
+
+        if path == "/api/compare":
+            self._send_compare(body)
+            return
+
+        use_cache = "no-cache" not in self.headers.get("Cache-Control", "")
+        status, data, cache_state = self.server.proxy.search(body, use_cache)
+        self._send(status, data, "application/json; charset=utf-8", {"X-Cache": cache_state})
+
+    def _handle_evaluation(self, path: str, body: Dict[str, Any]) -> None:
+        """/api/eval/start 开始实时评估，/api/eval/cancel 取消"""
+        evaluations = self.server.evaluations
+        if evaluations is None:
+            self._send_json(404, {"error": "未启用实时评估（启动 start_playground.py 时加 --live-eval）"})
+            return
+        if path == "/api/eval/start":
+            try:
+                job = evaluations.start(body)
+            except RuntimeError as e:
+                self._send_json(409, {"error": str(e)})
+                return
+            self._send_json(202, job.info())
+            return
+        job = evaluations.get(str(body.get("job_id", "")))
+        if job is None:
+            self._send_json(404, {"error": f"评估任务不存在: {body.get('job_id')}"})
+            return
+        job.cancel()
+        self._send_json(200, {"job_id": job.job_id, "status": job.status})
+
+    def _send_evaluation_events(self, query: Dict[str, list]) -> None:
+        """
+        /api/eval/events?job=...：以SSE推送评估事件（start / case / done / error），
+        从 Last-Event-ID 之后开始，空闲时定期发送注释行保持连接
+        """
+        evaluations = self.server.evaluations
+        job = evaluations.get((query.get("job") or [""])[0]) if evaluations is not None else None
+        if job is None:
+            self._send_json(404, {"error": "评估任务不存在"})
+            return
+        try:
+            last_id = int(self.headers.get("Last-Event-ID") or (query.get("after") or ["-1"])[0])
+        except ValueError:
+            last_id = -1
+
+        self._start_stream("text/event-stream; charset=utf-8")
+        # 断线重连的等待时间（毫秒）
+        self._write_chunk(b"retry: 2000\n\n")
+        while True:
+            events, last_id, finished = job.wait_events(last_id, self.server.sse_keepalive)
+            if events:
+                # 积压的多个事件合并为一个分块写出
+                self._write_chunk(b"".join(events))
+            elif finished:
+                break
+            else:
+                self._write_chunk(b": keepalive\n\n")
+        self._end_stream()
+
+    def _start_stream(self, content_type: str) -> None:
+        """开始分块传输的流式响应"""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-store")
+        # 经反向代理访问时不缓冲，事件立即到达浏览器
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes) -> None:
+        if data:
+            self.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_compare(self, body: Dict[str, Any]) -> None:
+        """/api/compare：每个组合完成时输出一行JSON（application/x-ndjson）"""
+        def emit(event):
+            self._write_chunk(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        self._start_stream("application/x-ndjson; charset=utf-8")
+        try:
+            self.server.compare.run(body, emit)
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # 响应头已经发出，错误作为最后一个事件返回
+            emit({"type": "error", "error": str(e)})
+        self._end_stream()
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path)
+        if path.startswith("/api/") and self._reject_cross_origin():
+            return
+        if path == "/api/proxy/stats":
+            stats = self.server.proxy.stats()
+            if self.server.sources is not None:
+                stats["files"] = self.server.sources.stats()
+            self._send_json(200, stats, {"Cache-Control": "no-store"})
+            return
+        if path == "/api/file":
+            self._send_file_content(parse_qs(urlsplit(self.path).query))
+            return
+        if path == "/api/eval/events":
+            self._send_evaluation_events(parse_qs(urlsplit(self.path).query))
+            return
+        if path == "/api/eval/status":
+            job = self.server.evaluations.latest if self.server.evaluations is not None else None
+            self._send_json(200, job.info() if job else None, {"Cache-Control": "no-store"})
+            return
+        if path == "/":
+            self.send_response(302)
+            self.send_header("Location", "/playground.html")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        asset = self.server.static.get(path)
+        if asset is None:
+            self._send_json(404, {"error": f"文件不存在: {path}"})
+            return
+        headers = {"ETag": asset.etag, "Last-Modified": asset.last_modified, "Cache-Control": "no-cache"}
+        if asset.gzipped is not None:
+            headers["Vary"] = "Accept-Encoding"
+        # 浏览器每次都会携带ETag校验，文件未变化时只返回304
+        if asset.etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        if asset.gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            self._send(200, asset.gzipped, asset.content_type, headers)
+        else:
+            self._send(200, asset.data, asset.content_type, headers)
+
+    do_HEAD = do_GET
+
+    def _send_file_content(self, query: Dict[str, list]) -> None:
+        """
+        /api/file?path=...&start=1&end=500：按行范围返回JSON；
+        /api/file?path=...&raw=1：返回原始文本，支持 Range: bytes=... 按字节范围读取
+        """
+        sources = self.server.sources
+        if sources is None:
+            self._send_json(404, {"error": "未配置源码目录（PLAYGROUND_CONFIG.source_root 或 --source-root）"})
+            return
+        relative_path = (query.get("path") or [""])[0]
+        try:
+            if not relative_path:
+                raise ValueError("缺少参数 path")
+            if (query.get("raw") or ["0"])[0] not in ("0", ""):
+                self._send_raw_file(sources.open(relative_path))
+                return
+            start = int((query.get("start") or ["1"])[0])
+            end = int(query["end"][0]) if query.get("end") else None
+            payload = sources.read_lines(relative_path, start, end, self.server.file_page_lines)
+        except PermissionError as e:
+            self._send_json(403, {"error": str(e)})
+            return
+        except FileNotFoundError as e:
+            self._send_json(404, {"error": str(e)})
+            return
+        except BinaryFileError as e:
+            self._send_json(415, {"error": str(e)})
+            return
+        except ValueError as e:
+            self._send_json(400, {"error": f"请求格式错误: {e}"})
+            return
+        self._send_json(200, payload, {"Cache-Control": "no-cache"})
+
+    def _send_raw_file(self, source) -> None:
+        """返回原始文件内容（单个字节范围时返回206，无法解析的Range忽略）"""
+        headers = {"Accept-Ranges": "bytes", "Cache-Control": "no-cache"}
+        content_type = "text/plain; charset=utf-8"
+        byte_range = parse_byte_range(self.headers.get("Range", ""), source.size)
+        if byte_range is None:
+            self._send(200, source.byte_range(0, source.size), content_type, headers)
+            return
+        offset, stop = byte_range
+        if offset >= source.size:
+            headers["Content-Range"] = f"bytes */{source.size}"
+            self._send(416, b"", content_type, headers)
+            return
+        headers["Content-Range"] = f"bytes {offset}-{stop}/{source.size}"
+        self._send(206, source.byte_range(offset, stop - offset + 1), content_type, headers)
+
+    def log_message(self, format, *args):
+        # 自定义日志格式
+        print(f"🌐 {self.address_string()} - {format % args}")
+
+
+class PlaygroundServer(ThreadingHTTPServer):
+    """每个连接一个线程的playground服务器，一个慢客户端不会阻塞其他人"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], root: str, proxy: SearchProxy, gzip_min_size: int = 1024,
+                 sources: Optional[SourceFileCache] = None, file_page_lines: int = 500,
+                 compare: Optional[CompareRunner] = None, evaluations: Optional[EvaluationJobManager] = None,
+                 sse_keepalive: float = 15.0, cors_origins: Optional[List[str]] = None):
+        """
+        Args:
+            address: 监听的 (地址, 端口)
+            root: 静态文件根目录
+            proxy: 检索API代理
+            gzip_min_size: 静态文件压缩的最小字节数
+            sources: 被检索项目的源码文件缓存，为None时 /api/file 不可用
+            file_page_lines: /api/file 单次返回的最多行数
+            compare: 组合对比执行器，默认不关联数据集、并发上限为4
+            evaluations: 实时评估任务管理器，为None时 /api/eval/* 不可用
+            sse_keepalive: SSE连接空闲时发送保活注释的间隔（秒）
+            cors_origins: 允许跨域调用 /api/* 的来源，默认只允许同源请求
+        """
+        self.static = StaticFiles(root, gzip_min_size)
+        self.proxy = proxy
+        self.sources = sources
+        self.file_page_lines = file_page_lines
+        self.compare = compare or CompareRunner(proxy)
+        self.evaluations = evaluations
+        self.sse_keepalive = sse_keepalive
+        self.cors_origins = frozenset(cors_origins or ())
+        super().__init__(address, PlaygroundHandler)
+
+    def handle_error(self, request, client_address):
+        # 浏览器取消请求（关闭页面、刷新）时连接被对方关闭，不打印堆栈
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.compare.close()
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+分阶段性能剖析模块
+对评估流程的各个阶段分别使用 cProfile 统计函数耗时、tracemalloc 统计内存峰值，
+输出 pstats 文件、火焰图折叠栈文件（flamegraph.pl / speedscope 可直接读取）以及汇总表
+"""
+
+import contextlib
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Any, Optional
+
+# 折叠栈的最大深度，避免深层递归导致输出过大
+MAX_STACK_DEPTH = 64
+
+
+def _func_label(func) -> str:
+    """pstats函数键 (filename, lineno, name) -> 火焰图中的帧名"""
+    filename, lineno, name = func
+    if filename == "~":
+        # 内置函数，例如 <built-in method time.sleep>
+        return name
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def stats_to_folded(stats: pstats.Stats, min_microseconds: int = 1) -> List[str]:
+    """
+    将pstats统计转换为折叠栈格式（每行: 帧1;帧2;帧3 微秒数）
+
+    cProfile只记录调用者-被调用者之间的边而不记录完整调用栈，
+    这里从根函数出发沿调用边展开，按每条边的累计耗时占被调用函数总耗时的比例分配时间，
+    得到的是近似调用栈，但总时间与各函数自身耗时和pstats一致。
+
+    Args:
+        stats: pstats统计
+        min_microseconds: 低于该耗时的栈不输出
+
+    Returns:
+        List[str]: 折叠栈行
+    """
+    raw = stats.stats
+    callees = {func: [] for func in raw}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            if caller in callees:
+                callees[caller].append((func, edge[3]))
+
+    folded = {}
+
+    def walk(func, stack, scale):
+        _, _, self_time, cumulative, _ = raw[func]
+        own = int(self_time * scale * 1e6)
+        if own >= min_microseconds:
+            key = ";".join(stack)
+            folded[key] = folded.get(key, 0) + own
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_cumulative in callees[func]:
+            callee_cumulative = raw[callee][3]
+            label = _func_label(callee)
+            if label in stack or callee_cumulative <= 0:
+                continue
+            callee_scale = scale * edge_cumulative / callee_cumulative
+            if callee_cumulative * callee_scale * 1e6 >= min_microseconds:
+                walk(callee, stack + [label], callee_scale)
+
+    roots = [func for func, value in raw.items() if not value[4]]
+    for root in roots:
+        walk(root, [_func_label(root)], 1.0)
+
+    return [f"{stack} {value}" for stack, value in folded.items()]
+
+
+class StageProfiler:
+    """
+    分阶段剖析器
+
+    用法:
+        profiler = StageProfiler("reports/profile/20240101_120000")
+        with profiler.stage("evaluate"):
+            ...
+        profiler.write_summary()
+
+    未启用时 stage() 不做任何事情，可以无条件包住各阶段代码。
+    """
+
+    def __init__(self, output_dir: str, enabled: bool = True, top_n: int = 30):
+        """
+        初始化剖析器
+
+        Args:
+            output_dir: 输出目录
+            enabled: 是否启用
+            top_n: 文本报告中列出的函数/内存分配位置数量
+        """
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.top_n = top_n
+        self.logger = logging.getLogger(__name__)
+        self.stages = []
+        self._thread_profiles = []
+        self._lock = threading.Lock()
+        self._active = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        剖析一个阶段
+
+        Args:
+            name: 阶段名称（也用作输出文件名）
+        """
+        if not self.enabled:
+            yield self
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        memory_before, _ = tracemalloc.get_traced_memory()
+
+        profile = cProfile.Profile()
+        self._thread_profiles = []
+        self._active = True
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield self
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            self._active = False
+            memory_after, memory_peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+            self._record_stage(name, profile, elapsed, memory_before, memory_after, memory_peak, snapshot)
+
+    def wrap_thread(self, target: Callable[[], None]) -> Callable[[], None]:
+        """
+        包装阶段内启动的工作线程函数，使线程中的调用也计入当前阶段
+
+        cProfile只剖析调用enable()的线程，流水线的请求/评分/写出线程需要各自的Profile，
+        在阶段结束时合并到该阶段的统计中。
+
+        Args:
+            target: 线程函数
+
+        Returns:
+            包装后的线程函数
+        """
+        if not self.enabled:
+            return target
+
+        def run():
+            if not self._active:
+                return target()
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ 同一时间只允许一个剖析器，主线程的剖析器已覆盖所有线程
+                return target()
+            try:
+                return target()
+            finally:
+                profile.disable()
+                with self._lock:
+                    self._thread_profiles.append(profile)
+
+        return run
+
+    def _record_stage(self, name: str, profile: cProfile.Profile, elapsed: float,
+                      memory_before: int, memory_after: int, memory_peak: int,
+                      snapshot: tracemalloc.Snapshot) -> None:
+        """合并线程统计，写出该阶段的剖析文件并记录汇总数据"""
+        prefix = os.path.join(self.output_dir, f"{len(self.stages) + 1:02d}_{name}")
+
+        stats = pstats.Stats(profile)
+        with self._lock:
+            thread_profiles, self._thread_profiles = self._thread_profiles, []
+        for thread_profile in thread_profiles:
+            stats.add(thread_profile)
+
+        # pstats文件: python -m pstats / snakeviz / gprof2dot
+        stats.dump_stats(f"{prefix}.prof")
+
+        # 折叠栈: flamegraph.pl xxx.folded > xxx.svg，或直接拖入 speedscope
+        with open(f"{prefix}.folded", "w", encoding="utf-8") as f:
+            f.write("\n".join(stats_to_folded(stats)) + "\n")
+
+        # 文本报告: 累计耗时最高的函数 + 内存分配最多的代码行
+        text = io.StringIO()
+        text.write(f"阶段: {name}\n")
+        text.write(f"耗时: {elapsed:.3f} 秒, 内存峰值增量: {(memory_peak - memory_before) / 1024 / 1024:.2f} MB\n")
+        text.write(f"剖析线程数: {1 + len(thread_profiles)}\n\n")
+        stats.stream = text
+        stats.sort_stats("cumulative").print_stats(self.top_n)
+        text.write(f"\n内存分配最多的 {self.top_n} 个位置:\n")
+        for stat in snapshot.statistics("lineno")[:self.top_n]:
+            text.write(f"  {stat}\n")
+        with open(f"{prefix}.txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+
+        # tracemalloc快照: tracemalloc.Snapshot.load() 加载后可与其他阶段对比
+        snapshot.dump(f"{prefix}.tracemalloc")
+
+        self.stages.append({
+            "stage": name,
+            "seconds": elapsed,
+            "calls": stats.total_calls,
+            "threads": 1 + len(thread_profiles),
+            "peak_bytes": memory_peak - memory_before,
+            "net_bytes": memory_after - memory_before,
+            "files": prefix
+        })
+        self.logger.info(
+            f"剖析阶段 {name}: {elapsed:.3f} 秒, 内存峰值增量 {(memory_peak - memory_before) / 1024 / 1024:.2f} MB"
+        )
+
+    def format_table(self) -> str:
+        """各阶段耗时与内存峰值表（Markdown表格）"""
+        total = sum(stage["seconds"] for stage in self.stages) or 1.0
+        lines = [
+            "| 阶段 | 耗时(秒) | 占比 | 函数调用次数 | 线程数 | 内存峰值增量(MB) | 内存净增量(MB) |",
+            "|------|----------|------|--------------|--------|------------------|----------------|"
+        ]
+        for stage in self.stages:
+            lines.append(
+                f"| {stage['stage']} | {stage['seconds']:.3f} | {stage['seconds'] / total:.1%} | "
+                f"{stage['calls']} | {stage['threads']} | {stage['peak_bytes'] / 1024 / 1024:.2f} | "
+                f"{stage['net_bytes'] / 1024 / 1024:.2f} |"
+            )
+        return "\n".join(lines)
+
+    def write_summary(self) -> Optional[str]:
+        """
+        写出汇总表
+
+        Returns:
+            Optional[str]: 汇总文件路径，未启用或没有剖析任何阶段时为None
+        """
+        if not self.enabled or not self.stages:
+            return None
+
+        summary_path = os.path.join(self.output_dir, "summary.md")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write("# 分阶段性能剖析\n\n")
+            f.write(self.format_table())
+            f.write("\n\n")
+            f.write("每个阶段输出以下文件（文件名前缀为 序号_阶段名）:\n\n")
+            f.write("- `.prof`: pstats统计，`python -m pstats` / snakeviz 查看\n")
+            f.write("- `.folded`: 折叠栈，`flamegraph.pl` 生成火焰图或拖入 speedscope\n")
+            f.write("- `.txt`: 累计耗时最高的函数和内存分配最多的代码行\n")
+            f.write("- `.tracemalloc`: tracemalloc快照，`tracemalloc.Snapshot.load()` 加载\n")
+        return summary_path
+
+    def summary(self) -> Dict[str, Any]:
+        """各阶段统计（写入结果meta）"""
+        return {
+            "output_dir": self.output_dir,
+            "stages": [{k: v for k, v in stage.items() if k != "files"} for stage in self.stages]
+        }
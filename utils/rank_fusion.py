@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+排序融合模拟模块
+用已保存的各方法检索结果（路径 + 分数）在本地模拟融合策略，不需要请求检索服务：
+- RRF（倒数排名融合），k取多个值
+- 加权分数融合：各方法的分数先归一化（min-max / z-score），按权重网格加权求和，可选CombMNZ
+
+同一批案例的各方法结果整理为 [案例, 方法, 文档] 的数组，所有融合变体一次向量化计算，
+每个变体的前L个结果用评估框架（calculate_new_framework_metrics）评分；
+不同变体中期望文件的位置经常相同，评分按（案例, 期望文件位置）缓存，每种情况只评分一次
+"""
+
+import itertools
+import logging
+import os
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import EvaluationMetrics
+from utils.result_diff import iter_case_results
+
+# 评分字段
+SCORE_FIELDS = ("total_score", "relevance", "completeness", "usability")
+
+# 支持的分数归一化方式
+NORMALIZATIONS = ("minmax", "zscore")
+
+
+class FusionCases:
+    """
+    对齐后的各方法检索结果
+
+    ranks[c, m, d]: 文档d在方法m中的排名（从1开始，未出现为inf）
+    scores[c, m, d]: 文档d在方法m中的原始分数（未出现为nan）
+    labels[c, d]: 文档d是案例c的第几个（去重后的）期望文件，不是期望文件时为-1
+    文档按案例编号，相同规范化路径视为同一文档；每个案例不足D个文档的位置 valid 为False
+    """
+
+    def __init__(self, methods: List[str], cases: List[Dict[str, Any]],
+                 lists: List[List[List[Tuple[str, float]]]], normalize):
+        """
+        Args:
+            methods: 方法名称
+            cases: 案例信息（idx、query、category、expected_results）
+            lists: lists[c][m] 为案例c在方法m中的 [(原始路径, 分数)]（按排名）
+            normalize: 路径规范化函数
+        """
+        self.methods = methods
+        self.cases = cases
+        self.doc_paths = []  # 每个案例的文档原始路径（第一次出现时的写法）
+        doc_ids = []
+        for per_method in lists:
+            ids, paths = {}, []
+            for hits in per_method:
+                for path, _ in hits:
+                    key = normalize(path)
+                    if key not in ids:
+                        ids[key] = len(paths)
+                        paths.append(path)
+            self.doc_paths.append(paths)
+            doc_ids.append(ids)
+
+        n_cases, n_methods = len(cases), len(methods)
+        n_docs = max((len(paths) for paths in self.doc_paths), default=0)
+        self.ranks = np.full((n_cases, n_methods, n_docs), np.inf, dtype=np.float64)
+        self.scores = np.full((n_cases, n_methods, n_docs), np.nan, dtype=np.float64)
+        self.valid = np.zeros((n_cases, n_docs), dtype=bool)
+        self.labels = np.full((n_cases, n_docs), -1, dtype=np.int64)
+        for c, per_method in enumerate(lists):
+            ids = doc_ids[c]
+            self.valid[c, :len(self.doc_paths[c])] = True
+            expected = dict.fromkeys(normalize(item.get("path", "")) for item in cases[c]["expected_results"])
+            for label, key in enumerate(expected):
+                if key in ids:
+                    self.labels[c, ids[key]] = label
+            for m, hits in enumerate(per_method):
+                for rank, (path, score) in enumerate(hits, 1):
+                    d = ids[normalize(path)]
+                    # 同一列表中重复出现的文档取最靠前的排名
+                    if rank < self.ranks[c, m, d]:
+                        self.ranks[c, m, d] = rank
+                        self.scores[c, m, d] = score if score is not None else np.nan
+
+    def __len__(self) -> int:
+        return len(self.cases)
+
+
+def load_result_lists(sources: Dict[str, str], metrics: EvaluationMetrics) -> Tuple[FusionCases, Dict[str, int]]:
+    """
+    从多个评估结果文件加载各方法的检索结果，按案例编号（idx）对齐
+
+    Args:
+        sources: 方法名称 -> 结果文件（.json / .jsonl / .npz）
+        metrics: 评估指标（用于路径规范化）
+
+    Returns:
+        Tuple: (对齐后的案例, {"matched", "dropped"})；只保留所有文件中都存在的案例，
+               某个方法在该案例上失败时视为空列表
+    """
+    methods = list(sources)
+    per_source = []
+    for path in sources.values():
+        cases = {}
+        for result in iter_case_results(path):
+            hits = [(hit.get("path", ""), hit.get("score")) for hit in result.get("actual_results") or []]
+            cases[str(result.get("idx"))] = (result, hits if result.get("success", False) else [])
+        per_source.append(cases)
+
+    common = [idx for idx in per_source[0] if all(idx in cases for cases in per_source[1:])]
+    all_ids = set().union(*per_source)
+    cases, lists = [], []
+    for idx in common:
+        results = [source[idx][0] for source in per_source]
+        expected = next((r.get("expected_results") for r in results if r.get("expected_results")), [])
+        cases.append({
+            "idx": results[0].get("idx"),
+            "query": results[0].get("query"),
+            "category": results[0].get("category", "unknown"),
+            "expected_results": expected
+        })
+        lists.append([source[idx][1] for source in per_source])
+    return FusionCases(methods, cases, lists, metrics._normalize_path), {
+        "matched": len(common), "dropped": len(all_ids) - len(common)
+    }
+
+
+def load_cached_lists(cache, test_cases: List[Dict], combos: Dict[str, Dict[str, Any]],
+                      metrics: EvaluationMetrics, upstream: Dict[str, Any]) -> Tuple[FusionCases, Dict[str, int]]:
+    """
+    从参数扫描的响应缓存（utils.sweep.ResponseCache）加载各组合的检索结果
+
+    Args:
+        cache: 已加载的响应缓存
+        test_cases: 测试案例（提供查询和期望结果）
+        combos: 方法名称 -> 扫描参数 {"method", "rank_method", "limit", "project_id"}
+        metrics: 评估指标（用于路径规范化）
+        upstream: 检索服务标识（utils.sweep.upstream_identity），只使用该服务的缓存响应
+
+    Returns:
+        Tuple: (对齐后的案例, {"matched", "dropped"})；只保留所有组合都有缓存响应的案例
+    """
+    from utils.sweep import request_key
+
+    cases, lists = [], []
+    for case in test_cases:
+        per_method = []
+        for params in combos.values():
+            cached = cache.get(request_key(case["query"], params, upstream))
+            if cached is None:
+                break
+            per_method.append([(hit.get("path", ""), hit.get("score")) for hit in cached[0].get("results", [])])
+        if len(per_method) != len(combos):
+            continue
+        cases.append({
+            "idx": case.get("idx"),
+            "query": case["query"],
+            "category": case.get("category", "unknown"),
+            "expected_results": case.get("expected_results", [])
+        })
+        lists.append(per_method)
+    return FusionCases(list(combos), cases, lists, metrics._normalize_path), {
+        "matched": len(cases), "dropped": len(test_cases) - len(cases)
+    }
+
+
+# ----------------------------------------------------------------------
+# 融合（向量化，结果形状为 [变体, 案例, 文档]）
+# ----------------------------------------------------------------------
+
+def rrf_scores(ranks: np.ndarray, ks: Iterable[float]) -> np.ndarray:
+    """倒数排名融合：sum_m 1 / (k + rank_m)，未出现的文档（rank为inf）贡献0"""
+    ks = np.asarray(list(ks), dtype=np.float64)
+    return (1.0 / (ks[:, None, None, None] + ranks[None])).sum(axis=2)
+
+
+def normalize_scores(scores: np.ndarray, method: str) -> np.ndarray:
+    """
+    按（案例, 方法）归一化分数
+
+    Args:
+        scores: [案例, 方法, 文档]，未出现为nan
+        method: minmax（映射到0~1，未出现为0）或 zscore（未出现取该列表的最低分）
+
+    Returns:
+        np.ndarray: 归一化后的分数（不含nan）
+    """
+    present = ~np.isnan(scores)
+    has_any = present.any(axis=2, keepdims=True)
+    # 整个列表都不存在时用0占位，避免全nan切片的警告
+    filled = np.where(has_any, scores, 0.0)
+    if method == "minmax":
+        low = np.nanmin(filled, axis=2, keepdims=True)
+        span = np.nanmax(filled, axis=2, keepdims=True) - low
+        # 所有分数相同时都视为1
+        normalized = np.where(span > 0, (filled - low) / np.where(span > 0, span, 1.0), 1.0)
+        return np.where(present, normalized, 0.0)
+    if method == "zscore":
+        mean = np.nanmean(filled, axis=2, keepdims=True)
+        std = np.nanstd(filled, axis=2, keepdims=True)
+        normalized = np.where(std > 0, (filled - mean) / np.where(std > 0, std, 1.0), 0.0)
+        floor = np.min(np.where(present, normalized, np.inf), axis=2, keepdims=True)
+        floor = np.where(np.isfinite(floor), floor, 0.0)
+        return np.where(present, normalized, floor)
+    raise ValueError(f"未知的归一化方式: {method}")
+
+
+def weighted_scores(normalized: np.ndarray, weights: np.ndarray, present: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    加权分数融合：sum_m w_m * s_m
+
+    Args:
+        normalized: [案例, 方法, 文档] 归一化分数
+        weights: [变体, 方法] 权重
+        present: [案例, 方法, 文档] 文档是否出现在方法的结果中；给出时乘以出现次数（CombMNZ）
+
+    Returns:
+        np.ndarray: [变体, 案例, 文档]
+    """
+    fused = np.einsum("wm,cmd->wcd", weights, normalized)
+    if present is not None:
+        fused = fused * present.sum(axis=1)[None]
+    return fused
+
+
+def weight_grid(n_methods: int, step: float) -> np.ndarray:
+    """
+    方法权重网格：所有非负、和为1、步长为step的权重组合
+
+    Returns:
+        np.ndarray: [组合数, 方法数]
+    """
+    units = max(1, round(1 / step))
+    # units个单位分给n_methods个方法：在 units + n_methods - 1 个位置中选 n_methods - 1 个隔板
+    rows = []
+    for bars in itertools.combinations(range(units + n_methods - 1), n_methods - 1):
+        bounds = (-1,) + bars + (units + n_methods - 1,)
+        rows.append([bounds[i + 1] - bounds[i] - 1 for i in range(n_methods)])
+    return np.asarray(rows, dtype=np.float64) / units
+
+
+def top_documents(fused: np.ndarray, valid: np.ndarray, limit: int) -> np.ndarray:
+    """
+    每个变体、每个案例的前limit个文档
+
+    Args:
+        fused: [变体, 案例, 文档] 融合分数（越大越好）
+        valid: [案例, 文档]
+        limit: 返回的文档数
+
+    Returns:
+        np.ndarray: [变体, 案例, limit] 文档编号，不足时为-1；分数相同的文档按编号（首次出现的顺序）排列
+    """
+    masked = np.where(valid[None], fused, -np.inf)
+    order = np.argsort(-masked, axis=2, kind="stable")[:, :, :limit]
+    kept = np.take_along_axis(masked, order, axis=2)
+    return np.where(kept > -np.inf, order, -1)
+
+
+class FusionSimulator:
+    """枚举融合变体并用评估框架评分"""
+
+    def __init__(self, data: FusionCases, metrics: EvaluationMetrics, limit: int = 10):
+        """
+        Args:
+            data: 对齐后的各方法检索结果
+            metrics: 评估指标
+            limit: 融合后保留的结果数（与检索接口的limit相同）
+        """
+        self.data = data
+        self.metrics = metrics
+        self.limit = limit
+        self._cache = {}  # (案例, 排序) -> 评分
+        self.scored_rankings = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _score(self, top: np.ndarray) -> np.ndarray:
+        """
+        评分 [变体, 案例, limit] 的排序
+
+        Returns:
+            np.ndarray: [变体, 案例, len(SCORE_FIELDS)]
+        """
+        n_variants, n_cases, _ = top.shape
+        scores = np.zeros((n_variants, n_cases, len(SCORE_FIELDS)))
+        # 评估框架的指标只取决于每个位置是哪个期望文件（或不是期望文件、没有结果），
+        # 按这种模式而不是完整排序去重：非期望文件之间的顺序变化不需要重新评分
+        patterns = np.where(
+            top >= 0, np.take_along_axis(self.data.labels[None], np.maximum(top, 0), axis=2), -2
+        )
+        for c in range(n_cases):
+            case = self.data.cases[c]
+            paths = self.data.doc_paths[c]
+            unique, first, inverse = np.unique(patterns[:, c, :], axis=0, return_index=True, return_inverse=True)
+            case_scores = np.empty((len(unique), len(SCORE_FIELDS)))
+            for u, (pattern, variant) in enumerate(zip(unique, first)):
+                key = (c, pattern.tobytes())
+                cached = self._cache.get(key)
+                if cached is None:
+                    actual = [{"path": paths[d]} for d in top[variant, c] if d >= 0]
+                    metrics = self.metrics.calculate_new_framework_metrics(actual, case["expected_results"])
+                    cached = self._cache[key] = [metrics[field] for field in SCORE_FIELDS]
+                    self.scored_rankings += 1
+                case_scores[u] = cached
+            scores[:, c, :] = case_scores[inverse.reshape(-1)]
+        return scores
+
+    def _rows(self, names: List[Dict[str, Any]], fused: np.ndarray) -> List[Dict[str, Any]]:
+        scores = self._score(top_documents(fused, self.data.valid, self.limit))
+        means = scores.mean(axis=1) if len(self.data) else np.zeros((len(names), len(SCORE_FIELDS)))
+        rows = []
+        for variant, mean in zip(names, means):
+            row = dict(variant)
+            row.update({f"avg_{field}": float(value) for field, value in zip(SCORE_FIELDS, mean)})
+            rows.append(row)
+        return rows
+
+    def single_methods(self) -> List[Dict[str, Any]]:
+        """各方法单独的排序（基线）"""
+        # 排名越靠前融合分数越高；未出现的文档为-inf，不会进入前limit个
+        fused = np.transpose(-self.data.ranks, (1, 0, 2))
+        names = [{"strategy": "single", "method": method} for method in self.data.methods]
+        return self._rows(names, fused)
+
+    def rrf(self, ks: Iterable[float]) -> List[Dict[str, Any]]:
+        """各k值的RRF"""
+        ks = list(ks)
+        names = [{"strategy": "rrf", "k": k} for k in ks]
+        return self._rows(names, rrf_scores(self.data.ranks, ks))
+
+    def weighted(self, normalization: str, weights: np.ndarray, mnz: bool = False) -> List[Dict[str, Any]]:
+        """指定归一化方式下各权重组合的加权分数融合"""
+        normalized = normalize_scores(self.data.scores, normalization)
+        present = np.isfinite(self.data.ranks) if mnz else None
+        strategy = "combmnz" if mnz else "weighted"
+        names = [
+            {"strategy": strategy, "normalization": normalization,
+             "weights": {method: float(w) for method, w in zip(self.data.methods, row)}}
+            for row in weights
+        ]
+        return self._rows(names, weighted_scores(normalized, weights, present))
+
+    def run(self, rrf_k: Iterable[float], normalizations: Iterable[str], weight_step: float,
+            mnz: bool = True) -> List[Dict[str, Any]]:
+        """
+        评估所有融合变体
+
+        Args:
+            rrf_k: RRF的k值
+            normalizations: 加权融合的归一化方式
+            weight_step: 权重网格的步长
+            mnz: 是否同时评估CombMNZ
+
+        Returns:
+            List[Dict]: 每个变体一行（strategy、参数和平均分），按平均总分从高到低
+        """
+        rows = self.single_methods()
+        rows.extend(self.rrf(rrf_k))
+        weights = weight_grid(len(self.data.methods), weight_step)
+        for normalization in normalizations:
+            rows.extend(self.weighted(normalization, weights))
+            if mnz:
+                rows.extend(self.weighted(normalization, weights, mnz=True))
+        rows.sort(key=lambda row: -row["avg_total_score"])
+        return rows
+
+
+def describe_variant(row: Dict[str, Any]) -> str:
+    """变体的简短描述"""
+    if row["strategy"] == "single":
+        return f"single {row['method']}"
+    if row["strategy"] == "rrf":
+        return f"rrf k={row['k']:g}"
+    weights = ", ".join(f"{method}={weight:g}" for method, weight in row["weights"].items())
+    return f"{row['strategy']} {row['normalization']} ({weights})"
+
+
+def parse_source(value: str) -> Tuple[str, str]:
+    """解析 名称=结果文件，省略名称时使用文件名"""
+    if "=" in value and not os.path.exists(value):
+        label, path = value.split("=", 1)
+        return label, path
+    return os.path.splitext(os.path.basename(value))[0], value
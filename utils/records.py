@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的评估记录类型
+案例结果使用 __slots__ 对象保存、检索结果按列保存，替代每个案例一个宽字典、每条检索结果一个字典的存储方式；
+对象实现只读的 Mapping 接口（result["total_score"]、result.get("success")），
+只在序列化时通过 to_dict() 转换为原有的字典结构
+"""
+
+import sys
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+# 各案例共用的字段名元组（相同字段顺序的检索结果只保存一份字段名）
+_HIT_KEYS = {}
+
+
+class HitColumns:
+    """
+    一个案例的检索结果，按列保存
+
+    所有结果字段顺序相同时（包括带 content 等额外字段的结果），保存一个字段名元组和每个字段一个值元组；
+    路径字符串会被驻留（sys.intern），不同案例返回的同一路径只保存一份。
+    只包含字符串/数值的元组不会被循环垃圾回收器追踪。
+    各条结果字段不一致时原样保存字典列表，不再另外保存列。
+    """
+
+    __slots__ = ("keys", "columns", "_raw")
+
+    def __init__(self, hits: List[Dict[str, Any]]):
+        keys = tuple(hits[0]) if hits else ()
+        if keys and all(tuple(hit) == keys for hit in hits):
+            self.keys = _HIT_KEYS.setdefault(keys, keys)
+            columns = []
+            for key in keys:
+                column = tuple(hit[key] for hit in hits)
+                if key == "path":
+                    intern = sys.intern
+                    column = tuple(intern(path) if type(path) is str else path for path in column)
+                columns.append(column)
+            self.columns = tuple(columns)
+            self._raw = None
+        else:
+            self.keys = self.columns = None
+            self._raw = hits
+
+    def __len__(self) -> int:
+        if self._raw is not None:
+            return len(self._raw)
+        return len(self.columns[0])
+
+    def _column(self, key: str, default: Any) -> Tuple[Any, ...]:
+        if self._raw is not None:
+            return tuple(hit.get(key, default) for hit in self._raw)
+        if key in self.keys:
+            return self.columns[self.keys.index(key)]
+        return (default,) * len(self)
+
+    @property
+    def paths(self) -> Tuple[str, ...]:
+        return self._column("path", "")
+
+    @property
+    def scores(self) -> Tuple[Any, ...]:
+        return self._column("score", None)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """转换为原有的检索结果字典列表"""
+        if self._raw is not None:
+            return self._raw
+        keys = self.keys
+        return [dict(zip(keys, row)) for row in zip(*self.columns)]
+
+
+def hit_count(result: Mapping) -> int:
+    """
+    案例的检索结果数量
+
+    紧凑记录直接返回保存的数量，检索结果已溢写到磁盘时也不需要读回列表；
+    普通字典（例如从结果文件加载的）按 actual_results 计算
+
+    Args:
+        result: 案例结果
+
+    Returns:
+        int: 检索结果数量，没有检索结果时为0
+    """
+    hits = result.hits if isinstance(result, CaseResult) else result.get("actual_results")
+    return len(hits) if hits is not None else 0
+
+
+# 各类案例结果的字段顺序（与原有字典结构一致）
+SUCCESS_KEYS = (
+    "idx", "query", "category", "description", "metrics", "expected_results", "actual_results",
+    "timestamp", "success", "total_score", "relevance", "completeness", "usability", "elapsed_time"
+)
+ERROR_KEYS = ("idx", "query", "category", "error", "timestamp", "success", "elapsed_time")
+# 顺序评估中评估函数本身抛出异常时的结果（没有耗时）
+EXCEPTION_KEYS = ("idx", "query", "category", "error", "success", "timestamp")
+# 评估中启用重试（PERFORMANCE_CONFIG["retry_in_evaluation"]）时附加重试次数
+SUCCESS_RETRY_KEYS = SUCCESS_KEYS + ("retries",)
+ERROR_RETRY_KEYS = ERROR_KEYS + ("retries",)
+_RETRY_KEYS = {SUCCESS_KEYS: SUCCESS_RETRY_KEYS, ERROR_KEYS: ERROR_RETRY_KEYS}
+
+
+class CaseResult(Mapping):
+    """
+    单个案例的评估结果
+
+    metrics 不单独保存，访问时由 total_score/relevance/completeness/usability 和明细字段生成；
+    timestamp 保存为Unix时间戳，访问时格式化为ISO字符串。
+    """
+
+    __slots__ = (
+        "_keys", "idx", "query", "category", "description", "expected_results", "hits",
+        "_timestamp", "success", "total_score", "relevance", "completeness", "usability",
+        "elapsed_time", "error", "retries", "_relevant_in_top_k", "_total_relevant", "_k", "_mrr"
+    )
+
+    def __init__(self, keys: Tuple[str, ...], query: Dict[str, Any], timestamp: float, success: bool):
+        self._keys = keys
+        self.idx = query.get("idx")
+        self.query = query["query"]
+        self.category = query.get("category", "unknown")
+        self.description = query.get("description", "")
+        self._timestamp = timestamp
+        self.success = success
+        self.expected_results = None
+        self.hits = None
+        self.total_score = self.relevance = self.completeness = self.usability = None
+        self.elapsed_time = None
+        self.error = None
+        self.retries = None
+        self._relevant_in_top_k = self._total_relevant = self._k = self._mrr = None
+
+    @classmethod
+    def succeeded(cls, query: Dict[str, Any], metrics: Dict[str, Any],
+                  actual_results: List[Dict[str, Any]], timestamp: float, elapsed_time: float,
+                  spill_store=None) -> "CaseResult":
+        """
+        成功案例
+
+        Args:
+            query: 测试案例
+            metrics: calculate_new_framework_metrics 的返回值
+            actual_results: API返回的检索结果
+            timestamp: 完成时间（Unix时间戳）
+            elapsed_time: 耗时（秒）
+            spill_store: utils.spill_store.SpillStore，设置时检索结果写入磁盘，内存中只保留读回句柄
+        """
+        result = cls(SUCCESS_KEYS, query, timestamp, True)
+        # 期望结果直接引用测试数据集中的列表，不复制
+        result.expected_results = query["expected_results"]
+        if spill_store is not None:
+            result.hits = spill_store.spill(actual_results)
+        else:
+            result.hits = HitColumns(actual_results)
+        result.total_score = metrics["total_score"]
+        result.relevance = metrics["relevance"]
+        result.completeness = metrics["completeness"]
+        result.usability = metrics["usability"]
+        details = metrics["details"]
+        result._relevant_in_top_k = details["relevant_in_top_k"]
+        result._total_relevant = details["total_relevant"]
+        result._k = details["k"]
+        result._mrr = details["mrr"]
+        result.elapsed_time = elapsed_time
+        return result
+
+    @classmethod
+    def failed(cls, query: Dict[str, Any], error: str, timestamp: float,
+               elapsed_time: Optional[float] = None) -> "CaseResult":
+        """
+        失败案例
+
+        Args:
+            query: 测试案例
+            error: 错误信息
+            timestamp: 完成时间（Unix时间戳）
+            elapsed_time: 耗时（秒），为None时结果中不包含elapsed_time
+        """
+        result = cls(ERROR_KEYS if elapsed_time is not None else EXCEPTION_KEYS, query, timestamp, False)
+        result.error = error
+        result.elapsed_time = elapsed_time
+        return result
+
+    def set_retries(self, retries: int) -> None:
+        """
+        记录请求阶段的重试次数（结果中增加 retries 字段）
+
+        Args:
+            retries: 重试次数，0表示第一次请求即完成
+        """
+        self.retries = retries
+        self._keys = _RETRY_KEYS.get(self._keys, self._keys)
+
+    @property
+    def metrics(self) -> Optional[Dict[str, Any]]:
+        if not self.success:
+            return None
+        return {
+            "relevance": self.relevance,
+            "completeness": self.completeness,
+            "usability": self.usability,
+            "total_score": self.total_score,
+            "details": {
+                "relevant_in_top_k": self._relevant_in_top_k,
+                "total_relevant": self._total_relevant,
+                "k": self._k,
+                "mrr": self._mrr
+            }
+        }
+
+    @property
+    def actual_results(self) -> Optional[List[Dict[str, Any]]]:
+        """检索结果字典列表（每次访问重新生成或从溢写文件读回；只需要数量时使用 hit_count()）"""
+        return self.hits.to_list() if self.hits is not None else None
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self._timestamp).isoformat()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self._keys else default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为原有的案例结果字典结构（用于序列化）"""
+        if self._keys is not SUCCESS_KEYS:
+            return {key: getattr(self, key) for key in self._keys}
+        # 成功案例数量最多，逐个字段直接构建
+        return {
+            "idx": self.idx,
+            "query": self.query,
+            "category": self.category,
+            "description": self.description,
+            "metrics": self.metrics,
+            "expected_results": self.expected_results,
+            "actual_results": self.hits.to_list(),
+            "timestamp": self.timestamp,
+            "success": True,
+            "total_score": self.total_score,
+            "relevance": self.relevance,
+            "completeness": self.completeness,
+            "usability": self.usability,
+            "elapsed_time": self.elapsed_time
+        }
+
+    def __repr__(self) -> str:
+        return f"CaseResult(idx={self.idx!r}, success={self.success!r})"
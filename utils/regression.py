@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+基线回归检查模块
+把本次评估与基线评估按案例编号（idx）做哈希连接，逐案例和整体比较质量与延迟：
+平均分的下降用配对检验判断是否显著，p95延迟超过基线一定比例视为延迟回归，
+任一检查不通过时评估以非零状态退出，可用于检索服务发布前的门禁
+"""
+
+import heapq
+import logging
+import math
+import os
+import random
+from statistics import NormalDist
+from typing import Dict, List, Any, Optional, Tuple
+
+# 配对检验中小于该样本量时改用符号翻转置换检验（正态近似不可靠）
+_MIN_NORMAL_SAMPLES = 30
+_PERMUTATIONS = 10000
+
+
+class BaselineCase:
+    """基线中单个案例的比较字段"""
+
+    __slots__ = ("category", "success", "total_score", "usability", "elapsed_time")
+
+    def __init__(self, category: str, success: bool, total_score: Optional[float],
+                 usability: Optional[float], elapsed_time: Optional[float]):
+        self.category = category
+        self.success = success
+        self.total_score = total_score
+        self.usability = usability
+        self.elapsed_time = elapsed_time
+
+
+def _build_side(rows) -> Tuple[Dict[str, BaselineCase], int]:
+    """
+    构建哈希连接的构建侧：idx -> BaselineCase
+
+    Args:
+        rows: 可迭代的 (idx, category, success, total_score, usability, elapsed_time)
+
+    Returns:
+        Tuple: (索引, 重复idx数量)；重复的idx保留第一次出现的案例
+    """
+    table = {}
+    duplicates = 0
+    for idx, category, success, total_score, usability, elapsed_time in rows:
+        if idx in table:
+            duplicates += 1
+            continue
+        table[idx] = BaselineCase(category, bool(success), total_score, usability, elapsed_time)
+    return table, duplicates
+
+
+def load_baseline(ref: str, history_db: Optional[str] = None) -> Dict[str, Any]:
+    """
+    加载基线评估
+
+    Args:
+        ref: 结果文件路径（JSON或列式NPZ），或历史数据库中的run_key（报告时间戳）
+        history_db: 历史数据库路径，ref不是文件时使用
+
+    Returns:
+        Dict: {"label", "cases": {idx: BaselineCase}, "duplicates"}
+    """
+    if os.path.isfile(ref):
+        from utils.result_store import is_columnar_result
+        if is_columnar_result(ref):
+            from utils.result_store import load_columnar_results
+            columnar = load_columnar_results(ref)
+            success = columnar.success.tolist()
+            rows = zip(
+                columnar.strings("idx"),
+                columnar.categories(),
+                success,
+                [s if ok else None for s, ok in zip(columnar["total_score"].tolist(), success)],
+                [s if ok else None for s, ok in zip(columnar["usability"].tolist(), success)],
+                columnar.elapsed_time.tolist()
+            )
+        else:
+            from utils.serializer import load_json
+            detailed = load_json(ref).get("detailed_results", [])
+            rows = (
+                (r.get("idx"), r.get("category", "unknown"), r.get("success", False),
+                 r.get("total_score"), r.get("usability"), r.get("elapsed_time"))
+                for r in detailed
+            )
+        cases, duplicates = _build_side(rows)
+        return {"label": ref, "cases": cases, "duplicates": duplicates}
+
+    if history_db and os.path.exists(history_db):
+        from utils.history_store import HistoryStore
+        with HistoryStore(history_db) as store:
+            if store.get_run(ref) is not None:
+                cases, duplicates = _build_side(store.run_cases(ref))
+                return {"label": f"{ref} ({history_db})", "cases": cases, "duplicates": duplicates}
+
+    raise FileNotFoundError(f"找不到基线评估: {ref}（既不是结果文件，也不是历史数据库中的run_key）")
+
+
+def paired_drop_test(diffs: List[float], seed: int = 0) -> float:
+    """
+    单侧配对检验：本次相对基线是否显著下降
+
+    Args:
+        diffs: 各案例 本次 - 基线 的差值
+        seed: 置换检验的随机种子
+
+    Returns:
+        float: p值（越小越说明下降不是随机波动）
+    """
+    n = len(diffs)
+    if n == 0:
+        return 1.0
+    mean = sum(diffs) / n
+    if n >= _MIN_NORMAL_SAMPLES:
+        variance = sum((d - mean) ** 2 for d in diffs) / (n - 1)
+        if variance == 0:
+            return 0.0 if mean < 0 else 1.0
+        return NormalDist().cdf(mean / math.sqrt(variance / n))
+
+    # 小样本：随机翻转差值符号，统计均值不高于观测值的比例
+    rng = random.Random(seed)
+    total = sum(diffs)
+    hits = 0
+    for _ in range(_PERMUTATIONS):
+        if sum(d if rng.random() < 0.5 else -d for d in diffs) <= total + 1e-12:
+            hits += 1
+    return (hits + 1) / (_PERMUTATIONS + 1)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    """精确分位数（最近秩），没有数据时为None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def _case_change(result: Dict[str, Any], cases: Dict[str, BaselineCase], delta: float) -> Dict[str, Any]:
+    """逐案例变化明细"""
+    return {
+        "idx": result.get("idx"),
+        "query": result.get("query"),
+        "category": result.get("category", "unknown"),
+        "baseline_total_score": cases[result.get("idx")].total_score,
+        "total_score": result.get("total_score"),
+        "delta": delta
+    }
+
+
+def compare_with_baseline(detailed_results: List[Dict], baseline: Dict[str, Any],
+                          config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    比较本次评估与基线
+
+    Args:
+        detailed_results: 本次评估的detailed_results（哈希连接的探测侧）
+        baseline: load_baseline 的返回值
+        config: REGRESSION_CONFIG
+
+    Returns:
+        Dict: 连接统计、各指标检验结果、延迟比较、逐案例变化和 violations（违规项列表）
+    """
+    cases = baseline["cases"]
+    metrics = config.get("metrics", ["total_score", "usability"])
+    # 成功配对案例的 本次/基线 指标值，按指标分列
+    current_values = {metric: [] for metric in metrics}
+    baseline_values = {metric: [] for metric in metrics}
+    current_elapsed = []
+    baseline_elapsed = []
+    # 成功配对案例的总分变化及其在本次结果中的序号；只保存数值，
+    # 不为每个案例创建会被垃圾回收器追踪的对象，最后只为变化最大的N个案例构建明细
+    deltas = []
+    positions = []
+    newly_failed = []
+    newly_passed = []
+    matched = 0
+    # 匹配到的基线案例（本次结果中idx重复时只计一次）
+    matched_keys = set()
+
+    for position, result in enumerate(detailed_results):
+        get = result.get
+        base = cases.get(get("idx"))
+        if base is None:
+            continue
+        matched += 1
+        matched_keys.add(get("idx"))
+        success = get("success", False)
+
+        elapsed = get("elapsed_time")
+        if elapsed is not None and base.elapsed_time is not None:
+            current_elapsed.append(elapsed)
+            baseline_elapsed.append(base.elapsed_time)
+
+        if not success:
+            if base.success:
+                newly_failed.append({"idx": get("idx"), "query": get("query"), "error": get("error")})
+            continue
+        if not base.success:
+            newly_passed.append({"idx": get("idx"), "query": get("query")})
+            continue
+
+        for metric in metrics:
+            current_values[metric].append(get(metric) or 0.0)
+            baseline_values[metric].append(getattr(base, metric) or 0.0)
+        deltas.append((get("total_score") or 0.0) - (base.total_score or 0.0))
+        positions.append(position)
+
+    violations = []
+    alpha = config.get("alpha", 0.05)
+    min_drop = config.get("min_score_drop", 0.02)
+    metric_checks = {}
+    for metric in metrics:
+        current, previous = current_values[metric], baseline_values[metric]
+        n = len(current)
+        current_mean = math.fsum(current) / n if n else None
+        baseline_mean = math.fsum(previous) / n if n else None
+        delta = current_mean - baseline_mean if n else None
+        p_value = paired_drop_test([c - b for c, b in zip(current, previous)]) if n else None
+        regressed = bool(n) and delta <= -min_drop and p_value < alpha
+        metric_checks[f"avg_{metric}"] = {
+            "paired_cases": n,
+            "baseline": baseline_mean,
+            "current": current_mean,
+            "delta": delta,
+            "p_value": p_value,
+            "regressed": regressed
+        }
+        if regressed:
+            violations.append(
+                f"avg_{metric} 下降 {-delta:.3f} ({baseline_mean:.3f} -> {current_mean:.3f}, p={p_value:.4f})"
+            )
+
+    max_increase = config.get("max_p95_increase", 0.2)
+    baseline_p95 = _percentile(baseline_elapsed, 0.95)
+    current_p95 = _percentile(current_elapsed, 0.95)
+    latency_regressed = bool(baseline_p95) and current_p95 > baseline_p95 * (1 + max_increase)
+    if latency_regressed:
+        violations.append(
+            f"p95延迟上升 {current_p95 / baseline_p95 - 1:.1%} "
+            f"({baseline_p95 * 1000:.0f}ms -> {current_p95 * 1000:.0f}ms，允许 {max_increase:.0%})"
+        )
+
+    # 没有（或只有很少）案例与基线对上时无法判断是否回归，不能默认通过
+    min_match_ratio = config.get("min_match_ratio", 0.5)
+    match_ratio = matched / len(detailed_results) if detailed_results else 0.0
+    if matched == 0:
+        violations.append("没有与基线匹配的案例（基线或本次结果缺少idx，或数据集不同），无法进行回归检查")
+    elif match_ratio < min_match_ratio:
+        violations.append(f"只有 {match_ratio:.0%} 的案例与基线匹配，低于要求的 {min_match_ratio:.0%}")
+
+    if newly_failed and config.get("fail_on_new_errors", True):
+        violations.append(f"{len(newly_failed)} 个在基线中成功的案例本次失败")
+
+    top_n = config.get("top_cases", 10)
+    order = range(len(deltas))
+    worst = [
+        _case_change(detailed_results[positions[i]], cases, deltas[i])
+        for i in heapq.nsmallest(top_n, order, key=deltas.__getitem__) if deltas[i] < 0
+    ]
+    best = [
+        _case_change(detailed_results[positions[i]], cases, deltas[i])
+        for i in heapq.nlargest(top_n, order, key=deltas.__getitem__) if deltas[i] > 0
+    ]
+    return {
+        "baseline": baseline["label"],
+        "matched_cases": matched,
+        "current_only": len(detailed_results) - matched,
+        "baseline_only": len(cases) - len(matched_keys),
+        "match_ratio": match_ratio,
+        "baseline_duplicates": baseline["duplicates"],
+        "metrics": metric_checks,
+        "latency": {
+            "baseline_p95": baseline_p95,
+            "current_p95": current_p95,
+            "max_increase": max_increase,
+            "regressed": latency_regressed
+        },
+        "worst_cases": worst,
+        "best_cases": best,
+        "newly_failed": newly_failed,
+        "newly_passed": newly_passed,
+        "violations": violations,
+        "passed": not violations
+    }
+
+
+def log_regression(report: Dict[str, Any]) -> None:
+    """把基线比较结果写入日志（违规项为ERROR级别）"""
+    logger = logging.getLogger(__name__)
+    logger.info(
+        f"基线对比: {report['baseline']} | 匹配 {report['matched_cases']} 个案例 "
+        f"(仅本次 {report['current_only']}, 仅基线 {report['baseline_only']})"
+    )
+    for violation in report["violations"]:
+        logger.error(f"回归检查未通过: {violation}")
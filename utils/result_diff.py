@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+评估结果对比模块
+按案例编号（idx）对齐两次评估的结果，逐查询分析排序变化：
+期望文件的排名变化、新找到/丢失的检索结果、分数变化，以及两个排序列表的rank-biased overlap（RBO），
+并按影响大小排序。两个结果文件都是流式读取，不需要把完整结果加载到内存
+"""
+
+import os
+from functools import lru_cache
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+from utils.metrics import EvaluationMetrics
+
+# 对比的分数字段
+SCORE_FIELDS = ("total_score", "relevance", "completeness", "usability")
+
+
+def iter_case_results(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    流式读取评估结果文件中的案例
+
+    Args:
+        path: 完整结果文件（.json）、评估过程中写出的案例流（.jsonl）或列式结果（.npz）
+
+    Yields:
+        Dict: 单个案例结果
+    """
+    if path.endswith(".jsonl"):
+        from utils.serializer import get_backend
+        backend = get_backend("auto", indent=None)
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield backend.loads(line)
+        return
+
+    from utils.result_store import is_columnar_result
+    if is_columnar_result(path):
+        from utils.result_store import load_columnar_results
+        # 列式结果本身很紧凑，整体加载后逐个还原为字典
+        yield from load_columnar_results(path).iter_detailed_results()
+        return
+
+    from utils.serializer import iter_json_list
+    yield from iter_json_list(path, "detailed_results")
+
+
+def rank_biased_overlap(ranking_a: List[str], ranking_b: List[str], p: float = 0.9) -> float:
+    """
+    两个排序列表的外推rank-biased overlap（Webber et al., 2010，支持长度不同的列表）
+
+    越靠前的位置权重越大（权重按 p^d 衰减），1表示排序完全相同，0表示没有交集
+
+    Args:
+        ranking_a: 排序列表A（重复项只保留第一次出现）
+        ranking_b: 排序列表B
+        p: 持续概率，越小越只关注前几名
+
+    Returns:
+        float: RBO值（0~1）
+    """
+    ranking_a = list(dict.fromkeys(ranking_a))
+    ranking_b = list(dict.fromkeys(ranking_b))
+    if not ranking_a and not ranking_b:
+        return 1.0
+    if not ranking_a or not ranking_b:
+        return 0.0
+
+    longer, shorter = (ranking_a, ranking_b) if len(ranking_a) >= len(ranking_b) else (ranking_b, ranking_a)
+    l, s = len(longer), len(shorter)
+    seen_long, seen_short = set(), set()
+    overlap = 0
+    weighted = 0.0
+    overlap_at_s = 0
+    weight = 1.0
+    for d in range(1, l + 1):
+        weight *= p
+        item = longer[d - 1]
+        if item in seen_short:
+            overlap += 1
+        seen_long.add(item)
+        if d <= s:
+            other = shorter[d - 1]
+            if other in seen_long:
+                overlap += 1
+            seen_short.add(other)
+            if d == s:
+                overlap_at_s = overlap
+        weighted += overlap / d * weight
+        if d > s:
+            # 较短的列表已结束：假设其后续元素与较长列表的重合比例保持不变
+            weighted += overlap_at_s * (d - s) / (s * d) * weight
+    extrapolated = ((overlap - overlap_at_s) / l + overlap_at_s / s) * weight
+    return min(1.0, (1 - p) / p * weighted + extrapolated)
+
+
+class ResultDiffer:
+    """逐案例对比两次评估结果"""
+
+    def __init__(self, rbo_p: float = 0.9):
+        """
+        Args:
+            rbo_p: RBO的持续概率
+        """
+        self.rbo_p = rbo_p
+        # 同一代码库的路径在各案例中大量重复，缓存规范化结果
+        self._normalize = lru_cache(maxsize=65536)(EvaluationMetrics({})._normalize_path)
+
+    def _ranking(self, result: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """(规范化路径列表, 原始路径列表)"""
+        raw = [hit.get("path", "") for hit in result.get("actual_results") or []]
+        return [self._normalize(path) for path in raw], raw
+
+    def diff_case(self, before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        对比同一案例的两次结果
+
+        Args:
+            before: 基准结果（A）
+            after: 新结果（B）
+
+        Returns:
+            Dict: idx、query、分数变化、期望文件排名变化、新找到/丢失的结果、rbo和impact
+        """
+        ranking_a, raw_a = self._ranking(before)
+        ranking_b, raw_b = self._ranking(after)
+        # 路径 -> 排名（重复出现时取最靠前的排名）
+        rank_a = dict(zip(reversed(ranking_a), range(len(ranking_a), 0, -1)))
+        rank_b = dict(zip(reversed(ranking_b), range(len(ranking_b), 0, -1)))
+
+        expected = []
+        for item in after.get("expected_results") or before.get("expected_results") or []:
+            path = self._normalize(item.get("path", ""))
+            old_rank, new_rank = rank_a.get(path), rank_b.get(path)
+            if old_rank == new_rank:
+                movement = 0
+            elif old_rank is None or new_rank is None:
+                movement = None
+            else:
+                # 正数表示排名上升
+                movement = old_rank - new_rank
+            expected.append({"path": item.get("path", ""), "before": old_rank, "after": new_rank, "moved": movement})
+
+        found = [raw for raw, path in zip(raw_b, ranking_b) if path not in rank_a]
+        lost = [raw for raw, path in zip(raw_a, ranking_a) if path not in rank_b]
+
+        deltas = {}
+        for field in SCORE_FIELDS:
+            old, new = before.get(field), after.get(field)
+            deltas[field] = (new or 0.0) - (old or 0.0) if old is not None or new is not None else None
+
+        rbo = rank_biased_overlap(ranking_a, ranking_b, self.rbo_p)
+        total_delta = deltas["total_score"] or 0.0
+        return {
+            "idx": after.get("idx", before.get("idx")),
+            "query": after.get("query", before.get("query")),
+            "category": after.get("category", before.get("category", "unknown")),
+            "success": [before.get("success", False), after.get("success", False)],
+            "total_score": [before.get("total_score"), after.get("total_score")],
+            "deltas": deltas,
+            "rbo": rbo,
+            "expected": expected,
+            "found": found,
+            "lost": lost,
+            # 影响：总分变化为主，排序变化（1 - RBO）区分分数相同但排序改变的查询
+            "impact": abs(total_delta) + 0.01 * (1 - rbo)
+        }
+
+    def diff_files(self, path_a: str, path_b: str, output_path: Optional[str] = None,
+                   top: int = 20) -> Dict[str, Any]:
+        """
+        流式对比两个结果文件
+
+        两个文件按顺序同时读取，idx相同时立即对比；顺序不一致的案例暂存到等待表，
+        对方读到相同idx时再对比。有变化的案例只保留编码后的对比记录，用于最后按影响排序
+
+        Args:
+            path_a: 基准结果文件
+            path_b: 新结果文件
+            output_path: 按影响排序的逐案例对比输出文件（JSON行），为空时不写出
+            top: 返回的影响最大的案例数
+
+        Returns:
+            Dict: {"a", "b", "summary", "top": 影响最大的案例对比, "only_a", "only_b"}
+        """
+        from utils.serializer import get_backend
+        backend = get_backend("auto", indent=None)
+        summary = DiffSummary()
+        # (影响, 序号, 编码后的对比记录)；排序、分数都未变化的案例只计数
+        changed = []
+        pending_a, pending_b = {}, {}
+
+        def record(before, after):
+            case = self.diff_case(before, after)
+            summary.add(case)
+            if case["impact"] > 0:
+                changed.append((case["impact"], len(changed), backend.dumps(case)))
+
+        iter_a, iter_b = iter_case_results(path_a), iter_case_results(path_b)
+        while iter_a is not None or iter_b is not None:
+            result_a = next(iter_a, None) if iter_a is not None else None
+            result_b = next(iter_b, None) if iter_b is not None else None
+            if result_a is None:
+                iter_a = None
+            if result_b is None:
+                iter_b = None
+            if result_a is not None and result_b is not None and result_a.get("idx") == result_b.get("idx"):
+                record(result_a, result_b)
+                continue
+            if result_a is not None:
+                match = pending_b.pop(result_a.get("idx"), None)
+                if match is not None:
+                    record(result_a, match)
+                else:
+                    pending_a[result_a.get("idx")] = result_a
+            if result_b is not None:
+                match = pending_a.pop(result_b.get("idx"), None)
+                if match is not None:
+                    record(match, result_b)
+                else:
+                    pending_b[result_b.get("idx")] = result_b
+
+        # 影响相同时保持文件中的顺序
+        changed.sort(key=lambda item: (-item[0], item[1]))
+        diff = {
+            "a": path_a,
+            "b": path_b,
+            "summary": summary.to_dict(len(changed)),
+            "only_a": sorted(str(idx) for idx in pending_a),
+            "only_b": sorted(str(idx) for idx in pending_b)
+        }
+        if output_path:
+            output_dir = os.path.dirname(output_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            with open(output_path, "wb") as f:
+                # 第一行为汇总，之后每行一个案例
+                f.write(backend.dumps(diff) + b"\n")
+                for _, _, data in changed:
+                    f.write(data + b"\n")
+        diff["top"] = [backend.loads(data) for _, _, data in changed[:top]]
+        return diff
+
+
+class DiffSummary:
+    """逐案例对比的汇总：分数升降的查询数、平均RBO、期望文件排名升降次数"""
+
+    def __init__(self):
+        self.count = 0
+        self.improved = self.regressed = 0
+        self.total_delta = 0.0
+        self.rbo_sum = 0.0
+        self.moved_up = self.moved_down = self.gained = self.dropped = 0
+
+    def add(self, case: Dict[str, Any]) -> None:
+        self.count += 1
+        delta = case["deltas"]["total_score"] or 0.0
+        self.total_delta += delta
+        if delta > 0:
+            self.improved += 1
+        elif delta < 0:
+            self.regressed += 1
+        self.rbo_sum += case["rbo"]
+        for item in case["expected"]:
+            if item["moved"] is None:
+                if item["after"] is not None:
+                    self.gained += 1
+                else:
+                    self.dropped += 1
+            elif item["moved"] > 0:
+                self.moved_up += 1
+            elif item["moved"] < 0:
+                self.moved_down += 1
+
+    def to_dict(self, changed: int) -> Dict[str, Any]:
+        return {
+            "matched_cases": self.count,
+            "changed_cases": changed,
+            "improved": self.improved,
+            "regressed": self.regressed,
+            "unchanged_score": self.count - self.improved - self.regressed,
+            "avg_total_delta": self.total_delta / self.count if self.count else 0.0,
+            "avg_rbo": self.rbo_sum / self.count if self.count else None,
+            "expected_moved_up": self.moved_up,
+            "expected_moved_down": self.moved_down,
+            "expected_gained": self.gained,
+            "expected_dropped": self.dropped
+        }
+
+
+def format_rank(rank: Optional[int]) -> str:
+    """排名显示，未出现在结果中为 -"""
+    return str(rank) if rank is not None else "-"
+
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+列式评估结果存储模块
+将评估结果按列保存为NPZ文件，便于下游分析工具快速加载
+"""
+
+import io
+import json
+import os
+import zipfile
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+import numpy as np
+
+# 列式文件格式版本，结构变化时递增
+COLUMNAR_FORMAT_VERSION = 1
+
+# 单案例的数值指标列
+METRIC_COLUMNS = ["total_score", "relevance", "completeness", "usability"]
+
+
+def _encode_strings(values: List[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将字符串列表编码为 UTF-8 字节数组 + 偏移量
+
+    Returns:
+        Tuple: (uint8数据数组, 长度为len(values)+1的int64偏移量数组)
+    """
+    encoded = [(v or "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
+
+
+def _decode_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """_encode_strings的逆操作"""
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+
+class _PathTable:
+    """路径字典：将路径字符串映射为连续的整数ID"""
+
+    def __init__(self):
+        self.ids = {}
+        self.paths = []
+
+    def get_id(self, path: str) -> int:
+        path_id = self.ids.get(path)
+        if path_id is None:
+            path_id = len(self.paths)
+            self.ids[path] = path_id
+            self.paths.append(path)
+        return path_id
+
+
+def results_to_columns(results: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    将完整评估结果转换为列式数组
+
+    排序结果列表使用 offsets + values 布局: 第i个案例的结果为
+    hit_path_ids[hit_offsets[i]:hit_offsets[i+1]]。
+
+    Args:
+        results: evaluate_dataset返回的完整评估结果
+
+    Returns:
+        Dict[str, np.ndarray]: 列名 -> 数组
+    """
+    detailed = results.get("detailed_results", [])
+    count = len(detailed)
+    path_table = _PathTable()
+    category_ids = {}
+
+    columns = {name: np.zeros(count, dtype=np.float64) for name in METRIC_COLUMNS}
+    columns["elapsed_time"] = np.zeros(count, dtype=np.float64)
+    columns["success"] = np.zeros(count, dtype=np.bool_)
+    columns["category_id"] = np.zeros(count, dtype=np.int32)
+
+    hit_counts = np.zeros(count, dtype=np.int64)
+    expected_counts = np.zeros(count, dtype=np.int64)
+    hit_path_ids = []
+    hit_scores = []
+    expected_path_ids = []
+
+    for i, result in enumerate(detailed):
+        columns["success"][i] = result.get("success", False)
+        columns["elapsed_time"][i] = result.get("elapsed_time", 0.0)
+        for name in METRIC_COLUMNS:
+            columns[name][i] = result.get(name, 0.0)
+
+        category = result.get("category", "unknown")
+        columns["category_id"][i] = category_ids.setdefault(category, len(category_ids))
+
+        hits = result.get("actual_results", [])
+        hit_counts[i] = len(hits)
+        for hit in hits:
+            hit_path_ids.append(path_table.get_id(hit.get("path", "")))
+            score = hit.get("score")
+            hit_scores.append(np.nan if score is None else score)
+
+        expected = result.get("expected_results", [])
+        expected_counts[i] = len(expected)
+        for item in expected:
+            expected_path_ids.append(path_table.get_id(item.get("path", "")))
+
+    columns["hit_offsets"] = np.concatenate(([0], np.cumsum(hit_counts))).astype(np.int64)
+    columns["hit_path_ids"] = np.asarray(hit_path_ids, dtype=np.int32)
+    columns["hit_scores"] = np.asarray(hit_scores, dtype=np.float32)
+    columns["expected_offsets"] = np.concatenate(([0], np.cumsum(expected_counts))).astype(np.int64)
+    columns["expected_path_ids"] = np.asarray(expected_path_ids, dtype=np.int32)
+
+    string_columns = {
+        "idx": [r.get("idx") for r in detailed],
+        "query": [r.get("query") for r in detailed],
+        "error": [r.get("error") for r in detailed],
+        "path": path_table.paths,
+        "category": list(category_ids)
+    }
+    for name, values in string_columns.items():
+        columns[f"{name}_data"], columns[f"{name}_offsets"] = _encode_strings(values)
+
+    # 配置、汇总指标等体积很小的部分以JSON保存
+    header = {
+        "format_version": COLUMNAR_FORMAT_VERSION,
+        "meta": results.get("meta", {}),
+        "summary_metrics": results.get("summary_metrics", {}),
+        "category_metrics": results.get("category_metrics", {}),
+        "config": results.get("config", {})
+    }
+    for key in ("sampling",):
+        if key in results:
+            header[key] = results[key]
+    columns["header_json"] = np.frombuffer(
+        json.dumps(header, ensure_ascii=False, default=float).encode("utf-8"), dtype=np.uint8
+    )
+
+    return columns
+
+
+def save_columnar_results(results: Dict[str, Any], output_path: str) -> None:
+    """
+    以列式NPZ格式保存评估结果
+
+    Args:
+        results: 评估结果
+        output_path: 输出文件路径（.npz）
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    np.savez_compressed(output_path, **results_to_columns(results))
+
+
+class ColumnarResults:
+    """
+    列式评估结果
+
+    数值列以numpy数组形式直接访问；字符串列在首次访问时才解码。
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        self.header = json.loads(columns["header_json"].tobytes().decode("utf-8"))
+        if self.header.get("format_version") != COLUMNAR_FORMAT_VERSION:
+            raise ValueError(f"不支持的列式结果格式版本: {self.header.get('format_version')}")
+        self._strings = {}
+
+        self.success = columns["success"]
+        self.elapsed_time = columns["elapsed_time"]
+        self.category_id = columns["category_id"]
+        self.hit_offsets = columns["hit_offsets"]
+        self.hit_path_ids = columns["hit_path_ids"]
+        self.hit_scores = columns["hit_scores"]
+        self.expected_offsets = columns["expected_offsets"]
+        self.expected_path_ids = columns["expected_path_ids"]
+
+    def __len__(self) -> int:
+        return len(self.success)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """按列名获取数值列，例如 results["total_score"]"""
+        return self.columns[name]
+
+    def strings(self, name: str) -> List[str]:
+        """获取（并缓存）解码后的字符串列: idx/query/error/path/category"""
+        if name not in self._strings:
+            self._strings[name] = _decode_strings(
+                self.columns[f"{name}_data"], self.columns[f"{name}_offsets"]
+            )
+        return self._strings[name]
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return self.header.get("meta", {})
+
+    @property
+    def summary_metrics(self) -> Dict[str, Any]:
+        return self.header.get("summary_metrics", {})
+
+    def ranked_path_ids(self, i: int) -> np.ndarray:
+        """第i个案例排序结果的路径ID"""
+        return self.hit_path_ids[self.hit_offsets[i]:self.hit_offsets[i + 1]]
+
+    def ranked_paths(self, i: int) -> List[str]:
+        """第i个案例排序结果的路径"""
+        paths = self.strings("path")
+        return [paths[p] for p in self.ranked_path_ids(i).tolist()]
+
+    def expected_paths(self, i: int) -> List[str]:
+        """第i个案例的期望路径"""
+        paths = self.strings("path")
+        ids = self.expected_path_ids[self.expected_offsets[i]:self.expected_offsets[i + 1]]
+        return [paths[p] for p in ids.tolist()]
+
+    def categories(self) -> List[str]:
+        """每个案例的类别名"""
+        names = self.strings("category")
+        return [names[c] for c in self.category_id.tolist()]
+
+    def to_detailed_results(self) -> List[Dict[str, Any]]:
+        """还原为detailed_results字典列表（仅包含列式存储中的字段）"""
+        return list(self.iter_detailed_results())
+
+    def iter_detailed_results(self) -> Iterator[Dict[str, Any]]:
+        """逐个还原detailed_results中的案例字典（仅包含列式存储中的字段）"""
+        idx = self.strings("idx")
+        queries = self.strings("query")
+        errors = self.strings("error")
+        categories = self.categories()
+        paths = self.strings("path")
+        hit_offsets = self.hit_offsets.tolist()
+        hit_path_ids = self.hit_path_ids.tolist()
+        hit_scores = self.hit_scores.tolist()
+        expected_offsets = self.expected_offsets.tolist()
+        expected_path_ids = self.expected_path_ids.tolist()
+        # 先整列转换为Python列表，避免逐个访问numpy标量
+        success = self.success.tolist()
+        elapsed_time = self.elapsed_time.tolist()
+        metrics = {name: self.columns[name].tolist() for name in METRIC_COLUMNS}
+
+        for i in range(len(self)):
+            result = {
+                "idx": idx[i] or None,
+                "query": queries[i],
+                "category": categories[i],
+                "success": bool(success[i]),
+                "elapsed_time": elapsed_time[i]
+            }
+            if result["success"]:
+                for name in METRIC_COLUMNS:
+                    result[name] = metrics[name][i]
+                result["actual_results"] = [
+                    {"path": paths[hit_path_ids[j]], "score": hit_scores[j]}
+                    for j in range(hit_offsets[i], hit_offsets[i + 1])
+                ]
+                result["expected_results"] = [
+                    {"path": paths[expected_path_ids[j]]}
+                    for j in range(expected_offsets[i], expected_offsets[i + 1])
+                ]
+            else:
+                result["error"] = errors[i]
+            yield result
+
+
+def load_columnar_results(path: str) -> ColumnarResults:
+    """
+    加载列式评估结果
+
+    Args:
+        path: NPZ文件路径
+
+    Returns:
+        ColumnarResults: 列式结果
+    """
+    # 一次性读入内存再解压，避免NpzFile对每一列重复打开文件
+    with open(path, "rb") as f:
+        buffer = io.BytesIO(f.read())
+    with np.load(buffer, allow_pickle=False) as npz:
+        columns = {name: npz[name] for name in npz.files}
+    return ColumnarResults(columns)
+
+
+def is_columnar_result(path: str) -> bool:
+    """判断文件是否为列式评估结果"""
+    return path.endswith(".npz") and zipfile.is_zipfile(path)
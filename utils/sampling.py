@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+分层抽样模块
+按类别对测试案例做确定性分层抽样，并根据抽样结果估计全量数据集的平均总分及置信区间
+"""
+
+import math
+import random
+import logging
+from collections import defaultdict
+from statistics import NormalDist
+from typing import Dict, List, Any, Optional
+
+
+def _z_value(confidence: float) -> float:
+    """获取双侧置信水平对应的正态分位数"""
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _sample_std(values: List[float]) -> float:
+    """计算样本标准差（n-1）"""
+    if len(values) < 2:
+        return 0.0
+    mean = sum(values) / len(values)
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+
+def group_by_category(test_cases: List[Dict]) -> Dict[str, List[Dict]]:
+    """按类别分组测试案例（保持数据集中的原始顺序）"""
+    groups = defaultdict(list)
+    for case in test_cases:
+        groups[case.get("category", "unknown")].append(case)
+    return dict(groups)
+
+
+def estimate_category_std(previous_results: Optional[Dict[str, Any]],
+                          default_std: float) -> Dict[str, float]:
+    """
+    从上一次的评估结果中估计各类别总分的标准差
+
+    Args:
+        previous_results: 上一次的完整评估结果（latest_result.json），可以为空
+        default_std: 无历史数据时使用的先验标准差
+
+    Returns:
+        Dict[str, float]: 类别 -> 标准差，缺失的类别由调用方回退到default_std
+    """
+    if not previous_results:
+        return {}
+
+    scores = defaultdict(list)
+    for result in previous_results.get("detailed_results", []):
+        if result.get("success", False):
+            scores[result.get("category", "unknown")].append(result.get("total_score", 0.0))
+
+    category_std = {}
+    for category, values in scores.items():
+        if len(values) >= 2:
+            # 历史标准差为0时仍保留一个较小的下限，避免该类别只分到最少样本
+            category_std[category] = max(_sample_std(values), default_std * 0.1)
+    return category_std
+
+
+def plan_stratified_sample(test_cases: List[Dict],
+                           ci_width: float,
+                           confidence: float = 0.95,
+                           prior_std: float = 0.5,
+                           category_std: Optional[Dict[str, float]] = None,
+                           min_per_category: int = 2,
+                           seed: int = 42) -> Dict[str, Any]:
+    """
+    生成分层抽样计划
+
+    使用Neyman分配: 总样本量按目标置信区间宽度（含有限总体校正）计算，
+    再按 N_h * σ_h 分配到各类别。同一数据集、同一seed总能得到相同的样本。
+
+    Args:
+        test_cases: 全部测试案例
+        ci_width: 目标置信区间总宽度（上界-下界）
+        confidence: 置信水平
+        prior_std: 各类别总分标准差的先验值（总分在0-1之间，0.5为最保守取值）
+        category_std: 各类别标准差的估计值，覆盖prior_std
+        min_per_category: 每个类别最少抽取的案例数
+        seed: 随机种子
+
+    Returns:
+        Dict: 抽样计划，包含抽中的test_cases与各类别的总体/样本数量
+    """
+    if ci_width <= 0:
+        raise ValueError("置信区间宽度必须大于0")
+
+    groups = group_by_category(test_cases)
+    population = len(test_cases)
+    category_std = category_std or {}
+    stds = {c: category_std.get(c, prior_std) for c in groups}
+
+    z = _z_value(confidence)
+    variance_target = (ci_width / 2 / z) ** 2
+    weighted_std = sum(len(cases) / population * stds[c] for c, cases in groups.items())
+    weighted_var = sum(len(cases) / population * stds[c] ** 2 for c, cases in groups.items())
+
+    if weighted_std > 0:
+        total_n = weighted_std ** 2 / (variance_target + weighted_var / population)
+    else:
+        total_n = 0
+
+    # 各类别样本数量
+    neyman_base = sum(len(cases) * stds[c] for c, cases in groups.items())
+    allocation = {}
+    for category, cases in groups.items():
+        size = len(cases)
+        if neyman_base > 0:
+            n_h = math.ceil(total_n * size * stds[category] / neyman_base)
+        else:
+            n_h = 0
+        allocation[category] = min(size, max(n_h, min_per_category))
+
+    # 确定性抽样：每个类别使用独立的、由seed和类别名派生的随机数生成器
+    selected_ids = set()
+    for category in sorted(groups):
+        cases = groups[category]
+        rng = random.Random(f"{seed}:{category}")
+        for i in rng.sample(range(len(cases)), allocation[category]):
+            selected_ids.add(id(cases[i]))
+
+    sampled_cases = [case for case in test_cases if id(case) in selected_ids]
+
+    return {
+        "seed": seed,
+        "confidence": confidence,
+        "target_ci_width": ci_width,
+        "population_size": population,
+        "sample_size": len(sampled_cases),
+        "strata": {
+            category: {
+                "population": len(cases),
+                "sample": allocation[category],
+                "assumed_std": stds[category]
+            }
+            for category, cases in groups.items()
+        },
+        "test_cases": sampled_cases
+    }
+
+
+def estimate_stratified_score(detailed_results: List[Dict],
+                              plan: Dict[str, Any],
+                              metric: str = "total_score") -> Dict[str, Any]:
+    """
+    根据分层样本估计全量数据集上的平均指标及置信区间
+
+    Args:
+        detailed_results: 样本的详细评估结果
+        plan: plan_stratified_sample返回的抽样计划
+        metric: 要估计的单案例指标字段
+
+    Returns:
+        Dict: 估计值、标准误及置信区间上下界
+    """
+    logger = logging.getLogger(__name__)
+
+    scores = defaultdict(list)
+    for result in detailed_results:
+        if result.get("success", False):
+            scores[result.get("category", "unknown")].append(result.get(metric, 0.0))
+
+    strata = plan["strata"]
+    # 只有成功评估的类别参与估计，权重在这些类别间重新归一化
+    covered = {c: info for c, info in strata.items() if scores.get(c)}
+    if not covered:
+        return {"error": "没有成功的样本，无法估计全量分数"}
+
+    missing = sorted(set(strata) - set(covered))
+    if missing:
+        logger.warning(f"以下类别没有成功的样本，估计值不包含这些类别: {', '.join(missing)}")
+
+    covered_population = sum(info["population"] for info in covered.values())
+    estimate = 0.0
+    variance = 0.0
+    per_category = {}
+    for category, info in covered.items():
+        values = scores[category]
+        n_h = len(values)
+        N_h = info["population"]
+        weight = N_h / covered_population
+        mean_h = sum(values) / n_h
+        # 只有一个成功样本时无法估计标准差，使用抽样计划中假设的标准差（历史估计或先验值），避免置信区间过窄
+        std_from_prior = n_h < 2
+        std_h = info["assumed_std"] if std_from_prior else _sample_std(values)
+        fpc = 1 - n_h / N_h if N_h > 0 else 0.0
+
+        estimate += weight * mean_h
+        variance += weight ** 2 * max(fpc, 0.0) * std_h ** 2 / n_h
+        per_category[category] = {
+            "population": N_h,
+            "sampled": n_h,
+            "mean": mean_h,
+            "std": std_h,
+            "std_from_prior": std_from_prior
+        }
+
+    z = _z_value(plan["confidence"])
+    std_error = math.sqrt(variance)
+    lower = max(0.0, estimate - z * std_error)
+    upper = min(1.0, estimate + z * std_error)
+
+    return {
+        "metric": metric,
+        "estimate": estimate,
+        "std_error": std_error,
+        "confidence": plan["confidence"],
+        "lower": lower,
+        "upper": upper,
+        "ci_width": upper - lower,
+        "target_ci_width": plan["target_ci_width"],
+        "seed": plan["seed"],
+        "population_size": plan["population_size"],
+        "sample_size": plan["sample_size"],
+        "missing_categories": missing,
+        "per_category": per_category
+    }
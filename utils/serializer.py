@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+评估结果JSON序列化模块
+优先使用更快的JSON库（orjson / msgspec），不可用时回退到标准库json；
+大列表逐项流式写出，并通过临时文件 + 重命名实现原子写入
+"""
+
+import importlib.util
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+# 逐项流式写出的顶层列表字段
+STREAMED_KEYS = ("detailed_results",)
+
+
+def _default(obj: Any) -> Any:
+    """处理紧凑记录（utils.records）、numpy标量等非标准JSON类型"""
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+
+class _JsonBackend:
+    """标准库json后端"""
+
+    name = "json"
+    # 支持的缩进，None表示任意缩进
+    indents = None
+
+    def __init__(self, indent: Optional[int]):
+        self.indent = indent
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=self.indent, default=_default).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class _OrjsonBackend(_JsonBackend):
+    """orjson后端（只支持2空格缩进或紧凑输出）"""
+
+    name = "orjson"
+    indents = (None, 2)
+
+    def __init__(self, indent: Optional[int]):
+        # 流式写出按 indent 补齐外层缩进，与orjson的2空格缩进不一致时文件缩进会混杂
+        if indent not in self.indents:
+            raise ValueError(f"orjson后端只支持2空格缩进或紧凑输出 (indent={indent!r})，请使用json后端")
+        super().__init__(indent)
+        import orjson
+        self.orjson = orjson
+        self.option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            self.option |= orjson.OPT_INDENT_2
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.orjson.dumps(obj, default=_default, option=self.option)
+
+    def loads(self, data: bytes) -> Any:
+        return self.orjson.loads(data)
+
+
+class _MsgspecBackend(_JsonBackend):
+    """msgspec后端（不支持缩进，输出紧凑JSON）"""
+
+    name = "msgspec"
+    # 明确指定时忽略缩进；auto只在要求紧凑输出时选择
+    indents = (None,)
+
+    def __init__(self, indent: Optional[int]):
+        super().__init__(None)
+        import msgspec
+        self.decode_error = msgspec.DecodeError
+        self.encoder = msgspec.json.Encoder(enc_hook=_default)
+        self.decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.encoder.encode(obj)
+
+    def loads(self, data: bytes) -> Any:
+        try:
+            return self.decoder.decode(data)
+        except self.decode_error as e:
+            # 与json/orjson保持一致，解析失败统一抛出ValueError
+            raise ValueError(str(e)) from e
+
+
+def _installed(module: str) -> bool:
+    """检查可选依赖是否已安装（不实际导入，避免拖慢启动）"""
+    return importlib.util.find_spec(module) is not None
+
+
+# 可选的第三方库在首次使用对应后端时才导入
+_BACKENDS = {
+    "orjson": (_OrjsonBackend, lambda: _installed("orjson")),
+    "msgspec": (_MsgspecBackend, lambda: _installed("msgspec")),
+    "json": (_JsonBackend, lambda: True)
+}
+
+
+def get_backend(name: str = "auto", indent: Optional[int] = 2) -> _JsonBackend:
+    """
+    获取序列化后端
+
+    Args:
+        name: auto / orjson / msgspec / json，auto按上述顺序选择第一个可用且支持该缩进的
+        indent: 缩进空格数，None为紧凑输出
+
+    Returns:
+        序列化后端实例
+
+    Raises:
+        ValueError: 未知的后端，或指定的后端不支持该缩进
+    """
+    if name == "auto":
+        for candidate in ("orjson", "msgspec", "json"):
+            backend_class, available = _BACKENDS[candidate]
+            if (backend_class.indents is None or indent in backend_class.indents) and available():
+                return backend_class(indent)
+
+    if name not in _BACKENDS:
+        raise ValueError(f"未知的序列化后端: {name}")
+
+    backend_class, available = _BACKENDS[name]
+    if not available():
+        raise ImportError(f"序列化后端 {name} 未安装")
+    return backend_class(indent)
+
+
+def to_plain(obj: Any) -> Any:
+    """紧凑记录在编码前直接转换为字典，避免每个对象都走一次编码器的default回调"""
+    return obj.to_dict() if hasattr(obj, "to_dict") else obj
+
+
+def _indent_block(data: bytes, pad: bytes) -> bytes:
+    """给已编码JSON的每一行（首行除外）增加缩进；JSON字符串中不会出现裸换行，因此可以安全替换"""
+    return data.replace(b"\n", b"\n" + pad) if pad else data
+
+
+def _write_streaming(f, obj: Dict[str, Any], backend: _JsonBackend) -> None:
+    """按顶层字段逐个写出，STREAMED_KEYS中的列表逐项编码，避免构造完整的大字符串"""
+    indent = backend.indent
+    newline = b"\n" if indent else b""
+    pad = b" " * indent if indent else b""
+    separator = b": " if indent else b":"
+
+    f.write(b"{")
+    for i, (key, value) in enumerate(obj.items()):
+        f.write((b"," if i else b"") + newline + pad)
+        f.write(backend.dumps(str(key)) + separator)
+
+        if key in STREAMED_KEYS and isinstance(value, list) and value:
+            item_pad = pad * 2
+            f.write(b"[")
+            for j, item in enumerate(value):
+                f.write((b"," if j else b"") + newline + item_pad)
+                f.write(_indent_block(backend.dumps(to_plain(item)), item_pad))
+            f.write(newline + pad + b"]")
+        else:
+            f.write(_indent_block(backend.dumps(value), pad))
+    f.write(newline + b"}" + newline)
+
+
+def write_json_atomic(obj: Dict[str, Any], output_path: str,
+                      backend: str = "auto", indent: Optional[int] = 2) -> Dict[str, Any]:
+    """
+    原子地将结果写入JSON文件
+
+    先写入同目录下的临时文件，fsync后再用os.replace替换目标文件，
+    写入过程中崩溃不会损坏已有的结果文件。
+
+    Args:
+        obj: 要写入的字典（顶层必须是dict）
+        output_path: 输出文件路径
+        backend: 序列化后端名称
+        indent: 缩进空格数
+
+    Returns:
+        Dict: 序列化统计 {"backend", "serialize_seconds", "file_bytes"}
+    """
+    encoder = get_backend(backend, indent)
+    output_dir = os.path.dirname(output_path) or "."
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    fd, tmp_path = tempfile.mkstemp(
+        dir=output_dir, prefix=f".{os.path.basename(output_path)}.", suffix=".tmp"
+    )
+    try:
+        # mkstemp创建的文件权限为0600，改为与普通open()一致的权限
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+
+        with os.fdopen(fd, "wb", buffering=1024 * 1024) as f:
+            _write_streaming(f, obj, encoder)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {
+        "backend": encoder.name,
+        "serialize_seconds": time.perf_counter() - start,
+        "file_bytes": os.path.getsize(output_path)
+    }
+
+
+def load_json(path: str, backend: str = "auto") -> Any:
+    """
+    使用指定后端读取JSON文件
+
+    Args:
+        path: 文件路径
+        backend: 序列化后端名称
+
+    Returns:
+        解析后的对象
+    """
+    with open(path, "rb") as f:
+        return get_backend(backend).loads(f.read())
+
+
+class _JsonStreamReader:
+    """分块读取JSON文本的游标，raw_decode 遇到块尾不完整的值时自动读入更多内容"""
+
+    _WHITESPACE = " \t\r\n"
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """读入下一块并丢弃已消费的部分，文件已读完时返回False"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符（文件结束时为空字符串）"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self._WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"JSON格式错误: 期望 {char!r}，实际为 {self.peek()!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """解析下一个完整的JSON值"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # 数字可能恰好在块尾被截断，读入下一块确认后再返回
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_list(path: str, key: str = "detailed_results", chunk_size: int = 1024 * 1024):
+    """
+    逐项读取JSON文件顶层对象中某个列表字段，不把整个文件读入内存
+
+    其他顶层字段会被完整解析后丢弃，适用于 write_json_atomic 写出的结果文件
+    （detailed_results 之外的字段都很小）
+
+    Args:
+        path: 文件路径
+        key: 顶层列表字段名
+        chunk_size: 每次读取的字符数
+
+    Yields:
+        列表中的每一项
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _JsonStreamReader(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            name = reader.value()
+            reader.expect(":")
+            if name == key and reader.peek() == "[":
+                reader.expect("[")
+                if reader.peek() == "]":
+                    return
+                while True:
+                    yield reader.value()
+                    if reader.peek() == "]":
+                        return
+                    reader.expect(",")
+            reader.value()
+            if reader.peek() == "}":
+                return
+            reader.expect(",")
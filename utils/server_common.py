@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+服务共用工具模块
+playground服务和参数扫描共用的小工具：合并同时进行的相同请求，把请求中的相对路径限制在根目录内；
+不依赖HTTP服务和评估模块，参数扫描导入时不会加载playground的其他部分
+"""
+
+import os
+import threading
+from typing import Callable, Any, Optional, Tuple
+
+
+def resolve_under(root: str, relative_path: str) -> Optional[str]:
+    """
+    把相对路径解析为root目录下的真实路径
+
+    Args:
+        root: 根目录
+        relative_path: 请求中的相对路径（可以以/开头）
+
+    Returns:
+        Optional[str]: 绝对路径；路径越出根目录（../、绝对路径、符号链接）时为None
+    """
+    root = os.path.realpath(root)
+    if "\x00" in relative_path:
+        return None
+    path = os.path.realpath(os.path.join(root, relative_path.lstrip("/\\")))
+    if path != root and not path.startswith(root + os.sep):
+        return None
+    return path
+
+
+class _Call:
+    """进行中的一次上游请求"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """合并同时进行的相同请求：第一个请求执行，其余请求等待并共享它的结果"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def run(self, key: str, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行或等待相同key的请求
+
+        Args:
+            key: 请求的规范化标识
+            function: 实际发起请求的函数
+
+        Returns:
+            Tuple: (结果, 是否复用了其他线程的请求)；function抛出的异常会传给所有等待者
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
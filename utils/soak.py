@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+浸泡测试模块
+在配置的时长内以固定速率循环请求数据集中的查询，按时间窗口统计延迟分位数、错误率和平均总分，
+并与基线窗口比较，发现延迟上升、相同查询的分数变化和错误率上升等漂移。
+
+客户端内存与运行时长无关：每个窗口只保留流式延迟草图和计数器，窗口结束后写出并丢弃；
+相同查询的参考分数每个案例只保留一个，最近的告警只保留固定数量
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional
+
+from utils.latency import LatencySketch
+from utils.multi_target import RateLimiter
+
+# 每个窗口分别计数的错误类型数上限
+MAX_ERROR_TYPES = 20
+
+
+def parse_duration(value: str) -> float:
+    """
+    解析时长：纯数字为秒，也可以带单位 s / m / h / d，例如 90、30m、4h、2d
+
+    Raises:
+        ValueError: 格式无效
+    """
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    text = str(value).strip().lower()
+    if text and text[-1] in units:
+        seconds = float(text[:-1]) * units[text[-1]]
+    else:
+        seconds = float(text)
+    if seconds <= 0:
+        raise ValueError(f"时长必须大于0: {value}")
+    return seconds
+
+
+class SoakWindow:
+    """一个时间窗口的统计"""
+
+    def __init__(self, number: int, start: float, relative_accuracy: float = 0.01):
+        """
+        Args:
+            number: 窗口序号（从1开始）
+            start: 窗口开始时间（time.time()）
+            relative_accuracy: 延迟分位数的相对误差
+        """
+        self.number = number
+        self.start = start
+        self.latency = LatencySketch(relative_accuracy)
+        self.requests = 0
+        self.errors = 0
+        self.error_types = {}
+        self.score_sum = 0.0
+        self.scored = 0
+        self.compared = 0
+        self.changed = 0
+
+    def summary(self, end: float) -> Dict[str, Any]:
+        """窗口结束时的汇总"""
+        seconds = max(end - self.start, 1e-9)
+        return {
+            "window": self.number,
+            "start_time": datetime.fromtimestamp(self.start).isoformat(timespec="seconds"),
+            "end_time": datetime.fromtimestamp(end).isoformat(timespec="seconds"),
+            "seconds": seconds,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_types": dict(self.error_types),
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "request_rate": self.requests / seconds,
+            "avg_total_score": self.score_sum / self.scored if self.scored else None,
+            "latency": self.latency.summary(),
+            "compared_cases": self.compared,
+            "changed_scores": self.changed
+        }
+
+
+class DriftDetector:
+    """
+    与基线比较各窗口
+
+    跳过前 warmup_windows 个窗口（服务缓存预热），之后 baseline_windows 个窗口合并为基线；
+    基线确定后的每个窗口检查：p90延迟超过基线的 latency_ratio 倍、错误率比基线高出 error_rate_increase、
+    相同查询的分数与首次结果不同的比例超过 score_change_rate
+    """
+
+    def __init__(self, config: Dict[str, Any], relative_accuracy: float = 0.01):
+        """
+        Args:
+            config: SOAK_CONFIG["drift"]
+            relative_accuracy: 延迟分位数的相对误差
+        """
+        self.warmup_windows = config.get("warmup_windows", 1)
+        self.baseline_windows = config.get("baseline_windows", 2)
+        self.latency_ratio = config.get("latency_ratio", 1.5)
+        self.error_rate_increase = config.get("error_rate_increase", 0.05)
+        self.score_change_rate = config.get("score_change_rate", 0.0)
+        self._sketch = LatencySketch(relative_accuracy)
+        self._requests = 0
+        self._errors = 0
+        self._windows = 0
+        self.baseline = None
+
+    def check(self, window: SoakWindow, summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        检查一个结束的窗口
+
+        Args:
+            window: 窗口（基线阶段合并其延迟草图）
+            summary: 窗口汇总
+
+        Returns:
+            List[Dict]: 告警 {"type", "message", "value", "baseline"}
+        """
+        self._windows += 1
+        if self._windows <= self.warmup_windows:
+            return []
+        if self.baseline is None:
+            self._sketch.merge(window.latency)
+            self._requests += window.requests
+            self._errors += window.errors
+            if self._windows >= self.warmup_windows + self.baseline_windows:
+                self.baseline = {
+                    "latency_p90": self._sketch.quantile(0.9),
+                    "error_rate": self._errors / self._requests if self._requests else 0.0
+                }
+            return []
+
+        alerts = []
+        p90 = summary["latency"]["p90"]
+        baseline_p90 = self.baseline["latency_p90"]
+        if p90 is not None and baseline_p90 and p90 > baseline_p90 * self.latency_ratio:
+            alerts.append({
+                "type": "latency_creep",
+                "message": f"p90延迟 {p90 * 1000:.0f}ms 超过基线 {baseline_p90 * 1000:.0f}ms 的 {self.latency_ratio} 倍",
+                "value": p90,
+                "baseline": baseline_p90
+            })
+        error_rate = summary["error_rate"]
+        if summary["requests"] and error_rate > self.baseline["error_rate"] + self.error_rate_increase:
+            alerts.append({
+                "type": "error_rate",
+                "message": f"错误率 {error_rate:.1%} 比基线 {self.baseline['error_rate']:.1%} 高出超过 "
+                           f"{self.error_rate_increase:.1%}",
+                "value": error_rate,
+                "baseline": self.baseline["error_rate"]
+            })
+        if summary["compared_cases"]:
+            change_rate = summary["changed_scores"] / summary["compared_cases"]
+            if change_rate > self.score_change_rate:
+                alerts.append({
+                    "type": "score_change",
+                    "message": f"{summary['changed_scores']}/{summary['compared_cases']} 个重复查询的总分与首次结果不同",
+                    "value": change_rate,
+                    "baseline": self.score_change_rate
+                })
+        return alerts
+
+
+class SoakRunner:
+    """以固定速率循环请求测试案例，按窗口统计并检测漂移"""
+
+    def __init__(self, client, metrics, test_cases: List[Dict], config: Dict[str, Any],
+                 relative_accuracy: float = 0.01):
+        """
+        Args:
+            client: utils.api_client.CodeSearchAPIClient
+            metrics: utils.metrics.EvaluationMetrics
+            test_cases: 循环请求的测试案例
+            config: SOAK_CONFIG（rate / concurrency / window_seconds / score_tolerance / max_alerts / drift）
+            relative_accuracy: 延迟分位数的相对误差
+        """
+        self.client = client
+        self.metrics = metrics
+        self.test_cases = test_cases
+        self.rate = config["rate"]
+        self.concurrency = config.get("concurrency", 2)
+        self.window_seconds = config["window_seconds"]
+        self.score_tolerance = config.get("score_tolerance", 1e-9)
+        self.relative_accuracy = relative_accuracy
+        self.detector = DriftDetector(config.get("drift", {}), relative_accuracy)
+        self.logger = logging.getLogger(__name__)
+
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._cases = itertools.cycle(range(len(test_cases)))
+        # 每个案例首次成功请求的总分，作为相同查询的参考分数
+        self._reference = {}
+        self._window = None
+        self.overall = LatencySketch(relative_accuracy)
+        self.totals = {"requests": 0, "errors": 0, "windows": 0, "alerts": 0}
+        self.recent_alerts = deque(maxlen=config.get("max_alerts", 50))
+
+    def _next_case(self):
+        with self._lock:
+            return next(self._cases)
+
+    def _record(self, case_no: int, elapsed: float, error: Optional[str], score: Optional[float]) -> None:
+        with self._lock:
+            window = self._window
+            window.requests += 1
+            if error is not None:
+                window.errors += 1
+                # 错误类型数量有上限，异常信息各不相同时也不会无限增长
+                if error not in window.error_types and len(window.error_types) >= MAX_ERROR_TYPES:
+                    error = "其他错误"
+                window.error_types[error] = window.error_types.get(error, 0) + 1
+                return
+            window.latency.add(elapsed)
+            window.score_sum += score
+            window.scored += 1
+            reference = self._reference.get(case_no)
+            if reference is None:
+                self._reference[case_no] = score
+            else:
+                window.compared += 1
+                if abs(score - reference) > self.score_tolerance:
+                    window.changed += 1
+
+    def _worker(self, limiter: RateLimiter) -> None:
+        while not self.stop_event.is_set():
+            limiter.acquire(self.stop_event)
+            if self.stop_event.is_set():
+                break
+            case_no = self._next_case()
+            case = self.test_cases[case_no]
+            start = time.time()
+            try:
+                response = self.client.search_code(case["query"])
+            except Exception as e:
+                response = {"error": str(e)}
+            elapsed = time.time() - start
+            if "error" in response:
+                self._record(case_no, elapsed, response["error"], None)
+                continue
+            metrics = self.metrics.calculate_new_framework_metrics(
+                actual_results=response.get("results", []),
+                expected_results=case["expected_results"]
+            )
+            self._record(case_no, elapsed, None, metrics["total_score"])
+
+    def _close_window(self, now: float, on_window: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+        with self._lock:
+            window = self._window
+            self._window = SoakWindow(window.number + 1, now, self.relative_accuracy)
+        summary = window.summary(now)
+        summary["drift"] = self.detector.check(window, summary)
+        self.overall.merge(window.latency)
+        self.totals["requests"] += window.requests
+        self.totals["errors"] += window.errors
+        self.totals["windows"] += 1
+        self.totals["alerts"] += len(summary["drift"])
+        for alert in summary["drift"]:
+            self.recent_alerts.append(dict(alert, window=window.number))
+        if on_window is not None:
+            on_window(summary)
+
+    def run(self, duration: float,
+            on_window: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        运行浸泡测试，直到达到时长或调用 stop()
+
+        Args:
+            duration: 运行时长（秒）
+            on_window: 每个窗口结束时调用 on_window(窗口汇总，含 "drift")
+
+        Returns:
+            Dict: {"duration", "windows", "requests", "errors", "error_rate", "latency", "baseline",
+                   "alerts", "recent_alerts", "tracked_cases"}
+        """
+        start = time.time()
+        self._window = SoakWindow(1, start, self.relative_accuracy)
+        limiter = RateLimiter(self.rate)
+        workers = [
+            threading.Thread(target=self._worker, args=(limiter,), name=f"soak-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+
+        deadline = start + duration
+        window_end = start + self.window_seconds
+        try:
+            while not self.stop_event.is_set():
+                now = time.time()
+                if now >= deadline:
+                    break
+                if now >= window_end:
+                    self._close_window(now, on_window)
+                    window_end += self.window_seconds
+                    continue
+                self.stop_event.wait(min(1.0, window_end - now, deadline - now))
+        except KeyboardInterrupt:
+            self.logger.warning("浸泡测试被中断，写出最后一个窗口后结束")
+        finally:
+            self.stop_event.set()
+            for worker in workers:
+                worker.join()
+            # 最后一个（可能不完整的）窗口
+            end = time.time()
+            if self._window.requests:
+                self._close_window(end, on_window)
+
+        return {
+            "duration": end - start,
+            "windows": self.totals["windows"],
+            "requests": self.totals["requests"],
+            "errors": self.totals["errors"],
+            "error_rate": self.totals["errors"] / self.totals["requests"] if self.totals["requests"] else 0.0,
+            "latency": self.overall.summary(),
+            "baseline": self.detector.baseline,
+            "alerts": self.totals["alerts"],
+            "recent_alerts": list(self.recent_alerts),
+            "tracked_cases": len(self._reference)
+        }
+
+    def stop(self) -> None:
+        """停止浸泡测试（当前请求完成后结束）"""
+        self.stop_event.set()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+源码文件读取模块
+playground代码查看器按检索结果的路径读取本地代码库中的文件：
+路径限制在配置的源码目录内，大文件用mmap映射而不整体读入，
+行偏移索引按需逐步建立，最近查看的文件保存在LRU缓存中，数MB的生成代码也能立即打开首屏
+"""
+
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from utils.server_common import resolve_under
+
+# 判断二进制文件时检查的前缀字节数
+_BINARY_SNIFF_BYTES = 8192
+# 统计总行数时每次计数的块大小
+_COUNT_CHUNK = 1 << 20
+
+
+class BinaryFileError(ValueError):
+    """文件不是文本文件"""
+
+
+class SourceFile:
+    """
+    一个已打开的源码文件
+
+    小文件整体读入内存，大文件用只读mmap映射（由操作系统按页加载）；
+    行起始偏移保存在紧凑的 array 中，只扫描到请求的最后一行为止。
+    """
+
+    def __init__(self, path: str, mmap_threshold: int = 1 << 20):
+        """
+        Args:
+            path: 文件绝对路径
+            mmap_threshold: 达到该字节数的文件使用mmap
+        """
+        self.path = path
+        stat = os.stat(path)
+        self.stamp = (stat.st_mtime_ns, stat.st_size)
+        self.size = stat.st_size
+        with open(path, "rb") as f:
+            if self.size >= mmap_threshold:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffer = f.read()
+        if b"\x00" in self.buffer[:_BINARY_SNIFF_BYTES]:
+            raise BinaryFileError(f"不是文本文件: {path}")
+        self.mapped = isinstance(self.buffer, mmap.mmap)
+        self._line_starts = array("q", [0])
+        self._scanned = 0 if self.size else None  # 下一次扫描换行符的起点，None表示已扫描到文件末尾
+        self._total_lines = None
+        self._lock = threading.Lock()
+
+    def _index_to(self, line: int) -> None:
+        """建立行偏移索引，直到第line行（从0开始）的起始位置或文件末尾"""
+        starts = self._line_starts
+        buffer = self.buffer
+        while len(starts) <= line and self._scanned is not None:
+            newline = buffer.find(b"\n", self._scanned)
+            if newline < 0 or newline + 1 >= self.size:
+                self._scanned = None
+                break
+            starts.append(newline + 1)
+            self._scanned = newline + 1
+
+    @property
+    def total_lines(self) -> int:
+        """总行数（按块计数换行符，不建立完整索引）"""
+        if self._total_lines is None:
+            if self.size == 0:
+                self._total_lines = 0
+            else:
+                count = 0
+                for offset in range(0, self.size, _COUNT_CHUNK):
+                    count += self.buffer[offset:offset + _COUNT_CHUNK].count(b"\n")
+                # 最后一行没有换行符时也算一行
+                self._total_lines = count + (0 if self.buffer[self.size - 1:self.size] == b"\n" else 1)
+        return self._total_lines
+
+    def line_range(self, start: int, end: int) -> Tuple[str, int, int]:
+        """
+        读取行范围
+
+        Args:
+            start: 起始行号（从1开始）
+            end: 结束行号（包含）
+
+        Returns:
+            Tuple: (文本, 实际起始行号, 实际结束行号)；超出文件末尾时截断
+        """
+        start = max(1, start)
+        end = max(start, end)
+        with self._lock:
+            self._index_to(end)
+            starts = self._line_starts
+            if start > len(starts) or self.size == 0:
+                return "", start, start - 1
+            begin = starts[start - 1]
+            stop = starts[end] if end < len(starts) else self.size
+            end = min(end, len(starts))
+        return self.buffer[begin:stop].decode("utf-8", errors="replace"), start, end
+
+    def byte_range(self, offset: int, length: int) -> bytes:
+        """读取字节范围（超出文件末尾时截断）"""
+        offset = max(0, offset)
+        return self.buffer[offset:offset + max(0, length)]
+
+
+class SourceFileCache:
+    """最近查看的源码文件LRU缓存；文件修改时间或大小变化时重新打开"""
+
+    def __init__(self, root: str, max_files: int = 32, mmap_threshold: int = 1 << 20):
+        """
+        Args:
+            root: 被检索项目的本地代码目录
+            max_files: 缓存的文件数
+            mmap_threshold: 达到该字节数的文件使用mmap
+        """
+        self.root = os.path.realpath(root)
+        self.max_files = max_files
+        self.mmap_threshold = mmap_threshold
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def open(self, relative_path: str) -> SourceFile:
+        """
+        打开（或从缓存取出）源码文件
+
+        Args:
+            relative_path: 检索结果中的文件路径（相对于源码目录）
+
+        Returns:
+            SourceFile: 已打开的文件
+
+        Raises:
+            PermissionError: 路径越出源码目录
+            FileNotFoundError: 文件不存在
+            BinaryFileError: 不是文本文件
+        """
+        path = resolve_under(self.root, relative_path)
+        if path is None:
+            raise PermissionError(f"路径不在源码目录内: {relative_path}")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"文件不存在: {relative_path}")
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached.stamp == (stat.st_mtime_ns, stat.st_size):
+                self._files.move_to_end(path)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        try:
+            source = SourceFile(path, self.mmap_threshold)
+        except BinaryFileError:
+            raise BinaryFileError(f"不是文本文件: {relative_path}") from None
+        with self._lock:
+            self._files[path] = source
+            self._files.move_to_end(path)
+            # 淘汰的文件不主动关闭mmap：其他线程可能还在读取，最后一个引用释放时自动关闭
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+        return source
+
+    def read_lines(self, relative_path: str, start: int = 1, end: Optional[int] = None,
+                   max_lines: int = 500) -> Dict[str, Any]:
+        """
+        读取文件的行范围
+
+        Args:
+            relative_path: 文件路径
+            start: 起始行号（从1开始）
+            end: 结束行号（包含），默认读取max_lines行
+            max_lines: 单次最多返回的行数
+
+        Returns:
+            Dict: {"path", "size", "total_lines", "start_line", "end_line", "has_more", "content"}
+        """
+        source = self.open(relative_path)
+        start = max(1, start)
+        if end is None or end - start + 1 > max_lines:
+            end = start + max_lines - 1
+        content, start, end = source.line_range(start, end)
+        total_lines = source.total_lines
+        return {
+            "path": relative_path,
+            "size": source.size,
+            "total_lines": total_lines,
+            "start_line": start,
+            "end_line": end,
+            "has_more": end < total_lines,
+            "content": content
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            files = list(self._files.values())
+        return {
+            "root": self.root,
+            "cached_files": len(files),
+            "mapped_files": sum(1 for source in files if source.mapped),
+            "hits": self.hits,
+            "misses": self.misses
+        }
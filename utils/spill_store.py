@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+检索结果溢写存储
+每个案例评分完成后立即把检索结果列表追加写入磁盘文件，内存中只保留偏移量和长度；
+报告、结果保存和问题查询分析需要完整列表时再按偏移量读回，
+评估器的常驻内存因此不随数据集规模增长
+"""
+
+import os
+import threading
+from typing import Dict, List, Any, Tuple
+
+from utils.serializer import get_backend
+
+
+class SpilledHits:
+    """
+    已溢写到磁盘的一个案例的检索结果
+
+    与 utils.records.HitColumns 接口一致（len()、paths、scores、to_list()），
+    每次访问都从溢写文件读回，不在内存中缓存。
+    """
+
+    __slots__ = ("store", "offset", "length", "count")
+
+    def __init__(self, store: "SpillStore", offset: int, length: int, count: int):
+        self.store = store
+        self.offset = offset
+        self.length = length
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def paths(self) -> Tuple[str, ...]:
+        return tuple(hit.get("path", "") for hit in self.to_list())
+
+    @property
+    def scores(self) -> Tuple[Any, ...]:
+        return tuple(hit.get("score") for hit in self.to_list())
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """从溢写文件读回检索结果字典列表"""
+        return self.store.read(self.offset, self.length)
+
+
+class SpillStore:
+    """
+    追加写入的检索结果文件
+
+    每条记录是一个紧凑JSON数组，按偏移量随机读取；写入由锁串行化，
+    读取使用 os.pread，不移动文件位置，流水线写出线程读取时评分线程可以继续追加。
+    """
+
+    def __init__(self, path: str, backend: str = "auto"):
+        """
+        Args:
+            path: 溢写文件路径（已存在时覆盖）
+            backend: 序列化后端，见 utils.serializer.get_backend
+        """
+        self.path = path
+        self.backend = get_backend(backend, indent=None)
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def spill(self, hits: List[Dict[str, Any]]) -> SpilledHits:
+        """
+        写入一个案例的检索结果
+
+        Args:
+            hits: API返回的检索结果列表
+
+        Returns:
+            SpilledHits: 读回该列表用的句柄
+        """
+        data = self.backend.dumps(hits)
+        with self._lock:
+            offset = self._size
+            # 直接写入文件描述符，不经过用户态缓冲，写入后立即对 pread 可见
+            written = os.pwrite(self._fd, data, offset)
+            while written < len(data):
+                written += os.pwrite(self._fd, data[written:], offset + written)
+            self._size += len(data)
+            self.records += 1
+        return SpilledHits(self, offset, len(data), len(hits))
+
+    def read(self, offset: int, length: int) -> List[Dict[str, Any]]:
+        """按偏移量读回一个案例的检索结果"""
+        data = os.pread(self._fd, length, offset)
+        if len(data) != length:
+            raise IOError(f"溢写文件 {self.path} 在偏移 {offset} 处数据不完整")
+        return self.backend.loads(data)
+
+    @property
+    def size(self) -> int:
+        """已写入的字节数"""
+        return self._size
+
+    def close(self, remove: bool = True) -> None:
+        """
+        关闭溢写文件，之后不能再读回其中的检索结果
+
+        Args:
+            remove: 是否删除文件
+        """
+        if self._fd is None:
+            return
+        os.close(self._fd)
+        self._fd = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+参数扫描模块
+对 method × rank_method × limit × project_id 的所有组合分别评估同一批测试案例：
+各组合并行执行，共享一个全局请求预算（同时进行的上游请求数和总请求数上限），
+完全相同的请求（同一查询和相同参数）只请求一次，响应连同当时测得的延迟保存在共享缓存中
+（可持久化到文件，重复扫描时直接复用），最后输出质量-延迟对比表和帕累托前沿
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from utils.latency import LatencySketch
+from utils.server_common import RequestCoalescer
+
+# 扫描的请求参数（与检索接口的请求字段同名）
+SWEEP_PARAMETERS = ("method", "rank_method", "limit", "project_id")
+
+# 对比表中的平均分字段
+SCORE_FIELDS = ("total_score", "relevance", "completeness", "usability")
+
+
+def expand_grid(grid: Dict[str, List[Any]], defaults: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    展开参数网格
+
+    Args:
+        grid: 参数 -> 取值列表，未给出或为空的参数使用defaults中的值
+        defaults: 默认参数（API_CONFIG）
+
+    Returns:
+        List[Dict]: 所有组合（按参数顺序的笛卡尔积，重复的取值只保留一次）
+    """
+    axes = []
+    for name in SWEEP_PARAMETERS:
+        values = list(dict.fromkeys(grid.get(name) or [defaults.get(name)]))
+        axes.append(values)
+    return [dict(zip(SWEEP_PARAMETERS, values)) for values in itertools.product(*axes)]
+
+
+def upstream_identity(api_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    检索服务的标识：服务地址（配置了 base_urls 时为所有副本地址）和接口路径
+
+    Args:
+        api_config: API配置（API_CONFIG）
+
+    Returns:
+        Dict: {"servers", "endpoint"}
+    """
+    return {
+        "servers": sorted(api_config.get("base_urls") or [api_config.get("base_url")]),
+        "endpoint": api_config.get("endpoint")
+    }
+
+
+def request_key(query: str, params: Dict[str, Any], upstream: Dict[str, Any]) -> str:
+    """
+    请求的规范化标识：检索服务、查询文本和扫描参数（数值统一为字符串，"10" 与 10 视为相同）
+
+    缓存键包含服务地址和接口路径，持久化的缓存不会把一个服务的响应用于另一个服务
+
+    Args:
+        query: 查询文本
+        params: 扫描参数
+        upstream: upstream_identity() 的返回值
+    """
+    payload = {"q": query, "upstream": upstream}
+    payload.update({name: str(params.get(name)) for name in SWEEP_PARAMETERS})
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class BudgetExceeded(Exception):
+    """总请求数已达到预算"""
+
+
+class RequestBudget:
+    """所有组合共享的请求预算：同时进行的上游请求数，以及可选的总请求数上限"""
+
+    def __init__(self, max_concurrency: int = 4, max_requests: Optional[int] = None):
+        """
+        Args:
+            max_concurrency: 同时进行的上游请求数上限
+            max_requests: 本次扫描最多发出的上游请求数，None表示不限制
+        """
+        self.max_requests = max_requests
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def run(self, function: Callable[[], Any]) -> Any:
+        """
+        占用一个并发名额执行一次上游请求
+
+        Raises:
+            BudgetExceeded: 总请求数已达到上限
+        """
+        with self._lock:
+            if self.max_requests is not None and self.requests >= self.max_requests:
+                raise BudgetExceeded(f"已达到请求预算 ({self.max_requests} 次)")
+            self.requests += 1
+        with self._slots:
+            return function()
+
+
+class ResponseCache:
+    """
+    扫描共享的响应缓存：请求标识 -> (API响应, 请求耗时, 写入时间)
+
+    只缓存成功的响应；指定文件时启动时加载未过期的条目，新响应追加写入（JSON行），
+    下一次扫描（例如网格中增加了一个取值）只需请求新的组合
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        """
+        Args:
+            path: 缓存文件路径，为None时只在内存中缓存
+            ttl: 缓存条目的有效期（秒），None表示一直有效
+        """
+        self.path = path
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self.loaded = 0
+        if path:
+            self._load()
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        now = time.time()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 上次扫描中断时最后一行可能不完整
+                    continue
+                if self.ttl is not None and now - entry["stored_at"] > self.ttl:
+                    continue
+                self._entries[entry["key"]] = (entry["response"], entry["elapsed"], entry["stored_at"])
+        self.loaded = len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl is not None and time.time() - entry[2] > self.ttl:
+            return None
+        return entry[0], entry[1]
+
+    def put(self, key: str, response: Dict[str, Any], elapsed: float) -> None:
+        stored_at = time.time()
+        with self._lock:
+            self._entries[key] = (response, elapsed, stored_at)
+            if self._file is not None:
+                self._file.write(json.dumps(
+                    {"key": key, "elapsed": elapsed, "stored_at": stored_at, "response": response},
+                    ensure_ascii=False
+                ) + "\n")
+                self._file.flush()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SharedSearchClient:
+    """
+    一个组合的检索客户端：相同请求经共享缓存和请求合并复用，上游请求受全局预算限制
+
+    延迟按请求单独记录（不含等待预算名额的时间），复用的响应记录最初请求时测得的延迟，
+    因此对比表中的延迟与组合是否命中缓存无关
+    """
+
+    def __init__(self, client, params: Dict[str, Any], upstream: Dict[str, Any], cache: ResponseCache,
+                 coalescer: RequestCoalescer, budget: RequestBudget, relative_accuracy: float = 0.01):
+        """
+        Args:
+            client: utils.api_client.CodeSearchAPIClient（已按组合参数创建）
+            params: 组合参数
+            upstream: 检索服务标识（upstream_identity），计入缓存键
+            cache: 共享响应缓存
+            coalescer: 共享请求合并器
+            budget: 共享请求预算
+            relative_accuracy: 延迟分位数的相对误差
+        """
+        self.client = client
+        self.params = params
+        self.upstream_identity = upstream
+        self.cache = cache
+        self.coalescer = coalescer
+        self.budget = budget
+        self.latency = LatencySketch(relative_accuracy)
+        self.upstream = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # 其余属性和方法（test_connection、exporter等）交给原客户端
+        return getattr(self.client, name)
+
+    def _fetch(self, query: str) -> Tuple[Dict[str, Any], float]:
+        def request():
+            start = time.time()
+            response = self.client.search_code(query)
+            return response, time.time() - start
+
+        response, elapsed = self.budget.run(request)
+        with self._lock:
+            self.upstream += 1
+        return response, elapsed
+
+    def search_code(self, query: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        与 CodeSearchAPIClient.search_code 相同的接口（limit固定为组合参数）
+
+        评估器启用重试时每次尝试都调用这里：未命中缓存的尝试各自计入请求预算，
+        预算用完时返回不可重试的错误（"retryable": False），不再重试
+        """
+        key = request_key(query, self.params, self.upstream_identity)
+        cached = self.cache.get(key)
+        if cached is not None:
+            response, elapsed = cached
+            with self._lock:
+                self.cache_hits += 1
+        else:
+            try:
+                (response, elapsed), shared = self.coalescer.run(key, lambda: self._fetch(query))
+            except BudgetExceeded as e:
+                return {"error": str(e), "results": [], "retryable": False}
+            if shared:
+                with self._lock:
+                    self.coalesced += 1
+            elif "error" not in response:
+                self.cache.put(key, response, elapsed)
+        self.latency.add(elapsed)
+        return response
+
+
+def pareto_frontier(rows: List[Dict[str, Any]], quality: str = "avg_total_score",
+                    cost: str = "latency_p95") -> List[Dict[str, Any]]:
+    """
+    质量-延迟帕累托前沿：没有其他组合同时分数更高（或相同）且延迟更低（或相同）
+
+    Args:
+        rows: 对比表的行
+        quality: 越大越好的字段
+        cost: 越小越好的字段
+
+    Returns:
+        List[Dict]: 前沿上的行（按延迟从低到高）；缺少任一字段的行不参与
+    """
+    candidates = [row for row in rows if row.get(quality) is not None and row.get(cost) is not None]
+    candidates.sort(key=lambda row: (row[cost], -row[quality]))
+    frontier = []
+    best = None
+    for row in candidates:
+        if best is None or row[quality] > best:
+            frontier.append(row)
+            best = row[quality]
+    return frontier
+
+
+class SweepRunner:
+    """并行执行参数网格中的所有组合"""
+
+    def __init__(self, config: Dict[str, Any], cache: ResponseCache, budget: RequestBudget,
+                 parallel_combos: int = 4, latency_quantile: float = 0.95):
+        """
+        Args:
+            config: 评估器配置（api为默认参数，各组合覆盖其中的扫描参数）
+            cache: 共享响应缓存
+            budget: 共享请求预算
+            parallel_combos: 同时评估的组合数
+            latency_quantile: 对比表和帕累托前沿使用的延迟分位数
+        """
+        self.config = config
+        self.cache = cache
+        self.budget = budget
+        self.parallel_combos = parallel_combos
+        self.latency_quantile = latency_quantile
+        self.coalescer = RequestCoalescer()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def latency_field(self) -> str:
+        return f"latency_p{round(self.latency_quantile * 100)}"
+
+    def _run_combo(self, params: Dict[str, Any], test_cases: List[Dict],
+                   on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]]) -> Dict[str, Any]:
+        from evaluator import CodeSearchEvaluator
+
+        config = dict(self.config, api=dict(self.config["api"], **params))
+        evaluator = CodeSearchEvaluator(config)
+        client = SharedSearchClient(
+            evaluator.api_client, params, upstream_identity(config["api"]), self.cache, self.coalescer, self.budget,
+            config["evaluation"].get("latency", {}).get("relative_accuracy", 0.01)
+        )
+        evaluator.api_client = client
+        start = time.time()
+        try:
+            results = evaluator.evaluate_dataset({"test_cases": test_cases})
+        finally:
+            evaluator.close()
+        wall = time.time() - start
+
+        framework = results["summary_metrics"].get("new_framework_performance", {})
+        latency = client.latency
+        row = dict(params)
+        row.update({
+            "cases": results["meta"]["total_test_cases"],
+            "succeeded": results["meta"]["successful_evaluations"],
+            "failed": results["meta"]["failed_evaluations"]
+        })
+        for field in SCORE_FIELDS:
+            row[f"avg_{field}"] = framework.get(f"avg_{field}")
+        row.update({
+            "latency_mean": latency.mean,
+            "latency_p50": latency.quantile(0.5),
+            self.latency_field: latency.quantile(self.latency_quantile),
+            "upstream_requests": client.upstream,
+            "cache_hits": client.cache_hits,
+            "coalesced": client.coalesced,
+            "wall_time": wall
+        })
+        # 历史库中的平均耗时使用请求延迟（复用的响应为最初测得的延迟），不受缓存和预算排队影响
+        results["meta"]["avg_elapsed_time"] = latency.mean
+        results["meta"]["sweep"] = {key: row[key] for key in ("upstream_requests", "cache_hits", "coalesced")}
+        if on_result is not None:
+            on_result(row, results)
+        return row
+
+    def run(self, grid: Dict[str, List[Any]], test_cases: List[Dict],
+            on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        评估网格中的所有组合
+
+        Args:
+            grid: 参数 -> 取值列表（见 expand_grid）
+            test_cases: 测试案例
+            on_result: 每个组合完成时调用 on_result(对比表行, 完整评估结果)
+
+        Returns:
+            Dict: {"grid", "combos", "latency_field", "rows", "pareto", "requests", "elapsed"}
+        """
+        combos = expand_grid(grid, self.config["api"])
+        self.logger.info(f"参数扫描: {len(combos)} 个组合 × {len(test_cases)} 个案例")
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.parallel_combos, thread_name_prefix="sweep") as executor:
+            futures = [executor.submit(self._run_combo, params, test_cases, on_result) for params in combos]
+            rows = [future.result() for future in futures]
+
+        frontier = pareto_frontier(rows, cost=self.latency_field)
+        on_frontier = {id(row) for row in frontier}
+        for row in rows:
+            row["pareto"] = id(row) in on_frontier
+        return {
+            "grid": {name: list(dict.fromkeys(value[name] for value in combos)) for name in SWEEP_PARAMETERS},
+            "combos": len(combos),
+            "cases": len(test_cases),
+            "latency_field": self.latency_field,
+            "rows": rows,
+            "pareto": [{name: row[name] for name in SWEEP_PARAMETERS} for row in frontier],
+            "requests": {
+                "upstream": self.budget.requests,
+                "cache_hits": sum(row["cache_hits"] for row in rows),
+                "coalesced": self.coalescer.coalesced
+            },
+            "elapsed": time.time() - start
+        }
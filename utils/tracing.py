@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+轻量级链路追踪模块
+每个评估案例生成一条trace，记录排队等待、HTTP请求、响应解析、指标计算和结果落盘等span，
+可导出为OTLP/JSON文件，供本地trace查看器加载（只依赖标准库）
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+# OTLP SpanKind
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+
+# OTLP StatusCode
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# 当前线程（上下文）中正在执行的span
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """一个span：名称、起止时间（纳秒）、属性和状态"""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "kind",
+                 "start_ns", "end_ns", "attributes", "status_code", "status_message")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str],
+                 kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None,
+                 start_ns: Optional[int] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes) if attributes else {}
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.status_code = STATUS_ERROR
+        self.status_message = str(message)
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = end_ns if end_ns is not None else time.time_ns()
+            self.tracer._finish(self)
+
+    @property
+    def duration(self) -> float:
+        """持续时间（秒）"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+class _NoopSpan:
+    """未启用追踪时使用的空span"""
+
+    trace_id = span_id = parent_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Python值 -> OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON中int64以字符串表示
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Tracer:
+    """
+    追踪器
+
+    span的父子关系通过当前上下文自动建立；流水线中案例在线程之间传递时，
+    由调用方用 activate() 在新线程中恢复该案例的根span。
+    """
+
+    def __init__(self, service_name: str = "code-search-evaluator", enabled: bool = True):
+        self.service_name = service_name
+        self.enabled = enabled
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def current_span(self):
+        """当前上下文中的span，没有时返回空span"""
+        return _current_span.get() or _NOOP_SPAN
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                   kind: int = SPAN_KIND_INTERNAL, parent=None, start_ns: Optional[int] = None,
+                   new_trace: bool = False):
+        """
+        创建span（不设置为当前span，需要手动调用end()）
+
+        Args:
+            name: span名称
+            attributes: 属性
+            kind: SPAN_KIND_INTERNAL / SPAN_KIND_CLIENT
+            parent: 父span，None时使用当前span；当前也没有时创建新的trace
+            start_ns: 开始时间（纳秒时间戳），None为现在
+            new_trace: 是否忽略当前span，开始一条新的trace
+
+        Returns:
+            Span
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        if not new_trace:
+            parent = parent or _current_span.get()
+        if new_trace or parent is None or parent is _NOOP_SPAN:
+            return Span(self, name, os.urandom(16).hex(), None, kind, attributes, start_ns)
+        return Span(self, name, parent.trace_id, parent.span_id, kind, attributes, start_ns)
+
+    @contextlib.contextmanager
+    def activate(self, span):
+        """在代码块中把span设置为当前span（不结束span）"""
+        if not self.enabled:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    @contextlib.contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+             kind: int = SPAN_KIND_INTERNAL, parent=None):
+        """创建子span并在代码块中设置为当前span，代码块抛出异常时标记为错误"""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        span = self.start_span(name, attributes, kind, parent)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def record_span(self, name: str, start_ns: int, end_ns: int, parent,
+                    attributes: Optional[Dict[str, Any]] = None) -> None:
+        """事后记录一个已经结束的span（例如排队等待时间）"""
+        if not self.enabled:
+            return
+        span = self.start_span(name, attributes, parent=parent, start_ns=start_ns)
+        span.end(end_ns)
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def export_otlp_json(self, output_path: str) -> int:
+        """
+        导出为OTLP/JSON文件（ExportTraceServiceRequest结构）
+
+        Args:
+            output_path: 输出文件路径
+
+        Returns:
+            int: 导出的span数量
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        otlp_spans = []
+        for span in spans:
+            item = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": _otlp_attributes(span.attributes),
+                "status": {"code": span.status_code}
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            if span.status_message:
+                item["status"]["message"] = span.status_message
+            otlp_spans.append(item)
+
+        document = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "code-search-evaluator.tracing", "version": "1.0"},
+                    "spans": otlp_spans
+                }]
+            }]
+        }
+
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False)
+        return len(otlp_spans)
+
+    def category_summary(self, root_name: str = "evaluate_case") -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        按案例类别汇总各span的平均耗时，用于定位某类案例变慢的阶段
+
+        Args:
+            root_name: 案例根span名称（其category属性决定整条trace的类别）
+
+        Returns:
+            Dict: {类别: {span名称: {"count", "avg_seconds", "max_seconds"}}}
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        trace_category = {
+            span.trace_id: span.attributes.get("category", "unknown")
+            for span in spans if span.name == root_name
+        }
+        summary = {}
+        for span in spans:
+            category = trace_category.get(span.trace_id)
+            if category is None:
+                continue
+            stats = summary.setdefault(category, {}).setdefault(
+                span.name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["count"] += 1
+            stats["total_seconds"] += span.duration
+            stats["max_seconds"] = max(stats["max_seconds"], span.duration)
+
+        for spans_by_name in summary.values():
+            for stats in spans_by_name.values():
+                stats["avg_seconds"] = stats.pop("total_seconds") / stats["count"]
+        return summary
+
+    def detached_spans(self, root_name: str = "evaluate_case") -> Dict[str, int]:
+        """
+        检查没有挂在案例trace下的span（例如在另一个线程中丢失了上下文的 retry.attempt），正常情况下为空
+
+        Args:
+            root_name: 案例根span名称
+
+        Returns:
+            Dict: {span名称: 数量}，包括父span不存在的span和不属于任何案例trace的span
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        span_ids = {span.span_id for span in spans}
+        case_traces = {span.trace_id for span in spans if span.name == root_name}
+        detached = {}
+        for span in spans:
+            if span.name == root_name:
+                continue
+            if span.trace_id not in case_traces or span.parent_id not in span_ids:
+                detached[span.name] = detached.get(span.name, 0) + 1
+        return detached
+
+
+# 未启用追踪时共用的空追踪器
+NOOP_TRACER = Tracer(enabled=False)